@@ -23,12 +23,54 @@ else:
     
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Strict loading: 'log' or 'raise' on lazy relationship loads (use in tests/staging)
+app.config['STRICT_LOADING'] = os.environ.get('STRICT_LOADING', '')
+
+# Statements slower than this (ms) are written with their EXPLAIN plan to the slow-query log
+app.config['SLOW_QUERY_THRESHOLD_MS'] = os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100)
+
+# Rendered page cache: in-process LRU size, and a directory shared by all workers (optional)
+app.config['PAGE_CACHE_MAX_MB'] = os.environ.get('PAGE_CACHE_MAX_MB', 32)
+app.config['PAGE_CACHE_DIR'] = os.environ.get('PAGE_CACHE_DIR', '')
+
+# Concurrent rebuilds of the same standings/bracket/page wait for one another: threads
+# of a worker always, workers through lock files in this directory (optional)
+app.config['SINGLE_FLIGHT_DIR'] = os.environ.get('SINGLE_FLIGHT_DIR', '')
+app.config['SINGLE_FLIGHT_TIMEOUT'] = os.environ.get('SINGLE_FLIGHT_TIMEOUT', 10)
+
+# Processes of each gunicorn worker that simulate qualification odds (default: one per CPU, 0: none)
+app.config['SIMULATION_WORKERS'] = os.environ.get('SIMULATION_WORKERS', '')
+
+# Responses of these types and at least this many bytes are sent gzip/Brotli compressed
+app.config['COMPRESS_MIN_SIZE'] = os.environ.get('COMPRESS_MIN_SIZE', 1024)
+app.config['COMPRESS_MIMETYPES'] = [
+    'text/html', 'text/css', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml'
+]
+
 # Import and initialize models
 from models import db, Tournament, Team, Match, Player
 
 # Initialize SQLAlchemy with the app
 db.init_app(app)
 
+# Per-request query count, DB/template timings and slow-query log
+from instrumentation import init_instrumentation
+init_instrumentation(app)
+
+# Public pages served from the cache until their tournament changes
+from page_cache import init_page_cache, page_cache
+init_page_cache(app)
+
+from models.single_flight import configure_single_flight, single_flight_stats
+configure_single_flight(app.config['SINGLE_FLIGHT_DIR'], app.config['SINGLE_FLIGHT_TIMEOUT'])
+
+# Compressed responses, and static assets with content-hash URLs cached for a year
+from compression import init_compression
+from static_assets import init_static_assets
+init_compression(app)
+init_static_assets(app)
+
 # Import routes
 from routes.main_routes import main_bp
 from routes.tournament_routes import tournament_bp
@@ -45,6 +87,47 @@ app.register_blueprint(match_bp)
 with app.app_context():
     db.create_all()
     print("Database tables created successfully!")
+    
+    # Add the knockout bracket columns to existing databases. Not caught: on a
+    # half-migrated schema brackets cannot be generated, so the app must not start
+    from migrate_bracket_slots import migrate_bracket_slots
+    migrate_bracket_slots()
+    
+    # Add the Last-Modified column of data versions to existing databases
+    try:
+        from migrate_data_versions import migrate_data_versions
+        migrate_data_versions()
+    except Exception as e:
+        print(f"Data version migration note: {e}")
+    
+    # Add the clean sheets column of the standings to existing databases
+    try:
+        from migrate_clean_sheets import migrate_clean_sheets
+        migrate_clean_sheets()
+    except Exception as e:
+        print(f"Clean sheets migration note: {e}")
+    
+    # Reset career totals entered by hand before the match event log
+    try:
+        from migrate_player_stats import migrate_player_stats
+        migrate_player_stats()
+    except Exception as e:
+        print(f"Player stats migration note: {e}")
+    
+    # Add indexes declared after the tables were first created
+    try:
+        from migrate_indexes import migrate_indexes
+        migrate_indexes()
+    except Exception as e:
+        print(f"Index migration note: {e}")
+    
+    # Full-text search index (FTS5 on SQLite, tsvector + GIN on PostgreSQL), filled on first start
+    try:
+        from models.search import init_search_index
+        if init_search_index():
+            print("✅ Search index built")
+    except Exception as e:
+        print(f"Search index note: {e}")
 
 @app.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
@@ -64,6 +147,17 @@ def admin_logout():
     flash('Logged out successfully', 'info')
     return redirect(url_for('main.index'))
 
+@app.route('/admin/cache-stats')
+def cache_stats():
+    """Page cache and single-flight counters of this worker"""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    return jsonify({
+        'worker_pid': os.getpid(),
+        'page_cache': page_cache.stats(),
+        'single_flight': single_flight_stats()
+    })
+
 # Make is_admin available in all templates
 @app.context_processor
 def inject_admin_status():
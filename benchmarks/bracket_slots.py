@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Check the knockout brackets generated for every number of teams
+
+For 2 to 32 teams, with and without a third-place match: every team plays
+or gets a bye into the next round, every winner and loser link points at a
+match that exists, and every match can end up with two teams (a
+third-place match needs both semi-finals to be played, so 3 teams have none).
+
+Usage: python benchmarks/bracket_slots.py
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bracket.db')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import app
+from models import db, Tournament, Team
+from models.bracket import THIRD_PLACE_SLOT, generate_bracket
+
+def check(tournament_id, team_ids, third_place):
+    matches = {match.bracket_slot: match for match in generate_bracket(tournament_id, team_ids, third_place)}
+    db.session.flush()
+
+    placed = [team_id for match in matches.values() for team_id in (match.home_team_id, match.away_team_id) if team_id]
+    assert sorted(placed) == sorted(team_ids), f'{len(team_ids)} teams: every team is placed exactly once'
+
+    # Teams each match expects: those already placed plus the winners/losers sent to it
+    incoming = {slot: sum(1 for team_id in (match.home_team_id, match.away_team_id) if team_id)
+                for slot, match in matches.items()}
+    for match in matches.values():
+        for target in (match.next_slot, match.loser_next_slot):
+            if target is not None:
+                assert target in matches, f'{len(team_ids)} teams: slot {match.bracket_slot} feeds missing slot {target}'
+                incoming[target] += 1
+    waiting = [slot for slot, count in incoming.items() if count != 2]
+    assert not waiting, f'{len(team_ids)} teams: slots {waiting} never get two teams'
+
+    has_semi_finals = 2 in matches and 3 in matches
+    assert (THIRD_PLACE_SLOT in matches) == (third_place and has_semi_finals), \
+        f'{len(team_ids)} teams: third-place match only when both semi-finals are played'
+
+def new_tournament(team_count):
+    """A tournament of its own per bracket, so slots never collide"""
+    now = datetime.now()
+    tournament = Tournament(name='Bracket Check', start_date=now, end_date=now)
+    db.session.add(tournament)
+    db.session.flush()
+    teams = [Team(name=f'Team {i}', tournament_id=tournament.id) for i in range(1, team_count + 1)]
+    db.session.add_all(teams)
+    db.session.flush()
+    return tournament.id, [team.id for team in teams]
+
+def main():
+    checked = 0
+    with app.app_context():
+        for count in range(2, 33):
+            for third_place in (True, False):
+                check(*new_tournament(count), third_place)
+                checked += 1
+        db.session.rollback()
+
+    print(f"✅ {checked} brackets checked (2 to 32 teams, with and without third place)")
+
+if __name__ == '__main__':
+    main()
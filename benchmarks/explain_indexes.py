@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+EXPLAIN the hot queries before and after the model indexes, on synthetic data
+
+Usage: python benchmarks/explain_indexes.py [database_url]
+
+Defaults to a throwaway SQLite file. Pass an empty PostgreSQL database URL to
+get the same report from PostgreSQL. All tables are dropped and recreated.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine, insert, text
+
+from models import db, Tournament, Team, Match, Player, Group
+
+TOURNAMENTS = 2000
+TEAMS_PER_TOURNAMENT = 32
+GROUPS_PER_TOURNAMENT = 8
+PLAYERS_PER_TEAM = 10
+
+QUERIES = {
+    'advance_winner_to_next_round': (
+        "SELECT id FROM matches WHERE tournament_id = :tournament AND stage = 'semi_final' "
+        "AND status = 'scheduled' LIMIT 1"
+    ),
+    'schedule (order_by date)': "SELECT id FROM matches ORDER BY date LIMIT 50",
+    'index upcoming matches': "SELECT id FROM matches WHERE status = 'scheduled' ORDER BY date LIMIT 5",
+    'statistics recent results': "SELECT id FROM matches WHERE status = 'completed' ORDER BY date DESC LIMIT 10",
+    'group match generation teams': "SELECT id FROM teams WHERE tournament_id = :tournament AND group_id = :group",
+    'statistics top scorers': "SELECT id FROM players ORDER BY goals_scored DESC LIMIT 10",
+    'team_matches': (
+        "SELECT id FROM matches WHERE home_team_id = :team OR away_team_id = :team ORDER BY date DESC"
+    ),
+}
+
+def seed(engine):
+    """Fill the tables with a few hundred thousand rows of synthetic data"""
+    random.seed(42)
+    start = datetime(2020, 1, 1)
+    tournaments, groups, teams, matches, players = [], [], [], [], []
+    team_id = group_id = 0
+    
+    for t in range(1, TOURNAMENTS + 1):
+        tournaments.append({'id': t, 'name': f'Tournament {t}', 'start_date': start, 'end_date': start,
+                            'status': 'completed' if t < TOURNAMENTS - 5 else 'active'})
+        first_group = group_id + 1
+        for g in range(GROUPS_PER_TOURNAMENT):
+            group_id += 1
+            groups.append({'id': group_id, 'name': chr(65 + g), 'tournament_id': t})
+        
+        tournament_teams = []
+        for i in range(TEAMS_PER_TOURNAMENT):
+            team_id += 1
+            tournament_teams.append(team_id)
+            teams.append({'id': team_id, 'name': f'Team {team_id}', 'tournament_id': t,
+                          'group_id': first_group + i % GROUPS_PER_TOURNAMENT})
+            for p in range(PLAYERS_PER_TEAM):
+                players.append({'first_name': 'P', 'last_name': str(p), 'team_id': team_id,
+                                'jersey_number': p + 1, 'goals_scored': random.randint(0, 30)})
+        
+        for g in range(GROUPS_PER_TOURNAMENT):
+            members = tournament_teams[g::GROUPS_PER_TOURNAMENT]
+            for i, home in enumerate(members):
+                for away in members[i + 1:]:
+                    scheduled = t >= TOURNAMENTS - 5 and random.random() < 0.5
+                    matches.append({
+                        'home_team_id': home, 'away_team_id': away, 'tournament_id': t,
+                        'date': start + timedelta(days=t * 7, hours=random.randint(0, 96)),
+                        'stage': 'group_stage', 'group_name': chr(65 + g),
+                        'home_score': random.randint(0, 4), 'away_score': random.randint(0, 4),
+                        'status': 'scheduled' if scheduled else 'completed'
+                    })
+        for stage, count in (('quarter_final', 4), ('semi_final', 2), ('final', 1)):
+            for _ in range(count):
+                home, away = random.sample(tournament_teams, 2)
+                matches.append({'home_team_id': home, 'away_team_id': away, 'tournament_id': t,
+                                'date': start + timedelta(days=t * 7 + 5), 'stage': stage, 'group_name': None,
+                                'home_score': 1, 'away_score': 0,
+                                'status': 'scheduled' if t >= TOURNAMENTS - 5 else 'completed'})
+    
+    with engine.begin() as conn:
+        for model, rows in ((Tournament, tournaments), (Group, groups), (Team, teams),
+                            (Match, matches), (Player, players)):
+            conn.execute(insert(model.__table__), rows)
+    return {'tournaments': len(tournaments), 'teams': len(teams), 'matches': len(matches), 'players': len(players)}
+
+def explain(conn, sql, params):
+    """Get the query plan as text lines"""
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = conn.execute(text(prefix + sql), params).fetchall()
+    return [str(row[-1]) for row in rows]
+
+def timed(conn, sql, params, repeat=20):
+    """Best wall time in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(text(sql), params).fetchall()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+def report(engine, label):
+    params = {'tournament': TOURNAMENTS - 1, 'group': (TOURNAMENTS - 2) * GROUPS_PER_TOURNAMENT + 3,
+              'team': (TOURNAMENTS - 2) * TEAMS_PER_TOURNAMENT + 7}
+    print(f"\n=== {label} ===")
+    with engine.connect() as conn:
+        for name, sql in QUERIES.items():
+            plan = explain(conn, sql, params)
+            print(f"{name}: {timed(conn, sql, params):.3f} ms")
+            for line in plan:
+                print(f"    {line}")
+
+def main():
+    url = sys.argv[1] if len(sys.argv) > 1 else 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'explain.db')
+    engine = create_engine(url)
+    
+    db.metadata.drop_all(engine)
+    # Tables only: the indexes are added after the "before" report
+    for table in db.metadata.sorted_tables:
+        indexes = set(table.indexes)
+        table.indexes.clear()
+        try:
+            table.create(engine)
+        finally:
+            table.indexes.update(indexes)
+    
+    counts = seed(engine)
+    print("Synthetic data: " + ", ".join(f"{count} {name}" for name, count in counts.items()))
+    with engine.begin() as conn:
+        conn.execute(text('ANALYZE'))
+    report(engine, 'before (primary keys only)')
+    
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine)
+    with engine.begin() as conn:
+        conn.execute(text('ANALYZE'))
+    report(engine, 'after (model indexes)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark the in-process fan-out of live score events
+
+Connects many subscriptions (one waiting thread each, like the streams of
+a worker), publishes a burst of score events and reports how long the
+slowest viewer waited for each one.
+
+Usage: python benchmarks/live_fanout.py [viewers] [events]
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from models.live import LiveBroadcaster
+
+Row = namedtuple('Row', 'id tournament_id payload')
+
+def viewer(subscription, events, latencies, ready):
+    ready.release()
+    for _ in range(events):
+        live_event = subscription.get(timeout=10)
+        latencies.append(time.perf_counter() - json.loads(live_event.payload)['sent'])
+
+def main():
+    viewers = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    events = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    broadcaster = LiveBroadcaster()
+    latencies = []
+    ready = threading.Semaphore(0)
+    threads = []
+    for _ in range(viewers):
+        subscription = broadcaster.subscribe(tournament_id=1)
+        thread = threading.Thread(target=viewer, args=(subscription, events, latencies, ready), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for _ in range(viewers):
+        ready.acquire()
+
+    started = time.perf_counter()
+    for event_id in range(1, events + 1):
+        payload = json.dumps({'match_id': 1, 'home_score': event_id, 'sent': time.perf_counter()})
+        broadcaster.publish(Row(event_id, 1, payload))
+    publish_seconds = time.perf_counter() - started
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    print(f"{viewers} viewers x {events} events ({broadcaster.delivered} deliveries)")
+    print(f"  publish:   {publish_seconds * 1000:.1f} ms total")
+    print(f"  latency:   p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"max {latencies[-1] * 1000:.1f} ms")
+    assert len(latencies) == viewers * events
+    assert latencies[-1] < 1.0, 'slowest viewer waited more than a second'
+    print("✅ Every viewer got every event in under a second")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Monte Carlo qualification odds
+
+Simulates a 6-team group with every fixture still to play, then eight such
+groups at once in a spawned worker pool and in this process. Fails if the single
+group takes half a second or more.
+
+Usage: python benchmarks/qualification_odds.py [simulations]
+"""
+
+import os
+import statistics
+import sys
+import time
+from itertools import combinations
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from models.simulation import (
+    DEFAULT_SIMULATIONS, GroupSeason, simulate_group, simulate_groups, start_simulation_pool, stop_simulation_pool
+)
+
+def group_season(name, teams=6):
+    """A group before its first match: every pair plays once"""
+    return GroupSeason(
+        group_name=name,
+        team_ids=list(range(1, teams + 1)),
+        team_names=[f'{name}{i}' for i in range(1, teams + 1)],
+        positions=list(range(1, teams + 1)),
+        matches_played=[0] * teams,
+        points=[0] * teams,
+        goal_difference=[0] * teams,
+        goals_for=[0] * teams,
+        goals_against=[0] * teams,
+        fixtures=[(home, away, 0, 0, 1.0) for home, away in combinations(range(teams), 2)]
+    )
+
+def timed(function, runs=5):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return result, statistics.median(timings)
+
+def main():
+    simulations = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SIMULATIONS
+    season = group_season('A')
+    odds, single = timed(lambda: simulate_group(season, simulations=simulations, seed=1))
+    print(f"6-team group, {len(season.fixtures)} fixtures, {simulations:,} seasons: median {single * 1000:.0f} ms")
+    for team in odds.teams:
+        print(f"  {team.name}: qualify {team.qualify:.1%}  xPts {team.expected_points:.2f}  "
+              f"positions {' '.join(f'{p:.2f}' for p in team.positions)}")
+
+    groups = [group_season(name) for name in 'ABCDEFGH']
+    workers = max(2, os.cpu_count() or 1)
+    start_simulation_pool(workers)
+    pooled, parallel = timed(lambda: simulate_groups(groups, simulations=simulations, seed=1), 3)
+    serial_odds, serial = timed(lambda: simulate_groups(groups, simulations=simulations, seed=1, in_process=True), 3)
+    stop_simulation_pool()
+    assert pooled == serial_odds, 'the pool must give the same odds'
+    print(f"8 groups: {parallel * 1000:.0f} ms on {workers} workers, {serial * 1000:.0f} ms in process")
+
+    assert single < 0.5, f'6-team group took {single:.3f}s'
+    print(f"✅ 6-team group simulated in {single * 1000:.0f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Check the number of SQL queries per page against a fixed budget
+
+Usage: python benchmarks/query_budget.py
+
+Runs every read page with STRICT_LOADING='raise' on a small and on a large
+synthetic tournament. Fails if a page lazy loads a relationship, goes over
+its budget, or issues more queries for the larger tournament. Pages behind
+the page cache are measured on a miss: their render plus the version lookup.
+Pages sending an ETag must answer its revalidation with a 304 in one query.
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'budget.db')
+os.environ['STRICT_LOADING'] = 'raise'
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import event
+
+from app import app
+from models import db, Tournament, Team, Match, Player, Group
+from page_cache import page_cache
+
+# Endpoint -> maximum number of statements, {t} is the tournament id, {team} a team id,
+# {group} a group id and {match} a match id
+BUDGETS = {
+    '/': 3,
+    '/tournaments': 2,
+    '/tournaments.json': 2,
+    '/schedule': 5,
+    '/schedule.json': 5,
+    '/knockout': 4,
+    '/statistics': 12,
+    '/leaderboards': 6,
+    '/leaderboards.json?metric=goals': 2,
+    '/search?q=Player': 2,
+    '/search.json?q=Player': 2,
+    '/search/suggest?q=Pla': 2,
+    '/tournament/{t}': 11,
+    '/tournament/{t}/standings': 4,
+    '/tournament/{t}/leaderboards': 7,
+    '/tournament/{t}/leaderboards.json': 7,
+    '/tournament/{t}/knockout': 3,
+    '/tournament/{t}/bracket': 2,
+    '/tournament/{t}/bracket.json': 1,
+    '/tournament/{t}/groups': 6,
+    '/tournament/{t}/qualification': 6,
+    '/tournament/{t}/qualification/odds.json': 5,
+    '/tournament/{t}/fragments/groups/{group}/table': 5,
+    '/tournament/{t}/fragments/groups/{group}/matches': 6,
+    '/tournament/{t}/fragments/matches/{match}': 4,
+    '/tournament/{t}/fragments/standings': 4,
+    '/team/{team}': 6,
+    '/team/{team}/matches': 6,
+    '/team/{team}/matches.json': 6,
+    '/team/{team}/edit': 1,
+    '/match/new?tournament_id={t}': 2,
+    '/match/{match}/events': 3,
+}
+
+def seed(groups, teams_per_group, players_per_team=3):
+    """Create one tournament with every group playing a full round-robin"""
+    now = datetime.now()
+    tournament = Tournament(name='Budget Cup', description='Synthetic', start_date=now,
+                            end_date=now, status='active')
+    db.session.add(tournament)
+    db.session.flush()
+    
+    group_rows = [Group(name=f'G{i}', tournament_id=tournament.id) for i in range(groups)]
+    db.session.add_all(group_rows)
+    db.session.flush()
+    
+    first_team_id = None
+    for group in group_rows:
+        teams = [Team(name=f'{group.name} Team {i}', tournament_id=tournament.id, group_id=group.id,
+                      qualified_for_knockout=i < 2)
+                 for i in range(teams_per_group)]
+        db.session.add_all(teams)
+        db.session.flush()
+        first_team_id = first_team_id or teams[0].id
+        for team in teams:
+            db.session.add_all(Player(first_name='Player', last_name=str(n), team_id=team.id,
+                                      goals_scored=n) for n in range(players_per_team))
+        for i, home in enumerate(teams):
+            for away in teams[i + 1:]:
+                db.session.add(Match(home_team_id=home.id, away_team_id=away.id,
+                                     tournament_id=tournament.id, date=now + timedelta(hours=i),
+                                     group_name=group.name, home_score=i % 3, away_score=1,
+                                     status='completed' if i % 2 else 'scheduled'))
+    db.session.commit()
+    first_match_id = Match.query.filter_by(tournament_id=tournament.id).order_by(Match.id).first().id
+    return tournament.id, first_team_id, group_rows[0].id, first_match_id
+
+def count_queries(engine, client, url, headers=None):
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    page_cache.clear()
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return response, len(statements)
+
+def run(engine, client, tournament_id, team_id, group_id, match_id):
+    results = {}
+    for pattern in BUDGETS:
+        url = pattern.format(t=tournament_id, team=team_id, group=group_id, match=match_id)
+        # Warm up once so one-off work (standings rebuild) is not counted
+        assert client.get(url).status_code == 200, url
+        response, count = count_queries(engine, client, url)
+        revalidated = None
+        if response.headers.get('ETag'):
+            revalidation, revalidation_count = count_queries(
+                engine, client, url, headers={'If-None-Match': response.headers['ETag']})
+            revalidated = revalidation_count if revalidation.status_code == 304 else -1
+        results[pattern] = response.status_code, count, revalidated
+    return results
+
+def main():
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['is_admin'] = True
+    
+    with app.app_context():
+        small = seed(groups=2, teams_per_group=3)
+        large = seed(groups=16, teams_per_group=6)
+        engine = db.engine
+    
+    small_results = run(engine, client, *small)
+    large_results = run(engine, client, *large)
+    
+    failures = 0
+    print(f"{'endpoint':<50} {'status':>6} {'small':>6} {'large':>6} {'budget':>6} {'304':>4}")
+    for pattern, budget in BUDGETS.items():
+        status, small_count, _ = small_results[pattern]
+        large_status, large_count, revalidated = large_results[pattern]
+        ok = status == large_status == 200 and large_count <= budget and large_count == small_count \
+            and revalidated in (None, 0, 1)
+        failures += not ok
+        print(f"{pattern:<50} {large_status:>6} {small_count:>6} {large_count:>6} {budget:>6} "
+              f"{'-' if revalidated is None else revalidated:>4}  {'ok' if ok else 'FAIL'}")
+    
+    if failures:
+        print(f"❌ {failures} endpoints over budget or not constant")
+        sys.exit(1)
+    print("✅ All endpoints within their query budget")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark and check the field/time-slot scheduler on a large fixture list
+
+Schedules a double round-robin for many groups, then verifies that no field
+is double-booked and every team gets its minimum rest.
+
+Usage: python benchmarks/scheduler.py [groups] [teams_per_group] [fields]
+"""
+
+import os
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from models.round_robin import round_robin
+from models.scheduling import ScheduleConfig, Scheduler
+
+def build_fixtures(groups, teams_per_group):
+    """Double round-robin of every group, ordered round by round"""
+    fixtures = []
+    for group in range(groups):
+        team_ids = range(group * teams_per_group, (group + 1) * teams_per_group)
+        for round_number, home_id, away_id in round_robin(team_ids, legs=2):
+            fixtures.append((round_number, len(fixtures), home_id, away_id))
+    fixtures.sort()
+    return [(key, home_id, away_id) for _, key, home_id, away_id in fixtures]
+
+def check(fixtures, result, config):
+    """Assert there are no field overlaps and no rest violations"""
+    duration = config.match_minutes * 60
+    rest = config.min_rest_hours * 3600
+    by_field = defaultdict(list)
+    by_team = defaultdict(list)
+    for key, home_id, away_id in fixtures:
+        kickoff, field_name = result.assignments[key]
+        by_field[field_name].append(kickoff)
+        by_team[home_id].append(kickoff)
+        by_team[away_id].append(kickoff)
+
+    for bookings, gap in ((by_field, duration), (by_team, duration + rest)):
+        for kickoffs in bookings.values():
+            kickoffs.sort()
+            for previous, following in zip(kickoffs, kickoffs[1:]):
+                assert (following - previous).total_seconds() >= gap, (previous, following)
+
+def main():
+    groups = int(sys.argv[1]) if len(sys.argv) > 1 else 250
+    teams_per_group = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    field_count = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    fixtures = build_fixtures(groups, teams_per_group)
+    config = ScheduleConfig(fields=tuple(f'Campo {i + 1}' for i in range(field_count)), max_days=5000)
+
+    started = time.perf_counter()
+    result = Scheduler(config).schedule(fixtures)
+    elapsed = time.perf_counter() - started
+
+    print(f"{len(fixtures)} fixtures, {field_count} fields x {len(config.slot_times)} slots/day")
+    print(f"  scheduled:   {len(result.assignments)} in {elapsed:.2f}s ({result.relocations} relocations)")
+    print(f"  unscheduled: {len(result.unscheduled)}")
+    print(f"  last kick-off: {result.last_kickoff:%Y-%m-%d %H:%M}")
+
+    check(fixtures, result, config)
+    print("✅ No double-booked fields or teams, minimum rest respected")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Check that a database created before the bracket migration upgrades cleanly
+
+Creates a SQLite database whose matches table has its original shape (NOT
+NULL teams, no bracket slot columns), starts the app on it so create_all()
+and the migrations run, then checks that the team columns accept TBD, that
+the existing knockout matches got their slots, that no table references a
+leftover matches_old and that a match event can be inserted with foreign
+keys on.
+
+Usage: python benchmarks/schema_upgrade.py
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+path = os.path.join(tempfile.mkdtemp(), 'upgrade.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+BASELINE_SCHEMA = """
+CREATE TABLE tournaments (
+    id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, description TEXT,
+    start_date DATETIME NOT NULL, end_date DATETIME NOT NULL, status VARCHAR(20),
+    tournament_type VARCHAR(50), max_teams INTEGER, created_at DATETIME
+);
+CREATE TABLE teams (
+    id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, country VARCHAR(100), city VARCHAR(100),
+    founded_year INTEGER, logo_url VARCHAR(255), stadium VARCHAR(100), capacity INTEGER,
+    tournament_id INTEGER REFERENCES tournaments (id), group_id INTEGER,
+    qualified_for_knockout BOOLEAN, created_at DATETIME
+);
+CREATE TABLE matches (
+    id INTEGER PRIMARY KEY,
+    home_team_id INTEGER NOT NULL REFERENCES teams (id),
+    away_team_id INTEGER NOT NULL REFERENCES teams (id),
+    tournament_id INTEGER NOT NULL REFERENCES tournaments (id),
+    date DATETIME NOT NULL, venue VARCHAR(100), field VARCHAR(10), stage VARCHAR(50),
+    group_name VARCHAR(10), home_score INTEGER, away_score INTEGER, status VARCHAR(20),
+    home_formation VARCHAR(20), away_formation VARCHAR(20), referee VARCHAR(100),
+    attendance INTEGER, created_at DATETIME, updated_at DATETIME
+);
+INSERT INTO tournaments (id, name, start_date, end_date) VALUES (1, 'Copa', '2024-01-01', '2024-01-31');
+INSERT INTO teams (id, name, tournament_id) VALUES (1, 'Home', 1), (2, 'Away', 1);
+INSERT INTO matches (id, home_team_id, away_team_id, tournament_id, date, stage, status) VALUES
+    (1, 1, 2, 1, '2024-01-02', 'group_stage', 'scheduled'),
+    (2, 1, 2, 1, '2024-01-10', 'semi_final', 'scheduled'),
+    (3, 2, 1, 1, '2024-01-11', 'semi_final', 'scheduled');
+CREATE INDEX ix_matches_tournament_date ON matches (tournament_id, date);
+"""
+
+def main():
+    connection = sqlite3.connect(path)
+    connection.executescript(BASELINE_SCHEMA)
+    connection.close()
+
+    from app import app
+    from datetime import datetime
+    from sqlalchemy import inspect, text
+    from models import db, Match, Player
+    from models.match_event import GOAL, record_match_events
+
+    with app.app_context():
+        columns = {column['name']: column for column in inspect(db.engine).get_columns('matches')}
+        assert columns['home_team_id']['nullable'] and columns['away_team_id']['nullable'], \
+            'the team columns still refuse TBD teams'
+        stale = db.session.execute(text(
+            "SELECT name FROM sqlite_master WHERE sql LIKE '%matches_old%' OR sql LIKE '%matches_new%'"
+        )).scalars().all()
+        assert not stale, f'tables still reference the rebuilt copy: {stale}'
+        indexes = {index['name'] for index in inspect(db.engine).get_indexes('matches')}
+        assert 'ix_matches_tournament_date' in indexes, 'the existing indexes were lost'
+        assert db.session.get(Match, 1) is not None, 'the existing match was lost'
+        slots = sorted(db.session.get(Match, match_id).bracket_slot for match_id in (2, 3))
+        assert slots == [2, 3], f'the existing semi-finals were not slotted: {slots}'
+
+        final = Match(tournament_id=1, date=datetime(2024, 1, 14), stage='final', status='scheduled', bracket_slot=1)
+        db.session.add(final)
+        db.session.flush()
+        assert final.home_team_id is None, 'a TBD final could not be inserted'
+
+        db.session.execute(text('PRAGMA foreign_keys=ON'))
+        player = Player(first_name='Ana', last_name='Souza', team_id=1)
+        db.session.add(player)
+        db.session.flush()
+        record_match_events(db.session.get(Match, 1), [(GOAL, player, 10)])
+        db.session.commit()
+
+    print("✅ Baseline database upgraded: TBD teams, slotted knockout matches, match events")
+
+if __name__ == '__main__':
+    main()
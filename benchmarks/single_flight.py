@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark request coalescing after a score change
+
+Forks a few workers sharing one SQLite database and lock directory, then
+lets every thread of every worker ask for the same cold tournament page,
+standings and bracket.json at once. Reports how many renders actually ran
+against how many requests were served.
+
+Usage: python benchmarks/single_flight.py [workers] [threads]
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+workdir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'flight.db')
+os.environ['SINGLE_FLIGHT_DIR'] = os.path.join(workdir, 'flight')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import app
+from models import db, Tournament, Team, Match, Group
+from models.single_flight import single_flight_stats
+from models.team_standing import rebuild_standings
+
+URLS = ['/tournament/{t}', '/tournament/{t}/standings', '/tournament/{t}/bracket.json']
+
+def seed(groups=8, teams_per_group=6):
+    now = datetime.now()
+    tournament = Tournament(name='Flight Cup', description='Synthetic', start_date=now,
+                            end_date=now, status='active')
+    db.session.add(tournament)
+    db.session.flush()
+    for g in range(groups):
+        group = Group(name=f'G{g}', tournament_id=tournament.id)
+        db.session.add(group)
+        db.session.flush()
+        teams = [Team(name=f'G{g} Team {i}', tournament_id=tournament.id, group_id=group.id)
+                 for i in range(teams_per_group)]
+        db.session.add_all(teams)
+        db.session.flush()
+        for i, home in enumerate(teams):
+            for away in teams[i + 1:]:
+                db.session.add(Match(home_team_id=home.id, away_team_id=away.id,
+                                     tournament_id=tournament.id, date=now + timedelta(hours=i),
+                                     group_name=group.name, home_score=i % 3, away_score=1,
+                                     status='completed'))
+    db.session.commit()
+    rebuild_standings(tournament.id)
+    db.session.commit()
+    return tournament.id
+
+def worker(tournament_id, threads, start_at, results):
+    client = app.test_client()
+    barrier = threading.Barrier(threads)
+    statuses = []
+    def spectator():
+        barrier.wait()
+        for url in URLS:
+            statuses.append(client.get(url.format(t=tournament_id)).status_code)
+    while time.time() < start_at:
+        time.sleep(0.001)
+    pool = [threading.Thread(target=spectator) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put((statuses, single_flight_stats()))
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 25
+
+    with app.app_context():
+        tournament_id = seed()
+
+    results = multiprocessing.Queue()
+    start_at = time.time() + 1
+    processes = [multiprocessing.Process(target=worker, args=(tournament_id, threads, start_at, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    totals = {}
+    statuses = []
+    for _ in processes:
+        worker_statuses, stats = results.get()
+        statuses += worker_statuses
+        for name, counters in stats.items():
+            for counter, value in counters.items():
+                totals.setdefault(name, {}).setdefault(counter, 0)
+                totals[name][counter] += value
+    for process in processes:
+        process.join()
+    elapsed = time.time() - start_at
+
+    print(f"{workers} workers x {threads} threads x {len(URLS)} pages in {elapsed:.2f}s")
+    for name, counters in sorted(totals.items()):
+        print(f"  {name:<10} computed {counters['computed']:>4}  coalesced {counters['coalesced']:>4}  "
+              f"shared {counters['shared']:>4}  timeouts {counters['timeouts']:>4}")
+    assert statuses and all(status == 200 for status in statuses), 'a request failed'
+    renders = totals['page']['computed']
+    # One render per page, plus at most one per worker that timed out waiting
+    assert renders <= 2 + totals['page']['timeouts'], f'{renders} page renders for 2 pages'
+    print(f"✅ {len(statuses)} requests served with {renders} page renders")
+
+if __name__ == '__main__':
+    main()
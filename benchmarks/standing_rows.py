@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-row type('Standing', ...) classes vs. the slotted StandingRow
+
+Usage: python benchmarks/standing_rows.py [teams]
+"""
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from models.standings import StandingRow
+
+STATS = {
+    'matches_played': 10, 'wins': 5, 'draws': 3, 'losses': 2,
+    'goals_for': 17, 'goals_against': 9, 'goal_difference': 8, 'points': 18
+}
+
+def dynamic_rows(teams):
+    """The previous approach: a brand-new class for every row"""
+    return [
+        type('Standing', (), {'team': None, 'id': i, 'name': f'Team {i}', 'group_name': 'A', **STATS})()
+        for i in range(teams)
+    ]
+
+def slotted_rows(teams):
+    """One shared slotted dataclass for every row"""
+    return [
+        StandingRow(team=None, id=i, name=f'Team {i}', group_name='A', **STATS)
+        for i in range(teams)
+    ]
+
+def measure(build, teams, repeat=20):
+    """Return (best seconds per table, bytes allocated per table, objects left for the cyclic GC)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build(teams)
+        best = min(best, time.perf_counter() - start)
+    
+    gc.collect()
+    tracemalloc.start()
+    rows = build(teams)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    
+    del rows
+    cyclic = gc.collect()
+    return best, allocated, cyclic
+
+def main():
+    teams = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(f"Building a {teams}-team standings table")
+    results = {}
+    for label, build in (('type()', dynamic_rows), ('StandingRow', slotted_rows)):
+        seconds, allocated, cyclic = measure(build, teams)
+        results[label] = (seconds, allocated)
+        print(f"  {label:<12} {seconds * 1000:8.2f} ms  {allocated / 1024:9.1f} KiB  {cyclic:6d} objects freed by cyclic GC")
+    
+    old, new = results['type()'], results['StandingRow']
+    print(f"  speedup {old[0] / new[0]:.1f}x, memory {old[1] / new[1]:.1f}x smaller")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark the autocomplete index: build time, memory and query latency
+
+Seeds a synthetic database of players (100k by default) on a few thousand
+teams, builds the suggest index from its search documents and times
+prefix, multi-word and mistyped queries. Fails if the median query takes
+a millisecond or more.
+
+Usage: python benchmarks/suggest.py [players]
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'suggest.db')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import insert
+
+from app import app
+from models import db, Tournament, Team, Player
+from models.search import rebuild_search_index
+from models.suggest import SuggestIndex
+
+FIRST_NAMES = ['João', 'Pedro', 'Lucas', 'Mateus', 'Gabriel', 'Rafael', 'Gustavo', 'Felipe', 'Bruno',
+               'Thiago', 'André', 'Diego', 'Rodrigo', 'Marcelo', 'Vinícius', 'Leonardo', 'Caio', 'Igor']
+SYLLABLES = ['ma', 'ri', 'so', 'sa', 'li', 've', 'ra', 'fer', 'nan', 'des', 'gar', 'ci', 'o', 'al',
+             'mei', 'da', 'cos', 'ta', 'ro', 'dri', 'gues', 'pe', 'rei', 'ba', 'tis']
+QUERIES = ['jo', 'pedro', 'gab sil', 'marcelo da', 'fernandes', 'vinicius', 'tiago', 'rodirgo', 'fc 12', 'zzzz']
+
+def surname(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+
+def seed(players, teams=4000):
+    rng = random.Random(7)
+    now = datetime.now()
+    tournament = Tournament(name='Suggest Cup', description='Synthetic', start_date=now, end_date=now)
+    db.session.add(tournament)
+    db.session.flush()
+    team_ids = db.session.execute(insert(Team).returning(Team.id), [
+        {'name': f'{surname(rng)} FC {i}', 'tournament_id': tournament.id} for i in range(teams)
+    ]).scalars().all()
+    db.session.execute(insert(Player), [
+        {'first_name': rng.choice(FIRST_NAMES), 'last_name': f'{surname(rng)} {surname(rng)}',
+         'team_id': team_ids[i % teams]}
+        for i in range(players)
+    ])
+    db.session.commit()
+    rebuild_search_index()
+
+def main():
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with app.app_context():
+        seed(players)
+
+        # Memory from a separate build: tracing slows every allocation down
+        tracemalloc.start()
+        traced = SuggestIndex()
+        traced.build(version=0)
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del traced
+
+        index = SuggestIndex()
+        index.build(version=0)
+        stats = index.stats()
+        print(f"{stats['entries']} names, {stats['words']} words: "
+              f"built in {stats['build_seconds']:.2f}s, {memory / 1024 / 1024:.1f} MB")
+
+        medians = []
+        for query in QUERIES:
+            timings = []
+            for _ in range(200):
+                started = time.perf_counter()
+                suggestions = index.suggest(query)
+                timings.append((time.perf_counter() - started) * 1000)
+            median = statistics.median(timings)
+            medians.append(median)
+            top = suggestions[0].name if suggestions else '-'
+            print(f"  {query!r:<14} {len(suggestions):>2} results  median {median:.3f} ms  "
+                  f"p99 {sorted(timings)[int(len(timings) * 0.99)]:.3f} ms  top: {top}")
+
+    assert max(medians) < 1.0, f'slowest median {max(medians):.3f} ms'
+    print(f"✅ Every query under 1 ms (slowest median {max(medians):.3f} ms)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Gzip/Brotli compression of dynamic responses
+
+Responses of an allowed content type and at least COMPRESS_MIN_SIZE bytes
+are compressed with the best encoding the client accepts: Brotli when the
+optional brotli package is installed, gzip otherwise. Streams (the live
+score feed) and files (static assets, served precompressed by
+static_assets) pass through untouched.
+
+Compressed bodies of responses with an ETag are kept by (path, ETag,
+encoding), so a page served from the page cache is not compressed again
+for every visitor.
+"""
+
+import gzip
+
+from flask import request
+
+from page_cache import PageCache
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_MIMETYPES = (
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'image/svg+xml',
+)
+# Dynamic bodies: fast settings, most of the gain of the maximum levels
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+compressed_cache = PageCache(max_bytes=16 * 1024 * 1024)
+
+_min_size = DEFAULT_MIN_SIZE
+_mimetypes = frozenset(DEFAULT_MIMETYPES)
+
+
+def available_encodings():
+    """Encodings this worker can produce, best first"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(encodings):
+    """First of encodings the request accepts, or None for identity"""
+    accepted = request.accept_encodings
+    for encoding in encodings:
+        if accepted[encoding] > 0:
+            return encoding
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _compressible(response):
+    if request.method == 'HEAD' or response.status_code != 200:
+        return False
+    if response.direct_passthrough or response.is_streamed:
+        return False
+    if 'Content-Encoding' in response.headers or response.mimetype not in _mimetypes:
+        return False
+    return response.calculate_content_length() >= _min_size
+
+
+def _compress_response(response):
+    # Caches must keep the encodings apart, whether or not this one is compressed
+    if response.mimetype in _mimetypes:
+        response.vary.add('Accept-Encoding')
+    if not _compressible(response):
+        return response
+    encoding = negotiate_encoding(available_encodings())
+    if encoding is None:
+        return response
+
+    etag, weak = response.get_etag()
+    key = (request.full_path, etag, encoding) if etag else None
+    body = compressed_cache.get(key) if key else None
+    if body is None:
+        body = compress(response.get_data(), encoding)
+        if key:
+            compressed_cache.put(key, body)
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    if etag and not weak:
+        # The bytes differ per encoding; a weak tag still revalidates the same content
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app):
+    """Register the compression hook, configured from COMPRESS_MIN_SIZE and COMPRESS_MIMETYPES"""
+    global _min_size, _mimetypes
+    _min_size = int(app.config.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE))
+    _mimetypes = frozenset(app.config.get('COMPRESS_MIMETYPES') or DEFAULT_MIMETYPES)
+    compressed_cache.clear()
+    app.after_request(_compress_response)
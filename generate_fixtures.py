@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Generate group stage fixtures from the command line
+
+Usage:
+    python generate_fixtures.py <tournament_id>            # every group without fixtures
+    python generate_fixtures.py <tournament_id> --league   # round-robin between all teams
+    python generate_fixtures.py <tournament_id> --double   # home and away (double round-robin)
+"""
+
+import sys
+
+from app import app
+from models import db
+from models.fixtures import generate_group_fixtures, generate_league_fixtures
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    
+    tournament_id = int(sys.argv[1])
+    league = '--league' in sys.argv[2:]
+    legs = 2 if '--double' in sys.argv[2:] else 1
+    
+    with app.app_context():
+        if league:
+            created = generate_league_fixtures(tournament_id, legs=legs)
+            db.session.commit()
+            print(f"✅ Generated {created} league matches")
+            return
+        
+        result = generate_group_fixtures(tournament_id, legs=legs)
+        db.session.commit()
+        
+        for name, count in result.groups_processed:
+            print(f"  Group {name}: {count} matches")
+        for name in result.groups_with_matches:
+            print(f"  Group {name}: skipped, matches already exist")
+        for name in result.groups_too_small:
+            print(f"  Group {name}: skipped, fewer than 2 teams")
+        print(f"✅ Generated {result.matches_created} matches for {len(result.groups_processed)} groups")
+
+if __name__ == '__main__':
+    main()
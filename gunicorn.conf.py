@@ -0,0 +1,31 @@
+"""
+Gunicorn settings, read by `gunicorn app:app` from the working directory
+
+Live score streams (/live/stream) hold their connection open, so workers are
+gevent ones. psycopg2 is a C driver gevent cannot patch: without psycogreen's
+wait callback every PostgreSQL query would block the whole worker, streams
+included.
+
+Gunicorn itself reads the bind address from $PORT and the number of workers
+from $WEB_CONCURRENCY.
+"""
+
+worker_class = 'gevent'
+worker_connections = 1000
+
+
+def post_fork(server, worker):
+    """Make psycopg2 yield to other greenlets while it waits for PostgreSQL"""
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+
+def post_worker_init(worker):
+    """Start this worker's pool of simulation processes (see models.simulation)"""
+    from models.simulation import simulation_workers, start_simulation_pool
+    start_simulation_pool(simulation_workers(worker.wsgi.config))
+
+
+def worker_exit(server, worker):
+    from models.simulation import stop_simulation_pool
+    stop_simulation_pool()
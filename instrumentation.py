@@ -0,0 +1,179 @@
+"""
+Per-request instrumentation: SQL statement count and time, slowest statement,
+template render time, sent as a Server-Timing header and a JSON log line.
+The slowest statement's SQL is only logged for requests slower than
+SLOW_QUERY_THRESHOLD_MS, cut to MAX_LOGGED_STATEMENT characters.
+
+Statements slower than SLOW_QUERY_THRESHOLD_MS are written, with their
+EXPLAIN plan, to a rotating slow-query log.
+"""
+
+import json
+import logging
+import os
+import time
+from logging.handlers import RotatingFileHandler
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+request_logger = logging.getLogger('soccer.requests')
+slow_query_logger = logging.getLogger('soccer.slow_queries')
+
+# Set by init_instrumentation(); None disables the slow-query log
+_slow_query_threshold = None
+# Characters of SQL kept in a request's log line
+MAX_LOGGED_STATEMENT = 300
+
+
+def _metrics():
+    """Get the metrics of the current request, or None outside of a request"""
+    if not has_request_context():
+        return None
+    if '_request_metrics' not in g:
+        g._request_metrics = {
+            'started': time.perf_counter(),
+            'db_queries': 0,
+            'db_seconds': 0.0,
+            'slowest_seconds': 0.0,
+            'slowest_statement': None,
+            'template_seconds': 0.0,
+            'template_stack': []
+        }
+    return g._request_metrics
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # On the statement's own context: a statement that fails leaves nothing behind
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    if conn.info.get('explaining'):
+        return
+
+    metrics = _metrics()
+    if metrics is not None:
+        metrics['db_queries'] += 1
+        metrics['db_seconds'] += elapsed
+        if elapsed > metrics['slowest_seconds']:
+            metrics['slowest_seconds'] = elapsed
+            metrics['slowest_statement'] = statement
+
+    if _slow_query_threshold is not None and elapsed * 1000 >= _slow_query_threshold:
+        _log_slow_query(conn, statement, parameters, executemany, elapsed)
+
+
+def _log_slow_query(conn, statement, parameters, executemany, elapsed):
+    """Write a slow statement and its query plan to the slow-query log"""
+    plan = []
+    if not executemany and statement.lstrip().upper().startswith('SELECT'):
+        prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+        conn.info['explaining'] = True
+        try:
+            rows = conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+            plan = [str(row[-1]) for row in rows]
+        except Exception as e:
+            plan = [f'EXPLAIN failed: {e}']
+        finally:
+            conn.info['explaining'] = False
+
+    slow_query_logger.warning(json.dumps({
+        'path': request.path if has_request_context() else None,
+        'duration_ms': round(elapsed * 1000, 2),
+        'statement': statement,
+        'parameters': repr(parameters)[:500],
+        'plan': plan
+    }))
+
+
+def _before_render_template(sender, template, context, **extra):
+    metrics = _metrics()
+    if metrics is not None:
+        metrics['template_stack'].append(time.perf_counter())
+
+
+def _template_rendered(sender, template, context, **extra):
+    metrics = _metrics()
+    if metrics is not None and metrics['template_stack']:
+        started = metrics['template_stack'].pop()
+        # Only count the outermost render; nested renders are already included
+        if not metrics['template_stack']:
+            metrics['template_seconds'] += time.perf_counter() - started
+
+
+def _start_request():
+    _metrics()
+
+
+def _finish_request(response):
+    metrics = _metrics()
+    total_ms = (time.perf_counter() - metrics['started']) * 1000
+    db_ms = metrics['db_seconds'] * 1000
+    template_ms = metrics['template_seconds'] * 1000
+    slowest_ms = metrics['slowest_seconds'] * 1000
+
+    response.headers['Server-Timing'] = ', '.join([
+        f'db;dur={db_ms:.2f};desc="{metrics["db_queries"]} queries"',
+        f'db-slowest;dur={slowest_ms:.2f}',
+        f'tpl;dur={template_ms:.2f}',
+        f'total;dur={total_ms:.2f}'
+    ])
+
+    line = {
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'duration_ms': round(total_ms, 2),
+        'db_queries': metrics['db_queries'],
+        'db_ms': round(db_ms, 2),
+        'slowest_query_ms': round(slowest_ms, 2),
+        'template_ms': round(template_ms, 2)
+    }
+    statement = metrics['slowest_statement']
+    # The SQL only helps on slow requests, and can be long
+    if statement and _slow_query_threshold is not None and total_ms >= _slow_query_threshold:
+        line['slowest_query'] = ' '.join(statement.split())[:MAX_LOGGED_STATEMENT]
+    request_logger.info(json.dumps(line))
+    return response
+
+
+def init_instrumentation(app):
+    """Register the request hooks and configure the request and slow-query logs"""
+    global _slow_query_threshold
+
+    app.config.setdefault('SLOW_QUERY_THRESHOLD_MS', 100)
+    app.config.setdefault('SLOW_QUERY_LOG', os.path.join(app.instance_path, 'slow_queries.log'))
+
+    threshold = app.config['SLOW_QUERY_THRESHOLD_MS']
+    _slow_query_threshold = float(threshold) if threshold not in (None, '') else None
+
+    if _slow_query_threshold is not None and not slow_query_logger.handlers:
+        log_path = app.config['SLOW_QUERY_LOG']
+        os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+        handler = RotatingFileHandler(log_path, maxBytes=1024 * 1024, backupCount=5)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        slow_query_logger.addHandler(handler)
+        slow_query_logger.setLevel(logging.WARNING)
+        slow_query_logger.propagate = False
+
+    if not request_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+        request_logger.addHandler(handler)
+        request_logger.setLevel(logging.INFO)
+        request_logger.propagate = False
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_before_render_template, app)
+    template_rendered.connect(_template_rendered, app)
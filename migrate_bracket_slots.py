@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Migration script for slot-indexed knockout brackets
+
+- Adds the bracket_slot, next_slot and loser_next_slot columns to matches
+- Makes home_team_id/away_team_id nullable so later rounds can wait for
+  their teams (PostgreSQL: ALTER COLUMN; SQLite: the table is rebuilt)
+- Gives existing knockout matches a slot, in creation order per stage
+
+Safe to run more than once.
+"""
+
+import re
+
+from sqlalchemy import bindparam, inspect, text
+
+from models import db
+
+SLOT_COLUMNS = ('bracket_slot', 'next_slot', 'loser_next_slot')
+
+def _rebuild_sqlite_matches(connection):
+    """SQLite cannot drop NOT NULL: copy the table into a freshly created one
+
+    The new table is the old one's CREATE TABLE without NOT NULL on the team
+    columns, so its foreign keys and every other column stay as they were.
+    Follows SQLite's documented order (new table, copy, drop, rename the new
+    one): renaming the old table instead would make every table that
+    references matches, such as match_events, point at the dropped copy.
+    """
+    schema = connection.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'matches'"
+    )).scalar()
+    schema, relaxed = re.subn(r'(\b(?:home|away)_team_id"?\s[^,]*?)\s+NOT\s+NULL', r'\1', schema, flags=re.IGNORECASE)
+    if relaxed != 2:
+        raise RuntimeError(f'Unexpected matches schema, team columns not found: {schema}')
+    schema = re.sub(r'^CREATE TABLE\s+("?)matches\1', 'CREATE TABLE matches_new', schema, flags=re.IGNORECASE)
+    indexes = connection.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'matches' AND sql IS NOT NULL"
+    )).scalars().all()
+
+    connection.execute(text(schema))
+    connection.execute(text('INSERT INTO matches_new SELECT * FROM matches'))
+    connection.execute(text('DROP TABLE matches'))
+    connection.execute(text('ALTER TABLE matches_new RENAME TO matches'))
+    for index in indexes:
+        connection.execute(text(index))
+
+def _assign_existing_slots(connection):
+    """Number existing knockout matches of each tournament and stage in id order"""
+    from models.bracket import KNOCKOUT_STAGES, slot_links, stage_slots
+
+    rows = connection.execute(text(
+        'SELECT id, tournament_id, stage FROM matches '
+        'WHERE bracket_slot IS NULL AND stage IN :stages ORDER BY tournament_id, stage, id'
+    ).bindparams(bindparam('stages', expanding=True)), {'stages': list(KNOCKOUT_STAGES)}).all()
+    if not rows:
+        return 0
+
+    has_third_place = {
+        tournament_id for (tournament_id,) in connection.execute(
+            text("SELECT DISTINCT tournament_id FROM matches WHERE stage = 'third_place'")
+        )
+    }
+    used = {}
+    for tournament_id, slot in connection.execute(
+        text('SELECT tournament_id, bracket_slot FROM matches WHERE bracket_slot IS NOT NULL')
+    ):
+        used.setdefault(tournament_id, set()).add(slot)
+
+    updates = []
+    for match_id, tournament_id, stage in rows:
+        taken = used.setdefault(tournament_id, set())
+        slot = next((slot for slot in stage_slots(stage) if slot not in taken), None)
+        if slot is None:
+            continue  # More matches than the stage has slots; leave it unslotted
+        taken.add(slot)
+        updates.append({'id': match_id, **slot_links(slot, tournament_id in has_third_place)})
+
+    if updates:
+        connection.execute(text(
+            'UPDATE matches SET bracket_slot = :bracket_slot, next_slot = :next_slot, '
+            'loser_next_slot = :loser_next_slot WHERE id = :id'
+        ), updates)
+    return len(updates)
+
+def migrate_bracket_slots():
+    """Add the bracket columns, relax the team columns and slot existing knockout matches"""
+    engine = db.engine
+    inspector = inspect(engine)
+    if 'matches' not in inspector.get_table_names():
+        return  # create_all() builds the new schema
+
+    columns = {column['name']: column for column in inspector.get_columns('matches')}
+    missing = [name for name in SLOT_COLUMNS if name not in columns]
+    needs_nullable = not columns['home_team_id']['nullable'] or not columns['away_team_id']['nullable']
+
+    with engine.begin() as connection:
+        for name in missing:
+            print(f"Adding {name} column to matches table...")
+            connection.execute(text(f'ALTER TABLE matches ADD COLUMN {name} INTEGER'))
+
+        if needs_nullable:
+            print("Allowing TBD teams in knockout matches...")
+            if engine.dialect.name == 'sqlite':
+                _rebuild_sqlite_matches(connection)
+            else:
+                connection.execute(text('ALTER TABLE matches ALTER COLUMN home_team_id DROP NOT NULL'))
+                connection.execute(text('ALTER TABLE matches ALTER COLUMN away_team_id DROP NOT NULL'))
+
+        # Unslotted knockout matches, not just on the first run: a failed run is retried
+        slotted = _assign_existing_slots(connection)
+
+    if missing or needs_nullable or slotted:
+        print(f"✅ Bracket migration completed ({slotted} knockout matches slotted)")
+
+if __name__ == '__main__':
+    from app import app
+    with app.app_context():
+        migrate_bracket_slots()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Migration script for the clean_sheets column of team_standings
+
+Adds the column and rebuilds the standings so existing rows count the
+clean sheets of the matches already played. Safe to run more than once.
+"""
+
+from sqlalchemy import inspect, text
+
+from models import db
+from models.team_standing import rebuild_standings
+
+def migrate_clean_sheets():
+    """Add team_standings.clean_sheets if it is missing"""
+    engine = db.engine
+    inspector = inspect(engine)
+    if 'team_standings' not in inspector.get_table_names():
+        return False  # create_all() builds the new schema
+    
+    columns = {column['name'] for column in inspector.get_columns('team_standings')}
+    if 'clean_sheets' in columns:
+        return False
+    
+    print("Adding clean_sheets column to team_standings...")
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE team_standings ADD COLUMN clean_sheets INTEGER NOT NULL DEFAULT 0'))
+    rows = rebuild_standings()
+    db.session.commit()
+    print(f"✅ team_standings.clean_sheets added ({rows} teams rebuilt)")
+    return True
+
+if __name__ == '__main__':
+    from app import app
+    with app.app_context():
+        migrate_clean_sheets()
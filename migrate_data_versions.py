@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Migration script for the updated_at column of data_versions
+
+The column holds when a version last moved and is sent as Last-Modified.
+Existing rows are stamped with the migration time. Safe to run more than once.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from models import db
+
+def migrate_data_versions():
+    """Add data_versions.updated_at if it is missing"""
+    engine = db.engine
+    inspector = inspect(engine)
+    if 'data_versions' not in inspector.get_table_names():
+        return False  # create_all() builds the new schema
+    
+    columns = {column['name'] for column in inspector.get_columns('data_versions')}
+    if 'updated_at' in columns:
+        return False
+    
+    print("Adding updated_at column to data_versions...")
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE data_versions ADD COLUMN updated_at TIMESTAMP'))
+        connection.execute(text('UPDATE data_versions SET updated_at = :now'), {'now': datetime.utcnow()})
+    print("✅ data_versions.updated_at added")
+    return True
+
+if __name__ == '__main__':
+    from app import app
+    with app.app_context():
+        migrate_data_versions()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Migration script to create the indexes declared on the models
+
+db.create_all() only creates indexes together with new tables, so existing
+databases need this once. Works on SQLite and PostgreSQL; partial indexes
+are created with their WHERE clause where the backend supports it.
+Indexes replaced by wider ones are dropped.
+"""
+
+from sqlalchemy import inspect, text
+
+from models import db
+
+# Indexes that a declared index has replaced: {table: [index names]}
+SUPERSEDED_INDEXES = {
+    'matches': ['ix_matches_date'],  # ix_matches_date_id
+    'tournaments': ['ix_tournaments_start_date'],  # ix_tournaments_start_date_id
+}
+
+def migrate_indexes():
+    """Create every declared index that does not exist yet"""
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue  # create_all() builds the table with its indexes
+        
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            if index.name in existing:
+                continue
+            print(f"Creating index {index.name} on {table.name}...")
+            index.create(bind=engine, checkfirst=True)
+            created.append(index.name)
+        
+        for name in SUPERSEDED_INDEXES.get(table.name, []):
+            if name in existing:
+                print(f"Dropping superseded index {name} on {table.name}...")
+                with engine.begin() as conn:
+                    conn.execute(text(f'DROP INDEX {name}'))
+    
+    if created:
+        print(f"✅ Created {len(created)} indexes")
+    else:
+        print("✅ All indexes already exist!")
+    return created
+
+if __name__ == '__main__':
+    from app import app
+    with app.app_context():
+        migrate_indexes()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Migration script for career totals kept from the match event log
+
+Players of databases created before the event log carry hand-entered
+career totals that no event accounts for: event deltas would be added on
+top of them, while rebuild_player_stats() starts again from zero. While the
+event log is still empty, those totals are reset once, so both agree.
+Safe to run more than once.
+"""
+
+from sqlalchemy import func, or_, select
+
+from models import db, MatchEvent, Player
+from models.player_stat import STAT_COLUMNS, rebuild_player_stats
+
+def migrate_player_stats():
+    """Reset career totals that predate the event log"""
+    if db.session.execute(select(MatchEvent.id).limit(1)).first() is not None:
+        return False  # Totals already come from the events
+    stale = db.session.execute(
+        select(Player.id).where(or_(*[func.coalesce(getattr(Player, column), 0) != 0 for column in STAT_COLUMNS])).limit(1)
+    ).first()
+    if stale is None:
+        return False
+
+    print("Resetting career totals entered before the match event log...")
+    rebuild_player_stats()
+    db.session.commit()
+    print("✅ Career totals now follow the match event log")
+    return True
+
+if __name__ == '__main__':
+    from app import app
+    with app.app_context():
+        migrate_player_stats()
@@ -9,6 +9,14 @@ from .team import Team
 from .match import Match
 from .player import Player
 from .group import Group
+from .team_standing import TeamStanding
+from .data_version import DataVersion
+from .live import LiveEvent
+from .change_log import ChangeLogEntry
+from .search import SearchDocument
+from .match_event import MatchEvent
+from .player_stat import PlayerStat
+from . import loading
 
 # This ensures all models are registered with the db instance
-__all__ = ['db', 'Tournament', 'Team', 'Match', 'Player']
+__all__ = ['db', 'Tournament', 'Team', 'Match', 'Player', 'Group', 'TeamStanding', 'DataVersion', 'LiveEvent', 'ChangeLogEntry', 'SearchDocument', 'MatchEvent', 'PlayerStat']
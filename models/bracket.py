@@ -0,0 +1,450 @@
+"""
+Slot-indexed knockout brackets
+
+Every knockout match has a bracket_slot numbered like a binary heap: the
+final is slot 1, the semi-finals 2-3, quarter-finals 4-7, round of 16 8-15,
+round of 32 16-31 and round of 64 32-63. The winner of slot s plays in slot
+s // 2, as the home team when s is even and the away team when s is odd.
+The third-place match is slot 0 and is fed by the semi-final losers.
+
+Both links are persisted on the match (next_slot, loser_next_slot), so
+recording a result moves the winner with one keyed UPDATE on
+(tournament_id, bracket_slot).
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import aliased
+from . import db
+from .change_log import MATCH, log_changes
+from .data_version import bump_data_version, DataVersion
+from .single_flight import single_flight
+
+THIRD_PLACE_SLOT = 0
+
+# Stage of the slots 2**(depth - 1) .. 2**depth - 1
+STAGE_BY_DEPTH = {
+    1: 'final',
+    2: 'semi_final',
+    3: 'quarter_final',
+    4: 'round_of_16',
+    5: 'round_of_32',
+    6: 'round_of_64'
+}
+DEPTH_BY_STAGE = {stage: depth for depth, stage in STAGE_BY_DEPTH.items()}
+MAX_BRACKET_SIZE = 2 ** max(STAGE_BY_DEPTH)
+
+# In playing order
+KNOCKOUT_STAGES = (
+    'round_of_64', 'round_of_32', 'round_of_16', 'quarter_final', 'semi_final', 'third_place', 'final'
+)
+
+STAGE_TITLES = {
+    'round_of_64': 'Round of 64',
+    'round_of_32': 'Round of 32',
+    'round_of_16': 'Round of 16',
+    'quarter_final': 'Quarter Finals',
+    'semi_final': 'Semi Finals',
+    'third_place': 'Third Place',
+    'final': 'Final'
+}
+
+# Date and venue of knockout matches until they are scheduled
+DEFAULT_VENUE = 'A definir'
+DAYS_BETWEEN_ROUNDS = 7
+
+
+def stage_for_slot(slot):
+    """Get the stage name of a bracket slot"""
+    if slot == THIRD_PLACE_SLOT:
+        return 'third_place'
+    return STAGE_BY_DEPTH[slot.bit_length()]
+
+
+def stage_slots(stage):
+    """Get the range of slots of a stage"""
+    if stage == 'third_place':
+        return range(THIRD_PLACE_SLOT, THIRD_PLACE_SLOT + 1)
+    depth = DEPTH_BY_STAGE[stage]
+    return range(2 ** (depth - 1), 2 ** depth)
+
+
+def slot_links(slot, third_place=False):
+    """Get the bracket columns of a match in slot: bracket_slot, next_slot, loser_next_slot"""
+    next_slot = slot // 2 if slot > 1 else None
+    loser_next_slot = THIRD_PLACE_SLOT if third_place and slot in (2, 3) else None
+    return {'bracket_slot': slot, 'next_slot': next_slot, 'loser_next_slot': loser_next_slot}
+
+
+def seed_order(size):
+    """Seeds (1-based) of the first-round positions, so that seeds 1 and 2 can only meet in the final
+
+    seed_order(8) == [1, 8, 4, 5, 2, 7, 3, 6]
+    """
+    order = [1, 2]
+    while len(order) < size:
+        total = len(order) * 2 + 1
+        order = [seed for position in order for seed in (position, total - position)]
+    return order[:size]
+
+
+def bracket_size(team_count):
+    """Get the power-of-two number of first-round positions for team_count teams"""
+    size = 2
+    while size < team_count:
+        size *= 2
+    return size
+
+
+@dataclass(frozen=True, slots=True)
+class Bracket:
+    """Knockout matches of a tournament grouped by stage"""
+    quarter_finals: list = field(default_factory=list)
+    semi_finals: list = field(default_factory=list)
+    final: list = field(default_factory=list)
+    third_place: list = field(default_factory=list)
+    # (stage, matches) of every round that has matches, first round first,
+    # matches in slot order (third place excluded)
+    rounds: list = field(default_factory=list)
+
+    @classmethod
+    def from_matches(cls, matches):
+        """Build the bracket with a single pass over the tournament's matches"""
+        by_stage = {stage: [] for stage in KNOCKOUT_STAGES}
+        for match in matches:
+            if match.stage in by_stage:
+                by_stage[match.stage].append(match)
+        for stage_matches in by_stage.values():
+            # Slotted matches in bracket order, manually created ones after them
+            stage_matches.sort(key=lambda m: (m.bracket_slot is None, m.bracket_slot or 0, m.id or 0))
+        return cls(
+            quarter_finals=by_stage['quarter_final'],
+            semi_finals=by_stage['semi_final'],
+            final=by_stage['final'],
+            third_place=by_stage['third_place'],
+            rounds=[
+                (stage, by_stage[stage]) for stage in KNOCKOUT_STAGES
+                if stage != 'third_place' and by_stage[stage]
+            ]
+        )
+
+    def is_empty(self):
+        return not self.rounds and not self.third_place
+
+
+def generate_bracket(tournament_id, team_ids, third_place=True, start_date=None):
+    """Create every match of a knockout bracket for seeded teams (best first)
+
+    The bracket is padded with byes to the next power of two; teams facing a
+    bye are placed directly in their second-round match. Later rounds are
+    created with TBD teams. Returns the created matches. The caller commits.
+    """
+    from .match import Match
+
+    team_ids = list(team_ids)
+    if len(team_ids) < 2:
+        raise ValueError('At least 2 teams are needed for a knockout bracket')
+    if len(team_ids) > MAX_BRACKET_SIZE:
+        raise ValueError(f'Knockout brackets support at most {MAX_BRACKET_SIZE} teams')
+
+    size = bracket_size(len(team_ids))
+    first_round = size // 2  # First slot of the first round, and its number of matches
+    third_place = third_place and size >= 4
+    start_date = start_date or datetime.now() + timedelta(days=DAYS_BETWEEN_ROUNDS)
+    rounds = first_round.bit_length()
+
+    matches = {}
+    for slot in range(1, size):
+        # The first round is played first, the final last
+        round_index = rounds - slot.bit_length()
+        matches[slot] = Match(
+            tournament_id=tournament_id,
+            stage=stage_for_slot(slot),
+            date=start_date + timedelta(days=DAYS_BETWEEN_ROUNDS * round_index),
+            venue=DEFAULT_VENUE,
+            status='scheduled',
+            **slot_links(slot, third_place)
+        )
+    if third_place:
+        matches[THIRD_PLACE_SLOT] = Match(
+            tournament_id=tournament_id,
+            stage='third_place',
+            date=matches[1].date,
+            venue=DEFAULT_VENUE,
+            status='scheduled',
+            **slot_links(THIRD_PLACE_SLOT)
+        )
+
+    seeds = seed_order(size)
+    for position in range(first_round):
+        slot = first_round + position
+        home_seed, away_seed = seeds[2 * position], seeds[2 * position + 1]
+        home_id = team_ids[home_seed - 1] if home_seed <= len(team_ids) else None
+        away_id = team_ids[away_seed - 1] if away_seed <= len(team_ids) else None
+        if home_id is not None and away_id is not None:
+            matches[slot].home_team_id = home_id
+            matches[slot].away_team_id = away_id
+            continue
+        # Bye: the seeded team goes straight to the next round and the slot has no match
+        del matches[slot]
+        if slot > 1:
+            next_match = matches[slot // 2]
+            if slot % 2 == 0:
+                next_match.home_team_id = home_id or away_id
+            else:
+                next_match.away_team_id = home_id or away_id
+
+    if third_place and (2 not in matches or 3 not in matches):
+        # A semi-final is a bye (3 teams): it has no loser to play for third place
+        del matches[THIRD_PLACE_SLOT]
+        for slot in (2, 3):
+            if slot in matches:
+                matches[slot].loser_next_slot = None
+
+    created = list(matches.values())
+    db.session.add_all(created)
+    return created
+
+
+def has_bracket(tournament_id):
+    """Check whether the tournament already has slotted knockout matches"""
+    from .match import Match
+
+    return db.session.execute(
+        select(Match.id).where(Match.tournament_id == tournament_id, Match.bracket_slot.is_not(None)).limit(1)
+    ).first() is not None
+
+
+def assign_free_slot(match, third_place=False):
+    """Give a manually created knockout match the first free slot of its stage
+
+    Matches of stages without slots, or of a full stage, are left unslotted.
+    """
+    from .match import Match
+
+    if match.stage not in KNOCKOUT_STAGES:
+        return None
+    slots = stage_slots(match.stage)
+    used = set(db.session.execute(
+        select(Match.bracket_slot).where(
+            Match.tournament_id == match.tournament_id,
+            Match.bracket_slot >= slots.start,
+            Match.bracket_slot < slots.stop
+        )
+    ).scalars())
+    for slot in slots:
+        if slot not in used:
+            for column, value in slot_links(slot, third_place).items():
+                setattr(match, column, value)
+            return slot
+    return None
+
+
+def _fill_slot(tournament_id, slot, from_slot, team_id):
+    """Put team_id on the side of slot fed by from_slot, creating the match if needed
+
+    Matches that have already started keep their teams. Returns whether the
+    team was placed.
+    """
+    from .match import Match
+
+    column = 'home_team_id' if from_slot % 2 == 0 else 'away_team_id'
+    # Bulk UPDATEs skip the flush listeners, so bump the bracket version here
+    bump_data_version(tournament_id, 'bracket')
+    result = db.session.execute(
+        update(Match)
+        .where(
+            Match.tournament_id == tournament_id,
+            Match.bracket_slot == slot,
+            Match.status == 'scheduled'
+        )
+        .values({column: team_id})
+        .returning(Match.id)
+    )
+    match_id = result.scalar()
+    if match_id is not None:
+        log_changes(MATCH, [(tournament_id, match_id)])
+        return True
+
+    # Not created yet (manually built bracket), or already played
+    exists = db.session.execute(
+        select(Match.id).where(Match.tournament_id == tournament_id, Match.bracket_slot == slot)
+    ).first()
+    if exists is not None:
+        return False
+
+    db.session.add(Match(
+        tournament_id=tournament_id,
+        stage=stage_for_slot(slot),
+        date=datetime.now() + timedelta(days=DAYS_BETWEEN_ROUNDS),
+        venue=DEFAULT_VENUE,
+        status='scheduled',
+        **{column: team_id},
+        **slot_links(slot)
+    ))
+    return True
+
+
+def advance_knockout_result(match):
+    """Move the winner of a completed knockout match (and a semi-final loser) downstream
+
+    A draw moves nobody. Correcting a result moves the new winner into the
+    same side of the same slot, replacing the previous one. Returns the
+    slots that received a team.
+    """
+    if match.bracket_slot is None and assign_free_slot(match) is None:
+        return []
+
+    if match.status != 'completed' or match.home_score == match.away_score:
+        return []
+    if match.home_score > match.away_score:
+        winner_id, loser_id = match.home_team_id, match.away_team_id
+    else:
+        winner_id, loser_id = match.away_team_id, match.home_team_id
+
+    filled = []
+    for slot, team_id in ((match.next_slot, winner_id), (match.loser_next_slot, loser_id)):
+        if slot is not None and team_id is not None:
+            if _fill_slot(match.tournament_id, slot, match.bracket_slot, team_id):
+                filled.append(slot)
+    return filled
+
+
+def _team_json(team_id, name, logo_url):
+    if team_id is None:
+        return None
+    return {'id': team_id, 'name': name, 'logo_url': logo_url}
+
+
+def build_bracket_document(tournament_id, version=0):
+    """Build the bracket JSON document of a tournament with a single query
+
+    {"tournament_id", "version", "rounds": [{"stage", "title", "matches"}],
+    "third_place": match or null, "champion_id"}; each match has its slot
+    links, both teams (null while TBD), scores, status and winner_id.
+    """
+    from .match import Match
+    from .team import Team
+
+    home, away = aliased(Team), aliased(Team)
+    rows = db.session.execute(
+        select(
+            Match.id, Match.stage, Match.bracket_slot, Match.next_slot, Match.loser_next_slot,
+            Match.home_team_id, home.name, home.logo_url,
+            Match.away_team_id, away.name, away.logo_url,
+            Match.home_score, Match.away_score, Match.status, Match.date, Match.venue, Match.field
+        )
+        .outerjoin(home, home.id == Match.home_team_id)
+        .outerjoin(away, away.id == Match.away_team_id)
+        .where(Match.tournament_id == tournament_id, Match.stage.in_(KNOCKOUT_STAGES))
+        # Slotted matches in bracket order, manually created ones after them
+        .order_by(Match.bracket_slot.is_(None), Match.bracket_slot, Match.id)
+    ).all()
+
+    by_stage = {stage: [] for stage in KNOCKOUT_STAGES}
+    for row in rows:
+        winner_id = None
+        if row.status == 'completed' and row.home_score != row.away_score:
+            winner_id = row.home_team_id if row.home_score > row.away_score else row.away_team_id
+        by_stage[row.stage].append({
+            'id': row.id,
+            'slot': row.bracket_slot,
+            'next_slot': row.next_slot,
+            'loser_next_slot': row.loser_next_slot,
+            'home': _team_json(row.home_team_id, row[6], row[7]),
+            'away': _team_json(row.away_team_id, row[9], row[10]),
+            'home_score': row.home_score,
+            'away_score': row.away_score,
+            'status': row.status,
+            'winner_id': winner_id,
+            'date': row.date.isoformat() if row.date else None,
+            'venue': row.venue,
+            'field': row.field
+        })
+
+    final = by_stage['final']
+    return {
+        'tournament_id': tournament_id,
+        'version': version,
+        'rounds': [
+            {'stage': stage, 'title': STAGE_TITLES[stage], 'matches': by_stage[stage]}
+            for stage in KNOCKOUT_STAGES
+            if stage != 'third_place' and by_stage[stage]
+        ],
+        'third_place': by_stage['third_place'][0] if by_stage['third_place'] else None,
+        'champion_id': final[0]['winner_id'] if final else None
+    }
+
+
+class BracketCache:
+    """Serialized bracket documents per tournament, valid for one data version
+
+    Each worker keeps its own copy; the version row tells it when another
+    worker changed the bracket. Least recently used tournaments are evicted.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, tournament_id, version):
+        with self._lock:
+            entry = self._entries.get(tournament_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(tournament_id)
+            return entry[1], entry[2]
+
+    def put(self, tournament_id, version, body, etag):
+        with self._lock:
+            self._entries[tournament_id] = (version, body, etag)
+            self._entries.move_to_end(tournament_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+bracket_cache = BracketCache()
+bracket_flight = single_flight('bracket')
+
+
+def get_bracket_json(tournament_id):
+    """Get (body bytes, etag) of a tournament's bracket document, or None if there is no such tournament
+
+    One keyed query checks the tournament and its bracket version; the
+    document is only rebuilt when the version moved, by one caller at a
+    time: concurrent ones share its result.
+    """
+    from .tournament import Tournament
+
+    row = db.session.execute(
+        select(Tournament.id, DataVersion.version)
+        .outerjoin(DataVersion, (DataVersion.tournament_id == Tournament.id) & (DataVersion.scope == 'bracket'))
+        .where(Tournament.id == tournament_id)
+    ).first()
+    if row is None:
+        return None
+    version = row.version or 0
+
+    cached = bracket_cache.get(tournament_id, version)
+    if cached is not None:
+        return cached
+
+    body = bracket_flight.run(
+        tournament_id,
+        lambda: json.dumps(build_bracket_document(tournament_id, version), separators=(',', ':')).encode('utf-8'),
+        version
+    )
+    etag = hashlib.sha1(body).hexdigest()[:20]
+    bracket_cache.put(tournament_id, version, body, etag)
+    return body, etag
@@ -0,0 +1,189 @@
+"""
+Change log of tournament data, read by the /tournament/<id>/changes feed
+
+Every Match, Team, Group and standings row that is inserted, updated or
+deleted gets a change_log entry in the same transaction. Entry ids only
+grow, so a client keeps the id of the last entry it has seen as its
+version and asks for what changed since.
+
+Ids come from a sequence, handed out when the row is inserted, not when it
+commits: on PostgreSQL a transaction holding id 10 could commit after one
+holding id 11, and a client that already read 11 would never see 10. So
+the tournament's 'data' version row is bumped before the entries are
+inserted: the upsert locks that row until commit, and the entries of a
+tournament are numbered by one transaction at a time, in commit order.
+
+ORM changes are logged by a flush listener; bulk statements (fixture
+inserts, rescheduling, bracket advancement, standings deltas) bypass the
+unit of work and call log_changes() themselves. Logging a change also
+bumps the tournament's 'data' version, which keys the page cache.
+"""
+
+from sqlalchemy import event, func, insert, select
+from sqlalchemy.orm import Session
+from . import db
+from .data_version import bump_tournament_data
+
+MATCH = 'match'
+TEAM = 'team'
+GROUP = 'group'
+STANDING = 'standing'  # entity_id is the team id
+
+DEFAULT_FEED_LIMIT = 500
+MAX_FEED_LIMIT = 1000
+
+
+class ChangeLogEntry(db.Model):
+    """One changed row: entity kind and id, per tournament"""
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        # The feed: entries of a tournament after a version
+        db.Index('ix_change_log_tournament_id', 'tournament_id', 'id'),
+        # Versions must never be reused
+        {'sqlite_autoincrement': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # No foreign keys: entries outlive deleted rows
+    tournament_id = db.Column(db.Integer, nullable=False)
+    entity = db.Column(db.String(10), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<ChangeLogEntry {self.id} {self.entity}={self.entity_id}>'
+
+
+def log_changes(entity, changes, session=None):
+    """Log (tournament_id, entity_id) pairs of one entity kind"""
+    rows = [
+        {'tournament_id': tournament_id, 'entity': entity, 'entity_id': entity_id}
+        for tournament_id, entity_id in dict.fromkeys(changes)
+        if tournament_id is not None and entity_id is not None
+    ]
+    if rows:
+        session = session if session is not None else db.session()
+        # Lock the tournaments' version rows first: ids are then taken in commit order
+        bump_tournament_data({row['tournament_id'] for row in rows}, session)
+        session.connection().execute(insert(ChangeLogEntry), rows)
+
+
+def _flushed_changes(session):
+    """Get {entity: [(tournament_id, entity_id)]} of the objects being flushed"""
+    from .match import Match
+    from .team import Team
+    from .group import Group
+    from .team_standing import TeamStanding
+
+    changes = {}
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, Match):
+            changes.setdefault(MATCH, []).append((obj.tournament_id, obj.id))
+        elif isinstance(obj, Team):
+            changes.setdefault(TEAM, []).append((obj.tournament_id, obj.id))
+        elif isinstance(obj, Group):
+            changes.setdefault(GROUP, []).append((obj.tournament_id, obj.id))
+        elif isinstance(obj, TeamStanding):
+            changes.setdefault(STANDING, []).append((obj.tournament_id, obj.team_id))
+    return changes
+
+
+@event.listens_for(Session, 'after_flush')
+def _log_flushed_changes(session, flush_context):
+    for entity, pairs in _flushed_changes(session).items():
+        log_changes(entity, pairs, session)
+
+
+def current_version(tournament_id):
+    """Id of the newest entry of a tournament (0 if nothing changed yet)"""
+    version = db.session.execute(
+        select(func.max(ChangeLogEntry.id)).where(ChangeLogEntry.tournament_id == tournament_id)
+    ).scalar()
+    return version or 0
+
+
+def _match_json(match):
+    return {
+        'id': match.id,
+        'home_team_id': match.home_team_id,
+        'away_team_id': match.away_team_id,
+        'home_score': match.home_score,
+        'away_score': match.away_score,
+        'status': match.status,
+        'stage': match.stage,
+        'group_name': match.group_name,
+        'bracket_slot': match.bracket_slot,
+        'date': match.date.isoformat() if match.date else None,
+        'venue': match.venue,
+        'field': match.field
+    }
+
+
+def _standing_json(standing):
+    return {'team_id': standing.team_id, 'group_id': standing.group_id, **standing.as_stats()}
+
+
+def get_changes(tournament_id, since, limit=DEFAULT_FEED_LIMIT):
+    """Get the compact delta of a tournament after version `since`
+
+    Changed rows are returned in their current state (so a row changed
+    again after the page's last entry is simply newer), rows that no longer
+    exist are listed under 'deleted'. Keep 'version' and pass it back as
+    `since`; 'has_more' means another page is ready straight away.
+    """
+    from .match import Match
+    from .team import Team
+    from .group import Group
+    from .team_standing import TeamStanding
+
+    limit = max(1, min(limit, MAX_FEED_LIMIT))
+    entries = db.session.execute(
+        select(ChangeLogEntry.id, ChangeLogEntry.entity, ChangeLogEntry.entity_id)
+        .where(ChangeLogEntry.tournament_id == tournament_id, ChangeLogEntry.id > since)
+        .order_by(ChangeLogEntry.id)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    changed = {MATCH: set(), TEAM: set(), GROUP: set(), STANDING: set()}
+    for _, entity, entity_id in entries:
+        changed[entity].add(entity_id)
+
+    def current(model, key, ids):
+        if not ids:
+            return []
+        return db.session.execute(
+            select(model).where(model.tournament_id == tournament_id, key.in_(ids))
+        ).scalars().all()
+
+    matches = current(Match, Match.id, changed[MATCH])
+    teams = current(Team, Team.id, changed[TEAM])
+    groups = current(Group, Group.id, changed[GROUP])
+    standings = current(TeamStanding, TeamStanding.team_id, changed[STANDING])
+
+    return {
+        'tournament_id': tournament_id,
+        'since': since,
+        'version': entries[-1].id if entries else since,
+        'has_more': has_more,
+        'matches': [_match_json(match) for match in matches],
+        'teams': [
+            {
+                'id': team.id,
+                'name': team.name,
+                'group_id': team.group_id,
+                'qualified_for_knockout': team.qualified_for_knockout,
+                'logo_url': team.logo_url
+            }
+            for team in teams
+        ],
+        'groups': [{'id': group.id, 'name': group.name} for group in groups],
+        'standings': [_standing_json(standing) for standing in standings],
+        'deleted': {
+            'matches': sorted(changed[MATCH] - {match.id for match in matches}),
+            'teams': sorted(changed[TEAM] - {team.id for team in teams}),
+            'groups': sorted(changed[GROUP] - {group.id for group in groups})
+        }
+    }
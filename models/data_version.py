@@ -0,0 +1,180 @@
+from datetime import datetime
+
+from flask import g, has_request_context
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+from . import db
+
+# Bumped by any write touching a tournament; keys the rendered page cache
+DATA_SCOPE = 'data'
+# Site-wide pages: their version sums every tournament's, so no write has to
+# lock a shared row. Row 0 itself only moves for players without a team.
+ALL_TOURNAMENTS = 0
+
+class DataVersion(db.Model):
+    """Change counter of one kind of tournament data ('bracket', 'data', ...)
+
+    Bumped in the same transaction as the change, so every worker can tell
+    whether a cached document is still current with one keyed SELECT.
+    No foreign key: rows may outlive their tournament.
+    """
+    __tablename__ = 'data_versions'
+
+    tournament_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    scope = db.Column(db.String(20), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    # When the version last moved: Last-Modified of the pages it keys
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DataVersion tournament={self.tournament_id} {self.scope}={self.version}>'
+
+
+def _upsert_statement(dialect_name):
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def bump_data_version(tournament_id, scope, connection=None):
+    """Increment a tournament's version for scope, creating it at 1"""
+    if tournament_id is None:
+        return
+    connection = connection if connection is not None else db.session.connection()
+    insert = _upsert_statement(connection.dialect.name)
+    now = datetime.utcnow()
+    statement = insert(DataVersion).values(tournament_id=tournament_id, scope=scope, version=1, updated_at=now)
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=['tournament_id', 'scope'],
+        set_={'version': DataVersion.version + 1, 'updated_at': now}
+    ))
+
+
+def bump_tournament_data(tournament_ids, session=None):
+    """Bump the 'data' version of tournaments (and so the site-wide one)
+
+    Each version moves once per transaction however many flushes touch it:
+    readers only compare it with what they cached.
+    """
+    session = session if session is not None else db.session()
+    bumped = session.info.setdefault('bumped_data_versions', set())
+    pending = {tournament_id for tournament_id in tournament_ids if tournament_id is not None}
+    if pending and has_request_context():
+        g.pop('_data_versions', None)
+    for tournament_id in sorted(pending - bumped):
+        bump_data_version(tournament_id, DATA_SCOPE, session.connection())
+        bumped.add(tournament_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_bumped_versions(session):
+    session.info.pop('bumped_data_versions', None)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_rolled_back_versions(session, previous_transaction):
+    session.info.pop('bumped_data_versions', None)
+
+
+def get_data_version(tournament_id, scope):
+    """Get the current version (0 if the data never changed)"""
+    version = db.session.execute(
+        select(DataVersion.version).where(DataVersion.tournament_id == tournament_id, DataVersion.scope == scope)
+    ).scalar()
+    return version or 0
+
+
+def get_site_version(scope):
+    """Get (version, updated_at) of scope across every tournament
+
+    The sum of the tournaments' versions: every bump moves it, and rows are
+    never deleted, so it never comes back to a value it had.
+    """
+    row = db.session.execute(
+        select(func.sum(DataVersion.version), func.max(DataVersion.updated_at)).where(DataVersion.scope == scope)
+    ).first()
+    return (row[0] or 0, row[1])
+
+
+def get_request_data_version(tournament_id):
+    """Get (version, updated_at) of a tournament's 'data' scope, read at most once per request"""
+    if has_request_context():
+        versions = g.setdefault('_data_versions', {})
+        if tournament_id in versions:
+            return versions[tournament_id]
+    if tournament_id == ALL_TOURNAMENTS:
+        validator = get_site_version(DATA_SCOPE)
+    else:
+        row = db.session.execute(
+            select(DataVersion.version, DataVersion.updated_at)
+            .where(DataVersion.tournament_id == tournament_id, DataVersion.scope == DATA_SCOPE)
+        ).first()
+        validator = (row.version, row.updated_at) if row is not None else (0, None)
+    if has_request_context():
+        g._data_versions[tournament_id] = validator
+    return validator
+
+
+def _changed_scopes(session):
+    """Get (tournament_id, scope) pairs touched by the objects being flushed"""
+    from .match import Match
+    from .team import Team
+    from .group import Group
+    from .player import Player
+    from .team_standing import TeamStanding
+    from .tournament import Tournament
+    from .bracket import KNOCKOUT_STAGES
+
+    changed = set()
+    players = []
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, Match):
+            stages = {obj.stage, *inspect(obj).attrs.stage.history.deleted}
+            if stages & set(KNOCKOUT_STAGES):
+                changed.add((obj.tournament_id, 'bracket'))
+            changed.add((obj.tournament_id, DATA_SCOPE))
+        elif isinstance(obj, Team):
+            # Names and logos are part of the bracket document
+            changed.add((obj.tournament_id, 'bracket'))
+            changed.add((obj.tournament_id, DATA_SCOPE))
+        elif isinstance(obj, (Group, TeamStanding)):
+            changed.add((obj.tournament_id, DATA_SCOPE))
+        elif isinstance(obj, Tournament):
+            changed.add((obj.id, DATA_SCOPE))
+        elif isinstance(obj, Player):
+            players.append(obj)
+    if players:
+        # Shown on the pages of their team's tournament, and so on site-wide ones
+        changed.update((tournament_id, DATA_SCOPE) for tournament_id in player_tournament_ids(session, players))
+    return changed
+
+
+def player_tournament_ids(session, players):
+    """Tournaments of the teams players are in or just left (ALL_TOURNAMENTS without a team)"""
+    from .team import Team
+
+    team_ids = set()
+    for player in players:
+        team_ids.update(inspect(player).attrs.team_id.history.deleted)
+        team_ids.add(player.team_id)
+    team_ids.discard(None)
+    tournament_ids = set(session.connection().execute(
+        select(Team.tournament_id).where(Team.id.in_(team_ids))
+    ).scalars()) if team_ids else set()
+    tournament_ids.discard(None)
+    return tournament_ids or {ALL_TOURNAMENTS}
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_flushed_versions(session, flush_context):
+    touched = set()
+    for tournament_id, scope in _changed_scopes(session):
+        if scope == DATA_SCOPE:
+            touched.add(tournament_id)
+        else:
+            bump_data_version(tournament_id, scope, session.connection())
+    bump_tournament_data(touched, session)
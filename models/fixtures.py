@@ -0,0 +1,169 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from itertools import islice
+
+from sqlalchemy import insert, select
+from . import db
+from .change_log import MATCH, log_changes
+from .round_robin import round_robin
+from .search import index_venues
+from .scheduling import schedule_fixture_rows
+
+DEFAULT_VENUE = 'Estádio Principal'
+
+INSERT_BATCH_SIZE = 1000
+
+
+@dataclass
+class FixtureResult:
+    """Outcome of a fixture generation run"""
+    matches_created: int = 0
+    # (group name, matches created) for every group that got fixtures
+    groups_processed: list = field(default_factory=list)
+    groups_too_small: list = field(default_factory=list)
+    groups_with_matches: list = field(default_factory=list)
+    # Fixtures that found no field/time slot; when non-zero nothing is created
+    unscheduled: int = 0
+
+
+def _load_groups(tournament_id, group_ids=None):
+    """Get (id, name) of the tournament's groups, in creation order"""
+    from .group import Group
+
+    query = select(Group.id, Group.name).where(Group.tournament_id == tournament_id)
+    if group_ids is not None:
+        query = query.where(Group.id.in_(group_ids))
+    return db.session.execute(query.order_by(Group.id)).all()
+
+
+def _load_team_ids_by_group(tournament_id, group_ids):
+    """Get group_id -> [team ids] with a single query"""
+    from .team import Team
+
+    rows = db.session.execute(
+        select(Team.id, Team.group_id)
+        .where(Team.tournament_id == tournament_id, Team.group_id.in_(group_ids))
+        .order_by(Team.id)
+    )
+    teams_by_group = {group_id: [] for group_id in group_ids}
+    for team_id, group_id in rows:
+        teams_by_group[group_id].append(team_id)
+    return teams_by_group
+
+
+def _groups_with_fixtures(tournament_id, group_names):
+    """Get the names of the groups that already have group stage matches, in one query"""
+    from .match import Match
+
+    rows = db.session.execute(
+        select(Match.group_name).distinct()
+        .where(
+            Match.tournament_id == tournament_id,
+            Match.stage == 'group_stage',
+            Match.group_name.in_(group_names)
+        )
+    )
+    return {name for (name,) in rows}
+
+
+def _bulk_insert(rows):
+    """Write fixtures with executemany INSERTs of INSERT_BATCH_SIZE rows
+
+    rows may be a generator; it is consumed one batch at a time.
+    """
+    from .match import Match
+
+    rows = iter(rows)
+    created = 0
+    while True:
+        batch = list(islice(rows, INSERT_BATCH_SIZE))
+        if not batch:
+            return created
+        inserted = db.session.execute(insert(Match).returning(Match.tournament_id, Match.id), batch).all()
+        log_changes(MATCH, inserted)
+        # Bulk INSERTs skip the flush listeners, so index new venues here
+        index_venues({tournament_id for tournament_id, _ in inserted})
+        created += len(batch)
+
+
+def generate_group_fixtures(tournament_id, group_ids=None, legs=1, venue=DEFAULT_VENUE, schedule_config=None):
+    """Generate a round-robin for every group that has no fixtures yet
+
+    Fixtures of all groups are scheduled round by round on the fields and
+    slot grid of schedule_config (see models.scheduling), around matches
+    already booked; legs=2 gives a double round-robin. Groups with fewer
+    than 2 teams or with existing group stage matches are skipped and
+    reported. If some fixture cannot be scheduled nothing is inserted.
+    The caller commits.
+    """
+    result = FixtureResult()
+    groups = _load_groups(tournament_id, group_ids)
+    if not groups:
+        return result
+
+    teams_by_group = _load_team_ids_by_group(tournament_id, [group_id for group_id, _ in groups])
+    existing = _groups_with_fixtures(tournament_id, [name for _, name in groups])
+
+    rows = []
+    rounds = []
+    for group_id, group_name in groups:
+        team_ids = teams_by_group[group_id]
+        if len(team_ids) < 2:
+            result.groups_too_small.append(group_name)
+            continue
+        if group_name in existing:
+            result.groups_with_matches.append(group_name)
+            continue
+
+        group_start = len(rows)
+        for round_number, home_team_id, away_team_id in round_robin(team_ids, legs):
+            rounds.append(round_number)
+            rows.append({
+                'home_team_id': home_team_id,
+                'away_team_id': away_team_id,
+                'tournament_id': tournament_id,
+                'venue': venue,
+                'stage': 'group_stage',
+                'group_name': group_name,
+                'status': 'scheduled'
+            })
+        result.groups_processed.append((group_name, len(rows) - group_start))
+
+    # Round 1 of every group first, then round 2, ...
+    order = sorted(range(len(rows)), key=rounds.__getitem__)
+    rows = [rows[index] for index in order]
+    schedule = schedule_fixture_rows(rows, schedule_config)
+    result.unscheduled = len(schedule.unscheduled)
+    if result.unscheduled:
+        return result
+
+    result.matches_created = _bulk_insert(rows)
+    return result
+
+
+def generate_league_fixtures(tournament_id, legs=1):
+    """Generate a round-robin between all teams of a tournament, one round per day
+
+    Fixtures are streamed from the round-robin generator into batched
+    inserts, so large leagues never hold their full fixture list. Returns
+    the number of matches created. The caller commits.
+    """
+    from .team import Team
+
+    team_ids = db.session.execute(
+        select(Team.id).where(Team.tournament_id == tournament_id).order_by(Team.id)
+    ).scalars().all()
+
+    base_date = datetime.now()
+    rows = (
+        {
+            'home_team_id': home_team_id,
+            'away_team_id': away_team_id,
+            'tournament_id': tournament_id,
+            'date': base_date + timedelta(days=round_number),
+            'stage': 'group_stage',
+            'status': 'scheduled'
+        }
+        for round_number, home_team_id, away_team_id in round_robin(team_ids, legs)
+    )
+    return _bulk_insert(rows)
@@ -3,6 +3,9 @@ from . import db
 
 class Group(db.Model):
     __tablename__ = 'groups'
+    __table_args__ = (
+        db.Index('ix_groups_tournament_name', 'tournament_id', 'name'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(10), nullable=False)  # A, B, C, D, etc.
@@ -22,24 +25,19 @@ class Group(db.Model):
     
     def get_standings(self):
         """Get group standings sorted by points"""
-        if not self.teams:
-            return []
+        from .standings import TournamentStandings
         
         standings = []
-        for team in self.teams:
-            stats = team.get_stats()
+        for standing in TournamentStandings(self.tournament_id).for_group(self.name):
             standings.append({
-                'team': team,
-                'matches_played': stats['matches_played'],
-                'wins': stats['wins'],
-                'draws': stats['draws'],
-                'losses': stats['losses'],
-                'goals_for': stats['goals_for'],
-                'goals_against': stats['goals_against'],
-                'goal_difference': stats['goal_difference'],
-                'points': stats['points']
+                'team': standing.team,
+                'matches_played': standing.matches_played,
+                'wins': standing.wins,
+                'draws': standing.draws,
+                'losses': standing.losses,
+                'goals_for': standing.goals_for,
+                'goals_against': standing.goals_against,
+                'goal_difference': standing.goal_difference,
+                'points': standing.points
             })
-        
-        # Sort by points (descending), then goal difference (descending), then goals for (descending)
-        standings.sort(key=lambda x: (x['points'], x['goal_difference'], x['goals_for']), reverse=True)
         return standings
@@ -0,0 +1,171 @@
+"""
+Leaderboards of players and teams, per tournament, per team and site-wide
+
+Boards are not computed from matches or events: they read aggregates that
+are already kept up to date incrementally, through an index on (scope,
+metric) of each:
+
+- goals, assists and cards of a tournament: player_stats rows
+- the same site-wide or within a team: the career totals on players
+- clean sheets: team_standings rows
+
+So a board is one index range scan of at most limit + MAX_TIES + 1 rows,
+whatever the number of players. Ties share a rank (1, 2, 2, 4) and the
+players tied with the last place are all shown, up to MAX_TIES more.
+"""
+
+from dataclasses import asdict, dataclass, field
+from itertools import takewhile
+
+from sqlalchemy import select
+from . import db
+
+GOALS = 'goals'
+ASSISTS = 'assists'
+YELLOW_CARDS = 'yellow_cards'
+RED_CARDS = 'red_cards'
+CLEAN_SHEETS = 'clean_sheets'
+
+# Metric -> label, in the order boards are shown
+METRICS = {
+    GOALS: 'Top Scorers',
+    ASSISTS: 'Assists',
+    CLEAN_SHEETS: 'Clean Sheets',
+    YELLOW_CARDS: 'Yellow Cards',
+    RED_CARDS: 'Red Cards',
+}
+# Column of the player metrics, on player_stats and players alike
+PLAYER_METRICS = {
+    GOALS: 'goals_scored',
+    ASSISTS: 'assists',
+    YELLOW_CARDS: 'yellow_cards',
+    RED_CARDS: 'red_cards',
+}
+TEAM_METRICS = {CLEAN_SHEETS: 'clean_sheets'}
+
+DEFAULT_LEADERBOARD_SIZE = 10
+MAX_LEADERBOARD_SIZE = 50
+# Extra rows shown when several players share the last place
+MAX_TIES = 10
+
+
+class UnknownMetric(ValueError):
+    """A leaderboard metric that does not exist for the requested scope"""
+
+
+@dataclass
+class LeaderboardEntry:
+    rank: int
+    tied: bool  # Shares its rank with another entry
+    kind: str  # player or team
+    id: int
+    name: str
+    team_id: int
+    team_name: str
+    value: int
+
+
+@dataclass
+class Leaderboard:
+    metric: str
+    label: str
+    tournament_id: int = None
+    team_id: int = None
+    entries: list = field(default_factory=list)
+    truncated: bool = False  # More entries tie with the last one shown
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def get_leaderboard(metric, tournament_id=None, team_id=None, limit=DEFAULT_LEADERBOARD_SIZE):
+    """Top entries of a metric, within a team, a tournament or site-wide"""
+    limit = max(1, min(limit, MAX_LEADERBOARD_SIZE))
+    fetch = limit + MAX_TIES + 1
+    if metric in PLAYER_METRICS:
+        rows = _player_rows(PLAYER_METRICS[metric], tournament_id, team_id, fetch)
+        kind = 'player'
+    elif metric in TEAM_METRICS and team_id is None:
+        rows = _team_rows(TEAM_METRICS[metric], tournament_id, fetch)
+        kind = 'team'
+    else:
+        raise UnknownMetric(f'Unknown leaderboard: {metric!r}')
+
+    board = Leaderboard(metric, METRICS[metric], tournament_id, team_id)
+    shown = rows[:limit]
+    if len(rows) > limit:
+        last = shown[-1].value
+        shown += list(takewhile(lambda row: row.value == last, rows[limit:]))
+        board.truncated = len(rows) > len(shown) and rows[len(shown)].value == last
+
+    # Within a tie, by name: rows only come ordered by value
+    shown.sort(key=lambda row: (-row.value, row.name))
+    counts = {}
+    for row in shown:
+        counts[row.value] = counts.get(row.value, 0) + 1
+    rank = 0
+    for position, row in enumerate(shown, 1):
+        if position == 1 or row.value != shown[position - 2].value:
+            rank = position
+        board.entries.append(LeaderboardEntry(
+            rank, counts[row.value] > 1, kind, row.id, row.name, row.team_id, row.team_name, row.value
+        ))
+    return board
+
+
+def get_leaderboards(tournament_id=None, team_id=None, limit=DEFAULT_LEADERBOARD_SIZE, metrics=None):
+    """Every board of a scope, in METRICS order"""
+    metrics = metrics or [metric for metric in METRICS if team_id is None or metric in PLAYER_METRICS]
+    return [get_leaderboard(metric, tournament_id, team_id, limit) for metric in metrics]
+
+
+def leaderboards_payload(args, tournament_id=None):
+    """JSON payload of a scope's boards for request args (metric, limit), with its status code"""
+    metric = args.get('metric')
+    try:
+        boards = get_leaderboards(tournament_id, limit=args.get('limit', DEFAULT_LEADERBOARD_SIZE, type=int),
+                                  metrics=[metric] if metric else None)
+    except UnknownMetric as e:
+        return {'success': False, 'message': str(e)}, 400
+    return {'success': True, 'leaderboards': [board.as_dict() for board in boards]}, 200
+
+
+def _player_rows(column_name, tournament_id, team_id, fetch):
+    from .player import Player
+    from .player_stat import PlayerStat
+    from .team import Team
+
+    name = (Player.first_name + ' ' + Player.last_name).label('name')
+    if tournament_id is not None and team_id is None:
+        value = getattr(PlayerStat, column_name)
+        query = select(Player.id, name, Team.id.label('team_id'), Team.name.label('team_name'), value.label('value'))\
+            .select_from(PlayerStat)\
+            .join(Player, Player.id == PlayerStat.player_id)\
+            .join(Team, Team.id == PlayerStat.team_id)\
+            .where(PlayerStat.tournament_id == tournament_id, value > 0)\
+            .order_by(value.desc(), PlayerStat.id.desc())
+    else:
+        # A player belongs to one team, so career totals are also the team's
+        value = getattr(Player, column_name)
+        query = select(Player.id, name, Team.id.label('team_id'), Team.name.label('team_name'), value.label('value'))\
+            .join(Team, Team.id == Player.team_id)\
+            .where(value > 0)\
+            .order_by(value.desc(), Player.id.desc())
+        if team_id is not None:
+            query = query.where(Player.team_id == team_id)
+    return db.session.execute(query.limit(fetch)).all()
+
+
+def _team_rows(column_name, tournament_id, fetch):
+    from .team import Team
+    from .team_standing import TeamStanding
+
+    value = getattr(TeamStanding, column_name)
+    query = select(Team.id, Team.name.label('name'), Team.id.label('team_id'), Team.name.label('team_name'),
+                   value.label('value'))\
+        .join(Team, Team.id == TeamStanding.team_id)\
+        .where(value > 0)\
+        .order_by(value.desc(), TeamStanding.id.desc())
+    if tournament_id is not None:
+        query = query.where(TeamStanding.tournament_id == tournament_id)
+    return db.session.execute(query.limit(fetch)).all()
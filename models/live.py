@@ -0,0 +1,284 @@
+"""
+Live match events and their fan-out to Server-Sent Events streams
+
+Score and status changes are written to the live_events table in the same
+transaction as the match, so the table is the channel between workers:
+one listener thread per worker polls it for ids above the last one it has
+seen and hands new rows to the in-process LiveBroadcaster, which fans
+them out to the queues of the streams connected to that worker. A commit
+wakes the listener of its own worker at once; other workers pick the
+event up within POLL_SECONDS.
+
+Event ids double as SSE ids, so a browser that reconnects with
+Last-Event-ID gets what it missed replayed from the table.
+"""
+
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, or_, select
+from sqlalchemy.orm import Session
+from . import db
+
+POLL_SECONDS = 0.5
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 2000
+# Events buffered per stream; a client that falls this far behind is
+# disconnected and catches up from the table when it reconnects
+SUBSCRIBER_QUEUE_SIZE = 256
+REPLAY_LIMIT = 500
+RETENTION = timedelta(hours=24)
+PRUNE_EVERY_SECONDS = 600
+# Ids skipped by the listener (a concurrent transaction that commits out of
+# id order) are looked for again for this long before they are given up
+GAP_SECONDS = 10
+MATCH_MINUTES = 90
+
+
+class LiveEvent(db.Model):
+    """A score/status change of a match, as sent to live streams"""
+    __tablename__ = 'live_events'
+    __table_args__ = (
+        # Replay after Last-Event-ID for one tournament
+        db.Index('ix_live_events_tournament_id', 'tournament_id', 'id'),
+        # Ids must never be reused after old events are pruned
+        {'sqlite_autoincrement': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    tournament_id = db.Column(db.Integer, nullable=False)
+    match_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # score, started, ended
+    payload = db.Column(db.Text, nullable=False)  # JSON sent as the event data
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<LiveEvent {self.id} match={self.match_id} {self.kind}>'
+
+
+def match_minute(match, now=None):
+    """Minute of play of a match in progress, counted from its kick-off"""
+    if match.status != 'in_progress' or match.date is None:
+        return None
+    elapsed = ((now or datetime.now()) - match.date) // timedelta(minutes=1) + 1
+    return max(1, min(elapsed, MATCH_MINUTES))
+
+
+def record_live_event(match, kind):
+    """Add a live event with the current state of match to the session
+
+    Call before the commit that saves the change; the event is published
+    when that commit succeeds.
+    """
+    session = db.session()
+    session.add(LiveEvent(
+        tournament_id=match.tournament_id,
+        match_id=match.id,
+        kind=kind,
+        payload=json.dumps({
+            'match_id': match.id,
+            'tournament_id': match.tournament_id,
+            'kind': kind,
+            'status': match.status,
+            'home_score': match.home_score or 0,
+            'away_score': match.away_score or 0,
+            'minute': match_minute(match)
+        })
+    ))
+    session.info['live_events'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_listener(session):
+    if session.info.pop('live_events', False):
+        live_broadcaster.notify()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_live_events(session, previous_transaction):
+    session.info.pop('live_events', None)
+
+
+class Subscription:
+    """Queue of events for one connected stream"""
+
+    def __init__(self, tournament_id=None):
+        self.tournament_id = tournament_id
+        self._queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def wants(self, tournament_id):
+        return self.tournament_id is None or self.tournament_id == tournament_id
+
+    def put(self, live_event):
+        try:
+            self._queue.put_nowait(live_event)
+        except queue.Full:
+            self.close()
+
+    def close(self):
+        """Drop what is buffered and end the stream"""
+        with self._queue.mutex:
+            self._queue.queue.clear()
+        self._queue.put_nowait(None)
+
+    def get(self, timeout):
+        """Next event, None once closed; raises queue.Empty on timeout"""
+        return self._queue.get(timeout=timeout)
+
+
+class LiveBroadcaster:
+    """Per-worker fan-out of live events from the table to subscriptions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._last_id = None
+        self._gaps = {}  # Skipped id -> monotonic time it was noticed
+        self._pruned_at = 0.0
+        self.delivered = 0
+
+    def start(self, app):
+        """Start the listener thread of this worker, once
+
+        Called in an app context: the listener starts after the newest
+        event, which the first subscriber's replay already covers.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._last_id = db.session.scalar(select(func.max(LiveEvent.id))) or 0
+                self._thread = threading.Thread(target=self._run, args=(app,), name='live-events', daemon=True)
+                self._thread.start()
+
+    def subscribe(self, tournament_id=None):
+        subscription = Subscription(tournament_id)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscriptions)
+
+    def notify(self):
+        """Poll the table now instead of at the next interval"""
+        self._wakeup.set()
+
+    def publish(self, live_event):
+        """Hand an event to every interested subscription of this worker"""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.wants(live_event.tournament_id):
+                subscription.put(live_event)
+                self.delivered += 1
+
+    def _run(self, app):
+        while True:
+            self._wakeup.wait(POLL_SECONDS)
+            self._wakeup.clear()
+            try:
+                with app.app_context():
+                    self.poll()
+            except Exception:
+                app.logger.exception('Live event listener failed')
+                time.sleep(POLL_SECONDS)
+
+    def poll(self):
+        """Publish the events committed since the last poll"""
+        if self._last_id is None:
+            self._last_id = db.session.scalar(select(func.max(LiveEvent.id))) or 0
+            return
+
+        condition = LiveEvent.id > self._last_id
+        if self._gaps:
+            condition = or_(condition, LiveEvent.id.in_(list(self._gaps)))
+        rows = db.session.execute(
+            select(LiveEvent.id, LiveEvent.tournament_id, LiveEvent.payload)
+            .where(condition).order_by(LiveEvent.id)
+        ).all()
+
+        now = time.monotonic()
+        for row in rows:
+            if row.id > self._last_id:
+                if row.id - self._last_id <= SUBSCRIBER_QUEUE_SIZE:
+                    for missing in range(self._last_id + 1, row.id):
+                        self._gaps[missing] = now
+                self._last_id = row.id
+            else:
+                self._gaps.pop(row.id, None)
+            self.publish(row)
+
+        for missing, noticed in list(self._gaps.items()):
+            if now - noticed > GAP_SECONDS:
+                del self._gaps[missing]
+
+        if now - self._pruned_at > PRUNE_EVERY_SECONDS:
+            self._pruned_at = now
+            db.session.execute(delete(LiveEvent).where(LiveEvent.created_at < datetime.utcnow() - RETENTION))
+            db.session.commit()
+
+
+live_broadcaster = LiveBroadcaster()
+
+
+def _format_event(live_event):
+    return f'id: {live_event.id}\nevent: match\ndata: {live_event.payload}\n\n'
+
+
+def open_live_stream(app, tournament_id=None, last_event_id=None):
+    """Subscribe and return the SSE body generator for one client
+
+    Without last_event_id the stream starts at the newest event; with it,
+    newer events are replayed first (or a 'reset' is sent when too many
+    were missed, so the page reloads its state).
+    """
+    live_broadcaster.start(app)
+    # Subscribe before reading the replay so nothing committed in between is lost
+    subscription = live_broadcaster.subscribe(tournament_id)
+    replay = []
+    reset = False
+    try:
+        if last_event_id is not None:
+            query = select(LiveEvent.id, LiveEvent.tournament_id, LiveEvent.payload)\
+                .where(LiveEvent.id > last_event_id)
+            if tournament_id is not None:
+                query = query.where(LiveEvent.tournament_id == tournament_id)
+            replay = db.session.execute(query.order_by(LiveEvent.id).limit(REPLAY_LIMIT + 1)).all()
+            reset = len(replay) > REPLAY_LIMIT
+    except Exception:
+        live_broadcaster.unsubscribe(subscription)
+        raise
+    return _stream(subscription, [] if reset else replay, reset)
+
+
+def _stream(subscription, replay, reset):
+    try:
+        yield f'retry: {RETRY_MILLISECONDS}\n\n'
+        if reset:
+            yield 'event: reset\ndata: {}\n\n'
+        for live_event in replay:
+            yield _format_event(live_event)
+        replayed = {live_event.id for live_event in replay}
+        while True:
+            try:
+                live_event = subscription.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                # Comment line: keeps proxies from closing the connection
+                # and lets the server notice clients that went away
+                yield ': keep-alive\n\n'
+                continue
+            if live_event is None:
+                return
+            if live_event.id not in replayed:
+                yield _format_event(live_event)
+    finally:
+        live_broadcaster.unsubscribe(subscription)
@@ -0,0 +1,37 @@
+import logging
+import traceback
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+class LazyLoadError(RuntimeError):
+    """Raised in strict loading mode when a relationship is lazy loaded"""
+
+
+def _strict_loading_mode():
+    if not has_app_context():
+        return ''
+    return current_app.config.get('STRICT_LOADING') or ''
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _detect_lazy_load(orm_execute_state):
+    """Report relationship loads that were not requested with an eager option
+
+    Eager loaders (selectinload, joinedload, ...) also run as relationship
+    loads, but only a lazy load records the instance that triggered it.
+    """
+    if not orm_execute_state.is_select or orm_execute_state.lazy_loaded_from is None:
+        return
+    mode = _strict_loading_mode()
+    if not mode:
+        return
+
+    relationship = orm_execute_state.loader_strategy_path[-1]
+    message = f'Lazy load of {relationship} (N+1 query); add a selectinload/joinedload option'
+    if mode == 'raise':
+        raise LazyLoadError(message)
+    logger.warning('%s\n%s', message, ''.join(traceback.format_stack(limit=12)[:-1]))
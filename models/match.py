@@ -3,15 +3,39 @@ from datetime import datetime
 
 class Match(db.Model):
     __tablename__ = 'matches'
+    __table_args__ = (
+        # Knockout advancement and stage listings: filter_by(tournament_id, stage, status)
+        db.Index('ix_matches_tournament_stage_status', 'tournament_id', 'stage', 'status'),
+        # Group fixture existence checks: filter_by(tournament_id, group_name, stage)
+        db.Index('ix_matches_tournament_group_stage', 'tournament_id', 'group_name', 'stage'),
+        # Tournament page ordered by date
+        db.Index('ix_matches_tournament_date', 'tournament_id', 'date'),
+        # Schedule and recent results ordered by date; id breaks ties for keyset pages
+        db.Index('ix_matches_date_id', 'date', 'id'),
+        # Team history: home_team_id OR away_team_id, ordered by date
+        db.Index('ix_matches_home_team_date', 'home_team_id', 'date'),
+        db.Index('ix_matches_away_team_date', 'away_team_id', 'date'),
+        # Upcoming matches on the home page; a plain index where partial indexes are unsupported
+        db.Index('ix_matches_scheduled_date', 'date',
+                 sqlite_where=db.text("status = 'scheduled'"),
+                 postgresql_where=db.text("status = 'scheduled'")),
+        # Knockout advancement: one keyed update per result
+        db.Index('ix_matches_tournament_bracket_slot', 'tournament_id', 'bracket_slot', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    home_team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
-    away_team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
+    # Null for knockout matches whose teams are not known yet (TBD)
+    home_team_id = db.Column(db.Integer, db.ForeignKey('teams.id'))
+    away_team_id = db.Column(db.Integer, db.ForeignKey('teams.id'))
     tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.id'), nullable=False)
     date = db.Column(db.DateTime, nullable=False)
     venue = db.Column(db.String(100))
     field = db.Column(db.String(10))  # 1, 2, 3, etc.
-    stage = db.Column(db.String(50), default='group_stage')  # group_stage, round_of_16, quarter_final, semi_final, final
+    stage = db.Column(db.String(50), default='group_stage')  # group_stage, round_of_64/32/16, quarter_final, semi_final, third_place, final
+    # Knockout bracket position (see models.bracket): 1 = final, 2-3 = semi-finals, ... 0 = third place
+    bracket_slot = db.Column(db.Integer)
+    next_slot = db.Column(db.Integer)  # Slot the winner moves into
+    loser_next_slot = db.Column(db.Integer)  # Slot the loser moves into (semi-finals -> third place)
     group_name = db.Column(db.String(10))  # A, B, C, D, etc.
     home_score = db.Column(db.Integer, default=0)
     away_score = db.Column(db.Integer, default=0)
@@ -28,7 +52,7 @@ class Match(db.Model):
     away_team = db.relationship('Team', foreign_keys=[away_team_id], backref='away_matches_rel')
     
     def __repr__(self):
-        return f'<Match {self.home_team.name} vs {self.away_team.name}>'
+        return f'<Match {self.home_team_id} vs {self.away_team_id}>'
     
     def get_winner(self):
         """Get the winning team, or None if draw"""
@@ -0,0 +1,191 @@
+"""
+Match event log: line-ups, goals, assists, cards and substitutions
+
+The log is the source of the player statistics. Recording or removing
+events applies their deltas to the per-tournament player_stats rows and to
+the career totals on players in the same transaction (see
+models.player_stat), so nothing is ever recounted on a read;
+rebuild_player_stats() recomputes both from the log in one grouped query.
+
+Minutes played are additive too: a line-up event credits the whole match,
+coming on credits the minutes left after the event, and going off or being
+sent off takes the minutes left back.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import joinedload
+from . import db
+from .change_log import MATCH, log_changes
+from .live import MATCH_MINUTES
+
+LINEUP = 'lineup'  # In the starting line-up (minute 0)
+GOAL = 'goal'
+ASSIST = 'assist'
+YELLOW_CARD = 'yellow_card'
+RED_CARD = 'red_card'
+SUB_ON = 'sub_on'
+SUB_OFF = 'sub_off'
+EVENT_KINDS = (LINEUP, GOAL, ASSIST, YELLOW_CARD, RED_CARD, SUB_ON, SUB_OFF)
+
+# Statistics column counted once per event of a kind
+EVENT_COUNTS = {
+    LINEUP: 'matches_played',
+    SUB_ON: 'matches_played',
+    GOAL: 'goals_scored',
+    ASSIST: 'assists',
+    YELLOW_CARD: 'yellow_cards',
+    RED_CARD: 'red_cards',
+}
+# Sign of the minutes left after the event, added to minutes_played
+EVENT_MINUTES = {LINEUP: 1, SUB_ON: 1, SUB_OFF: -1, RED_CARD: -1}
+
+MAX_MINUTE = 130  # Extra time and stoppage time
+
+
+class InvalidMatchEvent(ValueError):
+    """An event that cannot be added to a match"""
+
+
+class MatchEvent(db.Model):
+    """One line-up entry, goal, assist, card or substitution of a player in a match"""
+    __tablename__ = 'match_events'
+    __table_args__ = (
+        # Timeline of a match
+        db.Index('ix_match_events_match_minute', 'match_id', 'minute', 'id'),
+        # Rebuild of one tournament's player statistics
+        db.Index('ix_match_events_tournament_player', 'tournament_id', 'player_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    match_id = db.Column(db.Integer, db.ForeignKey('matches.id'), nullable=False)
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.id'), nullable=False)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
+    player_id = db.Column(db.Integer, db.ForeignKey('players.id'), nullable=False)
+    kind = db.Column(db.String(12), nullable=False)
+    minute = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    player = db.relationship('Player')
+
+    def __repr__(self):
+        return f'<MatchEvent {self.kind} player={self.player_id} {self.minute}\'>'
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'match_id': self.match_id,
+            'team_id': self.team_id,
+            'player_id': self.player_id,
+            'player_name': self.player.full_name if self.player else None,
+            'kind': self.kind,
+            'minute': self.minute
+        }
+
+
+def minutes_left(minute):
+    """Minutes of regular time still to play after minute"""
+    return max(0, MATCH_MINUTES - minute)
+
+
+def event_deltas(kind, minute, sign=1):
+    """Get {column: delta} of one event on its player's statistics"""
+    deltas = {}
+    if kind in EVENT_COUNTS:
+        deltas[EVENT_COUNTS[kind]] = sign
+    if kind in EVENT_MINUTES:
+        deltas['minutes_played'] = sign * EVENT_MINUTES[kind] * minutes_left(minute)
+    return deltas
+
+
+def _stat_deltas(events, sign, deltas=None):
+    """Accumulate the deltas of events per (tournament_id, player_id, team_id)"""
+    deltas = {} if deltas is None else deltas
+    for match_event in events:
+        player_delta = deltas.setdefault(
+            (match_event.tournament_id, match_event.player_id, match_event.team_id), {}
+        )
+        for column, value in event_deltas(match_event.kind, match_event.minute, sign).items():
+            player_delta[column] = player_delta.get(column, 0) + value
+    return deltas
+
+
+def record_match_events(match, entries):
+    """Add (kind, player, minute) entries to the log of match
+
+    Every entry is checked before anything is written. Goals also add to the
+    score of the scorer's side; take match_result() before calling and pass
+    it to apply_result_change() afterwards, as for any score change.
+    Returns the new events. The caller commits.
+    """
+    from .player_stat import apply_stat_deltas
+
+    events = []
+    for kind, player, minute in entries:
+        if kind not in EVENT_KINDS:
+            raise InvalidMatchEvent(f'Unknown event kind: {kind!r}')
+        if player is None or player.team_id not in (match.home_team_id, match.away_team_id):
+            raise InvalidMatchEvent('Player does not play for either team of this match')
+        if kind == LINEUP:
+            minute = 0
+        if minute is None or not 0 <= minute <= MAX_MINUTE:
+            raise InvalidMatchEvent(f'Minute must be between 0 and {MAX_MINUTE}')
+        events.append(MatchEvent(
+            match_id=match.id,
+            tournament_id=match.tournament_id,
+            team_id=player.team_id,
+            player_id=player.id,
+            kind=kind,
+            minute=minute
+        ))
+
+    for match_event in events:
+        if match_event.kind == GOAL:
+            if match_event.team_id == match.home_team_id:
+                match.home_score = (match.home_score or 0) + 1
+            else:
+                match.away_score = (match.away_score or 0) + 1
+    db.session.add_all(events)
+    apply_stat_deltas(_stat_deltas(events, 1))
+    log_changes(MATCH, [(match.tournament_id, match.id)])
+    return events
+
+
+def remove_match_events(match, events):
+    """Remove events of match from the log, taking back their statistics and goals"""
+    from .player_stat import apply_stat_deltas
+
+    for match_event in events:
+        if match_event.kind == GOAL:
+            if match_event.team_id == match.home_team_id:
+                match.home_score = max(0, (match.home_score or 0) - 1)
+            else:
+                match.away_score = max(0, (match.away_score or 0) - 1)
+        db.session.delete(match_event)
+    apply_stat_deltas(_stat_deltas(events, -1))
+    log_changes(MATCH, [(match.tournament_id, match.id)])
+
+
+def clear_match_events(match_ids):
+    """Take back the statistics of every event of matches about to be deleted"""
+    from .player_stat import apply_stat_deltas
+
+    if not match_ids:
+        return
+    events = db.session.execute(
+        select(MatchEvent.tournament_id, MatchEvent.player_id, MatchEvent.team_id,
+               MatchEvent.kind, MatchEvent.minute)
+        .where(MatchEvent.match_id.in_(match_ids))
+    ).all()
+    apply_stat_deltas(_stat_deltas(events, -1))
+    db.session.execute(
+        delete(MatchEvent).where(MatchEvent.match_id.in_(match_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def get_match_events(match_id):
+    """Get the timeline of a match, with the players loaded"""
+    return MatchEvent.query.options(joinedload(MatchEvent.player))\
+        .filter_by(match_id=match_id).order_by(MatchEvent.minute, MatchEvent.id).all()
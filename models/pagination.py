@@ -0,0 +1,163 @@
+"""
+Keyset (seek) pagination of the schedule, tournament and team-match listings
+
+A page is the first `limit` rows after a cursor: the (date, id) of the last
+row of the previous page. Every page is one range scan of a (date, id)
+index starting at the cursor, so page 50 costs what page 1 does, and no
+more than limit + 1 rows are loaded per request. Rows added or removed
+between requests never shift the pages after them.
+
+Cursors are opaque strings; clients pass back the next_cursor they got.
+"""
+
+import base64
+import binascii
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+class InvalidListingArgs(ValueError):
+    """A cursor, limit or filter of a listing request that cannot be used"""
+
+
+def encode_cursor(value, row_id):
+    raw = f'{value.isoformat()}|{row_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Get (datetime, id) back from a cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        value, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(value), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidListingArgs(f'Invalid cursor: {cursor!r}')
+
+
+@dataclass
+class ListingArgs:
+    """Cursor, page size and optional filters of a listing request"""
+    cursor: str = None
+    limit: int = DEFAULT_PAGE_SIZE
+    tournament_id: int = None
+    status: str = None
+    date_from: datetime = None  # Inclusive
+    date_to: datetime = None  # Exclusive: the day after ?date_to
+
+    @classmethod
+    def from_request_args(cls, args):
+        """Read cursor, limit, tournament_id, status and date_from/date_to (YYYY-MM-DD)"""
+        def day(name):
+            value = args.get(name)
+            if not value:
+                return None
+            try:
+                return datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                raise InvalidListingArgs(f'{name} must be YYYY-MM-DD')
+
+        limit = args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        date_to = day('date_to')
+        return cls(
+            cursor=args.get('cursor') or None,
+            limit=max(1, min(limit, MAX_PAGE_SIZE)),
+            tournament_id=args.get('tournament_id', type=int),
+            status=args.get('status') or None,
+            date_from=day('date_from'),
+            date_to=date_to + timedelta(days=1) if date_to else None
+        )
+
+    def filter(self, query, date_column, status_column=None, tournament_column=None):
+        """Apply the filters that the listing has columns for"""
+        if self.tournament_id is not None and tournament_column is not None:
+            query = query.filter(tournament_column == self.tournament_id)
+        if self.status and status_column is not None:
+            query = query.filter(status_column == self.status)
+        if self.date_from is not None:
+            query = query.filter(date_column >= self.date_from)
+        if self.date_to is not None:
+            query = query.filter(date_column < self.date_to)
+        return query
+
+    def query_args(self, **overrides):
+        """The filters as URL arguments, for links to other pages"""
+        args = {
+            'limit': self.limit if self.limit != DEFAULT_PAGE_SIZE else None,
+            'tournament_id': self.tournament_id,
+            'status': self.status,
+            'date_from': self.date_from.strftime('%Y-%m-%d') if self.date_from else None,
+            'date_to': (self.date_to - timedelta(days=1)).strftime('%Y-%m-%d') if self.date_to else None,
+            **overrides
+        }
+        return {name: value for name, value in args.items() if value is not None}
+
+
+@dataclass
+class KeysetPage:
+    items: list
+    next_cursor: str = None
+
+    @property
+    def has_more(self):
+        return self.next_cursor is not None
+
+
+def keyset_page(query, sort_column, id_column, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=False):
+    """Get the page of query after cursor, ordered by (sort_column, id_column)
+
+    The comparison is written as a range on sort_column plus a tie-break on
+    the id, which both SQLite and PostgreSQL answer from a (sort, id) index.
+    """
+    if cursor:
+        value, row_id = decode_cursor(cursor)
+        if descending:
+            query = query.filter(sort_column <= value, or_(sort_column < value, id_column < row_id))
+        else:
+            query = query.filter(sort_column >= value, or_(sort_column > value, id_column > row_id))
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column, id_column)
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return KeysetPage(rows)
+    rows = rows[:limit]
+    last = rows[-1]
+    return KeysetPage(rows, encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key)))
+
+
+def match_summary(match):
+    """JSON of a match in a listing (teams and tournament must be loaded)"""
+    return {
+        'id': match.id,
+        'date': match.date.isoformat(),
+        'status': match.status,
+        'stage': match.stage,
+        'group_name': match.group_name,
+        'tournament': {'id': match.tournament_id, 'name': match.tournament.name},
+        'home_team': {'id': match.home_team_id, 'name': match.home_team.name} if match.home_team else None,
+        'away_team': {'id': match.away_team_id, 'name': match.away_team.name} if match.away_team else None,
+        'home_score': match.home_score,
+        'away_score': match.away_score,
+        'venue': match.venue,
+        'field': match.field
+    }
+
+
+def tournament_summary(tournament):
+    """JSON of a tournament in a listing"""
+    return {
+        'id': tournament.id,
+        'name': tournament.name,
+        'status': tournament.status,
+        'tournament_type': tournament.tournament_type,
+        'start_date': tournament.start_date.isoformat(),
+        'end_date': tournament.end_date.isoformat()
+    }
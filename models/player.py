@@ -3,6 +3,16 @@ from datetime import datetime
 
 class Player(db.Model):
     __tablename__ = 'players'
+    __table_args__ = (
+        # Site-wide leaderboards (see models.leaderboard) and top scorers per team
+        db.Index('ix_players_goals_scored', 'goals_scored'),
+        db.Index('ix_players_assists', 'assists'),
+        db.Index('ix_players_yellow_cards', 'yellow_cards'),
+        db.Index('ix_players_red_cards', 'red_cards'),
+        db.Index('ix_players_team_goals', 'team_id', 'goals_scored'),
+        # Team rosters ordered by jersey number
+        db.Index('ix_players_team_jersey', 'team_id', 'jersey_number'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(50), nullable=False)
@@ -0,0 +1,206 @@
+from . import db
+from datetime import datetime
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
+from .data_version import _upsert_statement, bump_tournament_data
+
+STAT_COLUMNS = (
+    'matches_played', 'minutes_played', 'goals_scored', 'assists', 'yellow_cards', 'red_cards'
+)
+
+class PlayerStat(db.Model):
+    """Statistics of a player in one tournament, aggregated from the match event log
+
+    Kept up to date with deltas whenever events are recorded or removed (see
+    models.match_event), like the career totals on players, so leaderboards
+    read an index instead of counting events.
+    """
+    __tablename__ = 'player_stats'
+    __table_args__ = (
+        db.UniqueConstraint('tournament_id', 'player_id', name='uq_player_stats_tournament_player'),
+        # Leaderboards of a tournament (see models.leaderboard)
+        db.Index('ix_player_stats_tournament_goals', 'tournament_id', 'goals_scored'),
+        db.Index('ix_player_stats_tournament_assists', 'tournament_id', 'assists'),
+        db.Index('ix_player_stats_tournament_yellow_cards', 'tournament_id', 'yellow_cards'),
+        db.Index('ix_player_stats_tournament_red_cards', 'tournament_id', 'red_cards'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.id'), nullable=False)
+    player_id = db.Column(db.Integer, db.ForeignKey('players.id'), nullable=False)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
+
+    matches_played = db.Column(db.Integer, nullable=False, default=0)
+    minutes_played = db.Column(db.Integer, nullable=False, default=0)
+    goals_scored = db.Column(db.Integer, nullable=False, default=0)
+    assists = db.Column(db.Integer, nullable=False, default=0)
+    yellow_cards = db.Column(db.Integer, nullable=False, default=0)
+    red_cards = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    player = db.relationship('Player')
+
+    def __repr__(self):
+        return f'<PlayerStat player={self.player_id} tournament={self.tournament_id} goals={self.goals_scored}>'
+
+    def as_stats(self):
+        return {column: getattr(self, column) for column in STAT_COLUMNS}
+
+
+def apply_stat_deltas(deltas):
+    """Add {(tournament_id, player_id, team_id): {column: delta}} to the statistics
+
+    Upserts the per-tournament rows and updates the career totals on
+    players, inside the caller's transaction.
+    """
+    from .player import Player
+
+    connection = db.session.connection()
+    upsert = _upsert_statement(connection.dialect.name)
+    now = datetime.utcnow()
+    tournament_ids = set()
+    for (tournament_id, player_id, team_id), player_delta in deltas.items():
+        changes = {column: value for column, value in player_delta.items() if value}
+        if not changes:
+            continue
+        row = dict.fromkeys(STAT_COLUMNS, 0)
+        row.update(changes)
+        connection.execute(
+            upsert(PlayerStat)
+            .values(tournament_id=tournament_id, player_id=player_id, team_id=team_id, updated_at=now, **row)
+            .on_conflict_do_update(
+                index_elements=['tournament_id', 'player_id'],
+                set_={
+                    'team_id': team_id,
+                    'updated_at': now,
+                    **{column: getattr(PlayerStat, column) + value for column, value in changes.items()}
+                }
+            )
+        )
+        db.session.execute(
+            update(Player)
+            .where(Player.id == player_id)
+            .values({column: func.coalesce(getattr(Player, column), 0) + value for column, value in changes.items()})
+            .execution_options(synchronize_session=False)
+        )
+        tournament_ids.add(tournament_id)
+    bump_tournament_data(tournament_ids)
+
+
+def clear_tournament_stats(tournament_id):
+    """Take a tournament about to be deleted off its players' career totals
+
+    Subtracts its player_stats rows from the players (who may have moved to
+    another tournament's team since) in one batched UPDATE, then bulk-deletes
+    those rows and the tournament's event log. The caller commits.
+    """
+    from .match_event import MatchEvent
+    from .player import Player
+
+    rows = db.session.execute(
+        select(PlayerStat.player_id, *[getattr(PlayerStat, column) for column in STAT_COLUMNS])
+        .where(PlayerStat.tournament_id == tournament_id)
+    ).all()
+    if rows:
+        db.session.connection().execute(
+            update(Player.__table__)
+            .where(Player.__table__.c.id == bindparam('player_id'))
+            .values({
+                column: func.coalesce(Player.__table__.c[column], 0) - bindparam(f'taken_{column}')
+                for column in STAT_COLUMNS
+            }),
+            [
+                {'player_id': row.player_id, **{f'taken_{column}': getattr(row, column) for column in STAT_COLUMNS}}
+                for row in rows
+            ]
+        )
+    db.session.execute(
+        delete(MatchEvent).where(MatchEvent.tournament_id == tournament_id).execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        delete(PlayerStat).where(PlayerStat.tournament_id == tournament_id).execution_options(synchronize_session=False)
+    )
+    bump_tournament_data({tournament_id})
+
+
+def aggregate_player_stats(tournament_id=None):
+    """Get the statistics of every player with events from the log, in one grouped query
+
+    Returns a list of rows with tournament_id, player_id, team_id and
+    STAT_COLUMNS.
+    """
+    from .match_event import EVENT_COUNTS, EVENT_MINUTES, MatchEvent
+    from .live import MATCH_MINUTES
+
+    kind = MatchEvent.kind
+    left = case((MatchEvent.minute >= MATCH_MINUTES, 0), else_=MATCH_MINUTES - MatchEvent.minute)
+    columns = [
+        func.coalesce(func.sum(case(
+            (kind.in_([event for event, counted in EVENT_COUNTS.items() if counted == column]), 1), else_=0
+        )), 0).label(column)
+        for column in STAT_COLUMNS if column != 'minutes_played'
+    ]
+    columns.append(func.coalesce(func.sum(case(
+        (kind.in_([event for event, sign in EVENT_MINUTES.items() if sign > 0]), left),
+        (kind.in_([event for event, sign in EVENT_MINUTES.items() if sign < 0]), -left),
+        else_=0
+    )), 0).label('minutes_played'))
+
+    query = select(
+        MatchEvent.tournament_id, MatchEvent.player_id, func.max(MatchEvent.team_id).label('team_id'), *columns
+    ).group_by(MatchEvent.tournament_id, MatchEvent.player_id)
+    if tournament_id is not None:
+        query = query.where(MatchEvent.tournament_id == tournament_id)
+    return db.session.execute(query).all()
+
+
+def rebuild_player_stats(tournament_id=None):
+    """Recompute the player_stats rows and the players' totals from the event log
+
+    Rebuilds one tournament, or every tournament when tournament_id is None.
+    Returns the number of rows written. The caller commits.
+    """
+    from .player import Player
+
+    rows = [
+        {
+            'tournament_id': row.tournament_id,
+            'player_id': row.player_id,
+            'team_id': row.team_id,
+            'updated_at': datetime.utcnow(),
+            **{column: int(getattr(row, column)) for column in STAT_COLUMNS}
+        }
+        for row in aggregate_player_stats(tournament_id)
+    ]
+
+    clear = delete(PlayerStat)
+    previous = select(PlayerStat.player_id)
+    if tournament_id is not None:
+        clear = clear.where(PlayerStat.tournament_id == tournament_id)
+        previous = previous.where(PlayerStat.tournament_id == tournament_id)
+    player_ids = set(db.session.execute(previous).scalars())
+    db.session.execute(clear.execution_options(synchronize_session=False))
+    if rows:
+        db.session.execute(insert(PlayerStat), rows)
+    player_ids.update(row['player_id'] for row in rows)
+
+    # Career totals: the sum over every tournament of the players touched
+    if tournament_id is None:
+        db.session.execute(
+            update(Player).values(dict.fromkeys(STAT_COLUMNS, 0)).execution_options(synchronize_session=False)
+        )
+    totals = {player_id: dict.fromkeys(STAT_COLUMNS, 0) for player_id in player_ids}
+    if player_ids:
+        for row in db.session.execute(
+            select(PlayerStat.player_id, *[func.sum(getattr(PlayerStat, column)).label(column) for column in STAT_COLUMNS])
+            .where(PlayerStat.player_id.in_(player_ids))
+            .group_by(PlayerStat.player_id)
+        ):
+            totals[row.player_id] = {column: int(getattr(row, column)) for column in STAT_COLUMNS}
+        db.session.execute(
+            update(Player).execution_options(synchronize_session=False),
+            [{'id': player_id, **stats} for player_id, stats in totals.items()]
+        )
+
+    bump_tournament_data({row['tournament_id'] for row in rows} | ({tournament_id} - {None}))
+    return len(rows)
@@ -0,0 +1,45 @@
+def round_count(team_count, legs=1):
+    """Get the number of rounds of a round-robin between team_count teams"""
+    if team_count < 2:
+        return 0
+    return (team_count - 1 + team_count % 2) * legs
+
+
+def round_robin(team_ids, legs=1):
+    """Yield (round_number, home_id, away_id) with the circle (Berger) method
+
+    Every team plays at most once per round. With an odd number of teams one
+    team sits out each round (a bye, not yielded). Home and away alternate so
+    that every team's home and away counts differ by at most one per leg; the
+    second leg repeats the first with home and away swapped.
+
+    Fixtures are produced lazily, so only the team list is kept in memory.
+    Rounds are numbered from 0.
+    """
+    teams = list(team_ids)
+    if len(teams) < 2:
+        return
+    if len(teams) % 2:
+        teams.append(None)  # Bye
+
+    n = len(teams)
+    rotating = n - 1  # teams[-1] stays fixed, the others rotate around it
+    fixed = teams[-1]
+
+    for leg in range(legs):
+        for r in range(rotating):
+            pairs = []
+            # The fixed team alternates home and away from round to round
+            other = teams[r]
+            pairs.append((other, fixed) if r % 2 == 0 else (fixed, other))
+            for k in range(1, n // 2):
+                first = teams[(r + k) % rotating]
+                second = teams[(r - k) % rotating]
+                pairs.append((first, second) if k % 2 else (second, first))
+
+            for home, away in pairs:
+                if home is None or away is None:
+                    continue
+                if leg % 2:
+                    home, away = away, home
+                yield leg * rotating + r, home, away
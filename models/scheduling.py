@@ -0,0 +1,428 @@
+"""
+Field and time-slot scheduling of fixtures
+
+Fixtures are placed on a grid of daily kick-off times x fields so that no
+field hosts two matches at once and every team gets at least
+min_rest_hours between the end of one match and the start of the next.
+Matches that are already booked (other tournaments on the same fields,
+matches in progress or completed) are loaded as fixed bookings.
+
+The solver is a greedy pass (each fixture, in order, takes the earliest
+feasible slot) followed by local search that relocates the latest
+fixtures to earlier holes freed up after the greedy pass. A knockout match
+whose teams are still TBD is placed after the matches that feed it, plus
+the rest time of their winners.
+"""
+
+import time as clock
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import select, update
+from . import db
+from .change_log import MATCH, log_changes
+from .data_version import bump_data_version
+
+DEFAULT_FIELDS = ('Campo 1', 'Campo 2', 'Campo 3')
+DEFAULT_SLOT_TIMES = (time(14), time(16), time(18), time(20))
+
+# Times are handled as integer minutes since this date
+_EPOCH = datetime(2000, 1, 1)
+
+
+def _to_minutes(value):
+    return (value - _EPOCH) // timedelta(minutes=1)
+
+
+def _from_minutes(minutes):
+    return _EPOCH + timedelta(minutes=minutes)
+
+
+@dataclass(frozen=True)
+class ScheduleConfig:
+    """Fields, daily slot grid and rest rules used to place fixtures"""
+    fields: tuple = DEFAULT_FIELDS
+    slot_times: tuple = DEFAULT_SLOT_TIMES
+    match_minutes: int = 90
+    min_rest_hours: float = 24
+    start_date: date = None  # Defaults to tomorrow
+    # Weekdays (0 = Monday) on which matches may be played; None = every day
+    weekdays: tuple = None
+    max_days: int = 365
+    local_search_seconds: float = 2.0
+
+    @classmethod
+    def from_request_data(cls, data):
+        """Build a config from optional form/JSON fields of an admin request
+
+        fields: comma separated names, slot_times: comma separated HH:MM,
+        min_rest_hours, match_minutes, start_date: YYYY-MM-DD
+        """
+        options = {}
+        if data.get('fields'):
+            options['fields'] = tuple(name.strip() for name in str(data['fields']).split(',') if name.strip())
+        if data.get('slot_times'):
+            options['slot_times'] = tuple(
+                datetime.strptime(value.strip(), '%H:%M').time()
+                for value in str(data['slot_times']).split(',') if value.strip()
+            )
+        if data.get('min_rest_hours') not in (None, ''):
+            options['min_rest_hours'] = float(data['min_rest_hours'])
+        if data.get('match_minutes') not in (None, ''):
+            options['match_minutes'] = int(data['match_minutes'])
+        if data.get('start_date'):
+            options['start_date'] = datetime.strptime(str(data['start_date']), '%Y-%m-%d').date()
+        return cls(**options)
+
+
+class IntervalIndex:
+    """Booked [start, end) intervals per key (team or field), in minutes
+
+    Starts are kept sorted per key, so an overlap check is a bisect plus a
+    scan over the few intervals that start less than the longest booking
+    before the queried start.
+    """
+
+    def __init__(self):
+        self._intervals = {}
+        self._longest = 0
+
+    def add(self, key, start, end):
+        insort(self._intervals.setdefault(key, []), (start, end))
+        self._longest = max(self._longest, end - start)
+
+    def remove(self, key, start, end):
+        intervals = self._intervals[key]
+        del intervals[bisect_left(intervals, (start, end))]
+
+    def overlaps(self, key, start, end):
+        """Check whether any interval of key intersects [start, end)"""
+        intervals = self._intervals.get(key)
+        if not intervals:
+            return False
+        # Candidates start before `end` and not before start - longest
+        position = bisect_left(intervals, (end,))
+        lowest = start - self._longest
+        while position > 0:
+            position -= 1
+            other_start, other_end = intervals[position]
+            if other_start < lowest:
+                break
+            if other_end > start:
+                return True
+        return False
+
+
+@dataclass
+class ScheduleResult:
+    """Outcome of a scheduling run"""
+    # fixture key -> (datetime, field name)
+    assignments: dict = field(default_factory=dict)
+    # Keys of fixtures that did not fit within max_days
+    unscheduled: list = field(default_factory=list)
+    relocations: int = 0
+    last_kickoff: datetime = None
+
+
+class Scheduler:
+    """Greedy + local search placement of fixtures on a slot grid
+
+    Fixtures are (key, home_team_id, away_team_id) tuples; they are placed
+    in the given order, so callers pass them round by round.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or ScheduleConfig()
+        start_date = self.config.start_date or (datetime.now() + timedelta(days=1)).date()
+        self._start = datetime.combine(start_date, time())
+        self._duration = self.config.match_minutes
+        self._rest = int(self.config.min_rest_hours * 60)
+        self._slots = self._build_slots()
+        # Slot position -> number of fields used, to skip full slots quickly
+        self._used = [0] * len(self._slots)
+        self._first_open = 0
+        self.teams = IntervalIndex()
+        self.fields = IntervalIndex()
+
+    def _build_slots(self):
+        """Kick-off minutes of every grid slot within max_days, in order"""
+        config = self.config
+        slot_times = sorted(config.slot_times)
+        slots = []
+        for day in range(config.max_days):
+            current = self._start + timedelta(days=day)
+            if config.weekdays is not None and current.weekday() not in config.weekdays:
+                continue
+            for kickoff in slot_times:
+                slots.append(_to_minutes(datetime.combine(current.date(), kickoff)))
+        return slots
+
+    def book(self, home_team_id, away_team_id, kickoff, field_name):
+        """Register an existing match as a fixed booking"""
+        start = _to_minutes(kickoff)
+        end = start + self._duration
+        for team_id in (home_team_id, away_team_id):
+            if team_id is not None:
+                self.teams.add(team_id, start, end)
+        if field_name:
+            self.fields.add(field_name, start, end)
+
+    def load_bookings(self, exclude_ids=()):
+        """Book every dated match from the scheduling window on, except exclude_ids"""
+        from .match import Match
+
+        window_start = self._start - timedelta(minutes=self._duration + self._rest)
+        query = select(Match.id, Match.home_team_id, Match.away_team_id, Match.date, Match.field)\
+            .where(Match.date >= window_start)
+        exclude_ids = set(exclude_ids)
+        for match_id, home_team_id, away_team_id, kickoff, field_name in db.session.execute(query):
+            if match_id not in exclude_ids:
+                self.book(home_team_id, away_team_id, kickoff, field_name)
+
+    def _teams_free(self, home_team_id, away_team_id, start):
+        # Rest is padded on both sides, so the gap to any other match is kept
+        low, high = start - self._rest, start + self._duration + self._rest
+        return not (self.teams.overlaps(home_team_id, low, high)
+                    or self.teams.overlaps(away_team_id, low, high))
+
+    def _free_field(self, start):
+        end = start + self._duration
+        for field_name in self.config.fields:
+            if not self.fields.overlaps(field_name, start, end):
+                return field_name
+        return None
+
+    def _earliest(self, home_team_id, away_team_id, before=None, after=None):
+        """Find the first (slot position, field) both teams and a field are free
+
+        before: slot position to stop at, after: earliest kick-off minute
+        """
+        stop = len(self._slots) if before is None else before
+        first = self._first_open if after is None else max(self._first_open, bisect_left(self._slots, after))
+        field_count = len(self.config.fields)
+        for position in range(first, stop):
+            if self._used[position] >= field_count:
+                continue
+            start = self._slots[position]
+            if not self._teams_free(home_team_id, away_team_id, start):
+                continue
+            field_name = self._free_field(start)
+            if field_name is not None:
+                return position, field_name
+        return None
+
+    def _place(self, home_team_id, away_team_id, position, field_name):
+        start = self._slots[position]
+        end = start + self._duration
+        for team_id in (home_team_id, away_team_id):
+            if team_id is not None:
+                self.teams.add(team_id, start, end)
+        self.fields.add(field_name, start, end)
+        self._used[position] += 1
+        field_count = len(self.config.fields)
+        while self._first_open < len(self._slots) and self._used[self._first_open] >= field_count:
+            self._first_open += 1
+
+    def _unplace(self, home_team_id, away_team_id, position, field_name):
+        start = self._slots[position]
+        end = start + self._duration
+        for team_id in (home_team_id, away_team_id):
+            if team_id is not None:
+                self.teams.remove(team_id, start, end)
+        self.fields.remove(field_name, start, end)
+        self._used[position] -= 1
+        self._first_open = min(self._first_open, position)
+
+    def _not_before(self, key, placed, after, not_before):
+        """Earliest kick-off minute of a fixture that waits for others (None if it does not)
+
+        Returns False when a fixture it waits for could not be placed.
+        """
+        starts = [not_before[key]] if key in not_before else []
+        for other in after.get(key, ()):
+            if other not in placed:
+                return False
+            starts.append(self._slots[placed[other][2]])
+        if not starts:
+            return None
+        # Whoever comes out of those matches needs its rest too
+        return max(starts) + self._duration + self._rest
+
+    def schedule(self, fixtures, after=None, not_before=None):
+        """Place fixtures and return a ScheduleResult
+
+        after: {key: keys of earlier fixtures it must follow}, for knockout
+        matches whose teams come out of those; not_before: {key: kick-off of
+        a match already booked that it must follow}.
+        """
+        after = after or {}
+        not_before = {key: _to_minutes(kickoff) for key, kickoff in (not_before or {}).items()}
+        result = ScheduleResult()
+        if not self.config.fields or not self._slots:
+            result.unscheduled = [key for key, _, _ in fixtures]
+            return result
+
+        # Greedy: earliest feasible slot, in fixture order
+        placed = {}
+        for key, home_team_id, away_team_id in fixtures:
+            earliest = self._not_before(key, placed, after, not_before)
+            found = None if earliest is False else self._earliest(home_team_id, away_team_id, after=earliest)
+            if found is None:
+                result.unscheduled.append(key)
+                continue
+            self._place(home_team_id, away_team_id, *found)
+            placed[key] = (home_team_id, away_team_id) + found
+
+        result.relocations = self._improve(placed, after, not_before)
+
+        for key, (_, _, position, field_name) in placed.items():
+            result.assignments[key] = (_from_minutes(self._slots[position]), field_name)
+        if placed:
+            result.last_kickoff = _from_minutes(self._slots[max(p[2] for p in placed.values())])
+        return result
+
+    def _improve(self, placed, after, not_before):
+        """Local search: move the latest fixtures to earlier feasible slots
+
+        Later greedy placements can leave holes before earlier ones (a team
+        that rested, a field freed by a fixed booking); repeat relocation
+        passes from the back until nothing moves or the time budget is spent.
+        """
+        deadline = clock.monotonic() + self.config.local_search_seconds
+        relocations = 0
+        moved = True
+        while moved and clock.monotonic() < deadline:
+            moved = False
+            for key in sorted(placed, key=lambda k: placed[k][2], reverse=True):
+                home_team_id, away_team_id, position, field_name = placed[key]
+                if position <= self._first_open:
+                    continue
+                self._unplace(home_team_id, away_team_id, position, field_name)
+                earliest = self._not_before(key, placed, after, not_before)
+                found = self._earliest(home_team_id, away_team_id, before=position, after=earliest)
+                if found is None:
+                    self._place(home_team_id, away_team_id, position, field_name)
+                else:
+                    self._place(home_team_id, away_team_id, *found)
+                    placed[key] = (home_team_id, away_team_id) + found
+                    relocations += 1
+                    moved = True
+                if clock.monotonic() >= deadline:
+                    break
+        return relocations
+
+
+def schedule_fixture_rows(rows, config=None):
+    """Fill in 'date' and 'field' of new fixture row dicts, in place
+
+    Rows are placed in list order around the matches already booked.
+    Returns the ScheduleResult; rows that did not fit keep no date.
+    """
+    scheduler = Scheduler(config)
+    scheduler.load_bookings()
+    result = scheduler.schedule([
+        (index, row['home_team_id'], row['away_team_id']) for index, row in enumerate(rows)
+    ])
+    for index, (kickoff, field_name) in result.assignments.items():
+        rows[index]['date'] = kickoff
+        rows[index]['field'] = field_name
+    return result
+
+
+def _knockout_feeders(pending):
+    """Get {match id: ids of the bracket matches whose winner or loser it waits for}"""
+    from .match import Match
+
+    tournament_ids = {row.tournament_id for row in pending if row.bracket_slot is not None}
+    if not tournament_ids:
+        return {}
+    by_slot = {}
+    for match_id, tournament_id, next_slot, loser_next_slot in db.session.execute(
+        select(Match.id, Match.tournament_id, Match.next_slot, Match.loser_next_slot)
+        .where(Match.tournament_id.in_(tournament_ids), Match.bracket_slot.is_not(None))
+    ):
+        for slot in (next_slot, loser_next_slot):
+            if slot is not None:
+                by_slot.setdefault((tournament_id, slot), []).append(match_id)
+    return {
+        row.id: by_slot[(row.tournament_id, row.bracket_slot)]
+        for row in pending if (row.tournament_id, row.bracket_slot) in by_slot
+    }
+
+
+def _feeders_first(pending, feeders):
+    """Order pending matches so that none comes before a pending match feeding it"""
+    waiting = list(pending)
+    pending_ids = {row.id for row in pending}
+    ordered, done = [], set()
+    while waiting:
+        ready = [row for row in waiting if all(
+            match_id in done or match_id not in pending_ids for match_id in feeders.get(row.id, ())
+        )]
+        if not ready:
+            # A cycle cannot come out of slot links; keep the rest as they are
+            ordered.extend(waiting)
+            break
+        ordered.extend(ready)
+        done.update(row.id for row in ready)
+        waiting = [row for row in waiting if row.id not in done]
+    return ordered
+
+
+def reschedule_pending_matches(tournament_id=None, config=None):
+    """Re-place every scheduled (not started) match, keeping their current order
+
+    Knockout matches come after the matches feeding them, TBD ones included.
+    Matches of other tournaments and started or completed matches stay
+    where they are and block their teams and fields. The caller commits.
+    """
+    from .bracket import KNOCKOUT_STAGES
+    from .match import Match
+
+    query = select(
+        Match.id, Match.home_team_id, Match.away_team_id, Match.tournament_id, Match.stage, Match.bracket_slot
+    ).where(Match.status == 'scheduled')
+    if tournament_id is not None:
+        query = query.where(Match.tournament_id == tournament_id)
+    pending = db.session.execute(query.order_by(Match.date, Match.id)).all()
+    # Matches of a knockout round wait for the rounds feeding them
+    feeders = _knockout_feeders(pending)
+    pending = _feeders_first(pending, feeders)
+    pending_ids = {row.id for row in pending}
+    # Feeders that stay where they are (started, or of a round already played)
+    fixed_ids = {match_id for ids in feeders.values() for match_id in ids} - pending_ids
+    booked = dict(db.session.execute(
+        select(Match.id, Match.date).where(Match.id.in_(fixed_ids), Match.date.is_not(None))
+    ).all()) if fixed_ids else {}
+    not_before = {}
+    for match_id, ids in feeders.items():
+        kickoffs = [booked[feeder_id] for feeder_id in ids if feeder_id in booked]
+        if kickoffs:
+            not_before[match_id] = max(kickoffs)
+
+    scheduler = Scheduler(config)
+    scheduler.load_bookings(exclude_ids=pending_ids)
+    result = scheduler.schedule(
+        [(row.id, row.home_team_id, row.away_team_id) for row in pending],
+        after={match_id: [feeder_id for feeder_id in ids if feeder_id in pending_ids] for match_id, ids in feeders.items()},
+        not_before=not_before
+    )
+
+    if result.assignments:
+        db.session.execute(
+            update(Match),
+            [
+                {'id': match_id, 'date': kickoff, 'field': field_name}
+                for match_id, (kickoff, field_name) in result.assignments.items()
+            ],
+            execution_options={'synchronize_session': False}
+        )
+        rows = {row.id: row for row in pending}
+        log_changes(MATCH, [(rows[match_id].tournament_id, match_id) for match_id in result.assignments])
+        # Bulk UPDATEs skip the flush listeners, and the bracket document shows kick-offs
+        for bracket_tournament_id in {
+            rows[match_id].tournament_id for match_id in result.assignments if rows[match_id].stage in KNOCKOUT_STAGES
+        }:
+            bump_data_version(bracket_tournament_id, 'bracket')
+    return result
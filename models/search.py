@@ -0,0 +1,395 @@
+"""
+Full-text search of tournaments, teams, players and venues
+
+Every searchable row has a search_documents row (title, subtitle, body),
+kept in sync in the same transaction by a flush listener; bulk fixture
+inserts call index_venues() themselves. The inverted index over title and
+body is backend specific:
+
+- SQLite: an FTS5 external-content table, maintained by triggers on
+  search_documents, ranked with bm25() (title weighted over body)
+- PostgreSQL: a generated tsvector column (title weight A, body weight B)
+  with a GIN index, ranked with ts_rank()
+
+Every word of the query is matched as a prefix, so results show up while
+the name is still being typed. A page of results is one query.
+"""
+
+import re
+from dataclasses import dataclass
+
+from sqlalchemy import and_, case, column, delete, event, func, insert, inspect, literal, literal_column, or_, select, table, text
+from sqlalchemy.orm import Session
+from . import db
+from .data_version import ALL_TOURNAMENTS, bump_data_version, player_tournament_ids
+
+TOURNAMENT = 'tournament'
+TEAM = 'team'
+PLAYER = 'player'
+VENUE = 'venue'  # entity_id is the tournament's id, title the venue name
+KINDS = (TOURNAMENT, TEAM, PLAYER, VENUE)
+
+# Version bumped, per tournament, when tournament, team or player documents change (see models.suggest)
+SEARCH_SCOPE = 'search'
+
+DEFAULT_RESULTS_PER_PAGE = 20
+MAX_RESULTS_PER_PAGE = 50
+MAX_PAGE = 50
+MAX_QUERY_TERMS = 8
+
+# Weights of the title and body columns in bm25()
+SQLITE_RANK_WEIGHTS = (10.0, 1.0)
+
+_SQLITE_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+        title, body, content='search_documents', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN
+        INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN
+        INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN
+        INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+)
+
+_POSTGRESQL_DDL = (
+    """ALTER TABLE search_documents ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(body, '')), 'B')
+        ) STORED""",
+    'CREATE INDEX IF NOT EXISTS ix_search_documents_vector ON search_documents USING GIN (search_vector)',
+)
+
+
+class SearchDocument(db.Model):
+    """Searchable text of one tournament, team, player or venue"""
+    __tablename__ = 'search_documents'
+    __table_args__ = (
+        # Re-indexing a changed row: delete by (kind, entity_id), insert again
+        db.Index('ix_search_documents_kind_entity', 'kind', 'entity_id'),
+        # Ids are never reused, so readers can pick up new documents by id (see models.suggest)
+        {'sqlite_autoincrement': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(12), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    # No foreign keys: names of both are joined in when results are shown
+    tournament_id = db.Column(db.Integer)
+    team_id = db.Column(db.Integer)
+    title = db.Column(db.String(200), nullable=False)
+    subtitle = db.Column(db.String(200))
+    body = db.Column(db.Text)
+
+    def __repr__(self):
+        return f'<SearchDocument {self.kind}={self.entity_id} {self.title!r}>'
+
+
+def _words(*values):
+    return ' '.join(value for value in values if value)
+
+
+def _tournament_document(tournament):
+    return {
+        'kind': TOURNAMENT, 'entity_id': tournament.id, 'tournament_id': tournament.id, 'team_id': None,
+        'title': tournament.name,
+        'subtitle': (tournament.description or '')[:200] or None,
+        'body': tournament.description
+    }
+
+
+def _team_document(team):
+    return {
+        'kind': TEAM, 'entity_id': team.id, 'tournament_id': team.tournament_id, 'team_id': team.id,
+        'title': team.name,
+        'subtitle': ', '.join(value for value in (team.city, team.country) if value) or None,
+        'body': _words(team.city, team.country, team.stadium)
+    }
+
+
+def _player_document(player):
+    return {
+        'kind': PLAYER, 'entity_id': player.id, 'tournament_id': None, 'team_id': player.team_id,
+        'title': _words(player.first_name, player.last_name),
+        'subtitle': ' · '.join(value for value in (player.position, player.nationality) if value) or None,
+        'body': _words(player.nationality, player.position)
+    }
+
+
+def _replace_documents(connection, kind, entity_ids, documents):
+    if entity_ids:
+        connection.execute(
+            delete(SearchDocument).where(SearchDocument.kind == kind, SearchDocument.entity_id.in_(entity_ids))
+        )
+    if documents:
+        connection.execute(insert(SearchDocument), documents)
+
+
+def index_venues(tournament_ids, connection=None):
+    """Re-index the venues of tournaments from their matches"""
+    from .match import Match
+
+    tournament_ids = [tournament_id for tournament_id in set(tournament_ids) if tournament_id is not None]
+    if not tournament_ids:
+        return
+    connection = connection if connection is not None else db.session.connection()
+    rows = connection.execute(
+        select(Match.tournament_id, Match.venue).distinct()
+        .where(Match.tournament_id.in_(tournament_ids), Match.venue.is_not(None), Match.venue != '')
+    ).all()
+    _replace_documents(connection, VENUE, tournament_ids, [
+        {'kind': VENUE, 'entity_id': tournament_id, 'tournament_id': tournament_id, 'team_id': None,
+         'title': venue, 'subtitle': None, 'body': None}
+        for tournament_id, venue in rows
+    ])
+
+
+@event.listens_for(Session, 'after_flush')
+def _index_flushed(session, flush_context):
+    from .match import Match
+    from .team import Team
+    from .player import Player
+    from .tournament import Tournament
+
+    # kind, document builder and the attributes it reads
+    builders = {
+        Tournament: (TOURNAMENT, _tournament_document, ('name', 'description')),
+        Team: (TEAM, _team_document, ('name', 'city', 'country', 'stadium', 'tournament_id')),
+        Player: (PLAYER, _player_document, ('first_name', 'last_name', 'position', 'nationality', 'team_id')),
+    }
+    changed = {}
+    venue_tournaments = set()
+    search_tournaments = set()
+    players = []
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, Match):
+            # Score updates leave the venues alone
+            if obj not in session.dirty or inspect(obj).attrs.venue.history.has_changes():
+                venue_tournaments.add(obj.tournament_id)
+            continue
+        builder = builders.get(type(obj))
+        if builder is None:
+            continue
+        kind, document, attributes = builder
+        if obj in session.dirty:
+            state = inspect(obj)
+            # Goals, cards and the like do not change what is searchable
+            if not any(state.attrs[name].history.has_changes() for name in attributes):
+                continue
+        ids, documents = changed.setdefault(kind, ([], []))
+        ids.append(obj.id)
+        if obj not in session.deleted:
+            documents.append(document(obj))
+        if isinstance(obj, Player):
+            players.append(obj)
+        else:
+            search_tournaments.add(obj.id if isinstance(obj, Tournament) else obj.tournament_id)
+
+    if not changed and not venue_tournaments:
+        return
+    connection = session.connection()
+    for kind, (ids, documents) in changed.items():
+        _replace_documents(connection, kind, ids, documents)
+    if players:
+        search_tournaments.update(player_tournament_ids(session, players))
+    search_tournaments.discard(None)
+    for tournament_id in sorted(search_tournaments):
+        bump_data_version(tournament_id, SEARCH_SCOPE, connection)
+    index_venues(venue_tournaments, connection)
+
+
+def _backend(connection):
+    return connection.dialect.name if connection.dialect.name in ('sqlite', 'postgresql') else None
+
+
+def init_search_index():
+    """Create the backend's index over search_documents, filling it if it is new
+
+    Returns whether the documents were (re)built. Safe to run on every start.
+    """
+    from .tournament import Tournament
+
+    engine = db.engine
+    with engine.begin() as connection:
+        backend = _backend(connection)
+        if backend == 'sqlite':
+            created = 'search_fts' not in inspect(connection).get_table_names()
+            schema = connection.execute(text(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'search_documents'"
+            )).scalar()
+            if 'AUTOINCREMENT' not in (schema or '').upper():
+                # Created before ids were AUTOINCREMENT: the documents are rebuilt anyway
+                _drop_sqlite_index(connection)
+                SearchDocument.__table__.drop(connection, checkfirst=True)
+                SearchDocument.__table__.create(connection)
+                created = True
+            for statement in _SQLITE_DDL:
+                connection.execute(text(statement))
+        elif backend == 'postgresql':
+            columns = {column['name'] for column in inspect(connection).get_columns('search_documents')}
+            created = 'search_vector' not in columns
+            for statement in _POSTGRESQL_DDL:
+                connection.execute(text(statement))
+        else:
+            created = False
+        empty = connection.execute(select(SearchDocument.id).limit(1)).first() is None
+        has_data = connection.execute(select(Tournament.id).limit(1)).first() is not None
+
+    if created or (empty and has_data):
+        rebuild_search_index()
+        return True
+    return False
+
+
+def _drop_sqlite_index(connection):
+    for trigger in ('search_documents_ai', 'search_documents_ad', 'search_documents_au'):
+        connection.execute(text(f'DROP TRIGGER IF EXISTS {trigger}'))
+    connection.execute(text('DROP TABLE IF EXISTS search_fts'))
+
+
+def rebuild_search_index():
+    """Rebuild every search document from the tables, in one transaction
+
+    INSERT ... SELECT on the server: no rows are loaded into Python.
+    Returns the number of documents.
+    """
+    from .match import Match
+    from .team import Team
+    from .player import Player
+    from .tournament import Tournament
+
+    def joined(separator, *columns):
+        """Non-empty values joined by separator, NULL if there are none: as the flush listener writes them"""
+        expression = func.nullif(columns[0], '')
+        for column in columns[1:]:
+            value = func.nullif(column, '')
+            expression = case(
+                (expression.is_(None), value),
+                (value.is_(None), expression),
+                else_=expression + separator + value
+            )
+        return expression
+
+    def words(*columns):
+        return func.coalesce(joined(' ', *columns), '')
+
+    columns = ['kind', 'entity_id', 'tournament_id', 'team_id', 'title', 'subtitle', 'body']
+    with db.engine.begin() as connection:
+        sqlite = _backend(connection) == 'sqlite'
+        if sqlite:
+            # Built in one pass at the end instead of by the triggers, row by row
+            _drop_sqlite_index(connection)
+        connection.execute(delete(SearchDocument))
+        connection.execute(insert(SearchDocument).from_select(columns, select(
+            literal(TOURNAMENT), Tournament.id, Tournament.id, literal(None),
+            Tournament.name, func.nullif(func.substr(Tournament.description, 1, 200), ''), Tournament.description
+        )))
+        connection.execute(insert(SearchDocument).from_select(columns, select(
+            literal(TEAM), Team.id, Team.tournament_id, Team.id,
+            Team.name, joined(', ', Team.city, Team.country), words(Team.city, Team.country, Team.stadium)
+        )))
+        connection.execute(insert(SearchDocument).from_select(columns, select(
+            literal(PLAYER), Player.id, literal(None), Player.team_id,
+            words(Player.first_name, Player.last_name), joined(' · ', Player.position, Player.nationality),
+            words(Player.nationality, Player.position)
+        )))
+        connection.execute(insert(SearchDocument).from_select(columns, select(
+            literal(VENUE), Match.tournament_id, Match.tournament_id, literal(None),
+            Match.venue, literal(None), literal(None)
+        ).distinct().where(Match.venue.is_not(None), Match.venue != '')))
+        if sqlite:
+            for statement in _SQLITE_DDL:
+                connection.execute(text(statement))
+            connection.execute(text("INSERT INTO search_fts(search_fts) VALUES ('rebuild')"))
+        bump_data_version(ALL_TOURNAMENTS, SEARCH_SCOPE, connection)
+        return connection.execute(select(func.count()).select_from(SearchDocument)).scalar()
+
+
+@dataclass
+class SearchResult:
+    kind: str
+    id: int
+    title: str
+    subtitle: str
+    tournament_id: int
+    tournament_name: str
+    team_id: int
+    team_name: str
+
+
+@dataclass
+class SearchPage:
+    query: str
+    kind: str
+    page: int
+    results: list
+    has_more: bool
+
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())[:MAX_QUERY_TERMS]
+
+
+def search(query, kind=None, page=1, per_page=DEFAULT_RESULTS_PER_PAGE):
+    """Get one page of ranked results for query, optionally of one kind"""
+    from .team import Team
+    from .tournament import Tournament
+
+    page = max(1, min(page, MAX_PAGE))
+    per_page = max(1, min(per_page, MAX_RESULTS_PER_PAGE))
+    kind = kind if kind in KINDS else None
+    terms = _terms(query)
+    if not terms:
+        return SearchPage(query, kind, page, [], False)
+
+    document = SearchDocument.__table__
+    backend = _backend(db.session.connection())
+    if backend == 'sqlite':
+        fts = table('search_fts', column('rowid'))
+        match = ' '.join(f'"{term}"*' for term in terms)
+        rank = func.bm25(literal_column('search_fts'), *SQLITE_RANK_WEIGHTS)
+        source = document.join(fts, fts.c.rowid == document.c.id)
+        condition = text('search_fts MATCH :match').bindparams(match=match)
+        order = (rank, document.c.id)
+    elif backend == 'postgresql':
+        tsquery = func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+        vector = literal_column('search_documents.search_vector')
+        rank = func.ts_rank(vector, tsquery)
+        source = document
+        condition = vector.op('@@')(tsquery)
+        order = (rank.desc(), document.c.id)
+    else:
+        # No inverted index: every term must appear in the title or body
+        source = document
+        condition = and_(*(
+            or_(document.c.title.ilike(f'%{term}%'), document.c.body.ilike(f'%{term}%')) for term in terms
+        ))
+        order = (document.c.title, document.c.id)
+
+    team = Team.__table__
+    tournament = Tournament.__table__
+    statement = (
+        select(document.c.kind, document.c.entity_id, document.c.title, document.c.subtitle,
+               document.c.tournament_id, tournament.c.name, document.c.team_id, team.c.name)
+        .select_from(source
+                     .outerjoin(team, team.c.id == document.c.team_id)
+                     .outerjoin(tournament, tournament.c.id == func.coalesce(document.c.tournament_id,
+                                                                              team.c.tournament_id)))
+        .where(condition)
+        .order_by(*order)
+        .limit(per_page + 1)
+        .offset((page - 1) * per_page)
+    )
+    if kind:
+        statement = statement.where(document.c.kind == kind)
+
+    rows = db.session.execute(statement).all()
+    results = [SearchResult(*row) for row in rows[:per_page]]
+    return SearchPage(query, kind, page, results, len(rows) > per_page)
@@ -0,0 +1,403 @@
+"""
+Monte Carlo qualification odds of the teams of each group
+
+The remaining fixtures of a group are played many times over at once: goals
+are drawn for every fixture and simulation in one call, and the tables live
+in teams x simulations arrays. Each simulated table is ordered like
+Group.get_standings (points, goal difference, goals scored, then team id),
+which gives every team's distribution of finishing positions and so its
+chance of ending in the qualifying places.
+
+Groups are independent, so they are simulated in parallel in a pool of
+processes that gunicorn.conf.py starts in each web worker; the gevent loop
+of the web worker only waits for them. Each group gets its own random
+stream, spawned from one seed: the result is the same with or without the
+pool, and by default the seed is the tournament's data version, so the odds
+only move when the data does, and are cached until then.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field, replace
+
+import numpy as np
+from sqlalchemy import select
+from . import db
+
+DEFAULT_SIMULATIONS = 100_000
+MAX_SIMULATIONS = 1_000_000
+# Simulations per batch: bounds the memory of the fixtures x simulations draws
+BATCH_SIZE = 50_000
+# Resolution of the goal draws (see _goal_tables)
+GOAL_QUANTILES = 1 << 16
+DEFAULT_QUALIFYING = 2
+REMAINING_STATUSES = ('scheduled', 'in_progress')
+
+# Sort key of a simulated table: points, then goal difference, then goals scored
+_POINTS_SHIFT = 42
+_DIFFERENCE_SHIFT = 21
+_DIFFERENCE_OFFSET = 1 << 20
+
+
+class InvalidSimulation(ValueError):
+    """Simulation parameters out of range"""
+
+
+@dataclass(frozen=True)
+class ScoreModel:
+    """Goals of each side of a fixture drawn from a Poisson distribution
+
+    A side's rate is mean_goals times its attack (goals scored per match) and
+    the opponent's defence (goals conceded per match), both relative to
+    mean_goals and shrunk toward it as if each team had also played
+    prior_matches average matches. The home side's rate is multiplied by
+    1 + home_advantage. A large prior_matches makes every team equal.
+    """
+    mean_goals: float = 1.35
+    home_advantage: float = 0.1
+    prior_matches: float = 3.0
+
+    def __post_init__(self):
+        if not 0 < self.mean_goals <= 10:
+            raise InvalidSimulation('mean_goals must be between 0 and 10')
+        if not -0.9 <= self.home_advantage <= 2:
+            raise InvalidSimulation('home_advantage must be between -0.9 and 2')
+        if not 0 <= self.prior_matches <= 1000:
+            raise InvalidSimulation('prior_matches must be between 0 and 1000')
+
+    def as_dict(self):
+        return asdict(self)
+
+    def rates(self, season):
+        """Get the (home, away) goal rates of every remaining fixture of season"""
+        prior = self.prior_matches * self.mean_goals
+        played = np.asarray(season.matches_played, dtype=float) + self.prior_matches
+        if self.prior_matches == 0:
+            played = np.maximum(played, 1)
+        attack = (np.asarray(season.goals_for, dtype=float) + prior) / played / self.mean_goals
+        defence = (np.asarray(season.goals_against, dtype=float) + prior) / played / self.mean_goals
+        # Above zero even without a prior: every side can still score
+        attack = np.maximum(attack, 0.05)
+        defence = np.maximum(defence, 0.05)
+
+        fixtures = season.fixtures
+        home = np.array([fixture[0] for fixture in fixtures], dtype=np.intp)
+        away = np.array([fixture[1] for fixture in fixtures], dtype=np.intp)
+        left = np.array([fixture[4] for fixture in fixtures], dtype=float)
+        home_rates = self.mean_goals * attack[home] * defence[away] * (1 + self.home_advantage) * left
+        away_rates = self.mean_goals * attack[away] * defence[home] * left
+        return home_rates, away_rates
+
+
+@dataclass
+class GroupSeason:
+    """What a simulation needs of a group, without any database objects
+
+    Team lists are ordered by team id, the last tie-break of the standings.
+    Fixtures are (home index, away index, home score, away score, share of
+    the match left to play): in-progress matches keep their current score.
+    """
+    group_name: str
+    team_ids: list
+    team_names: list
+    positions: list  # Current position of each team, 1-based
+    matches_played: list
+    points: list
+    goal_difference: list
+    goals_for: list
+    goals_against: list
+    fixtures: list = field(default_factory=list)
+
+
+@dataclass
+class TeamOdds:
+    team_id: int
+    name: str
+    position: int  # In the current table
+    points: int
+    expected_points: float
+    positions: list  # Probability of finishing in each position, 1st first
+    qualify: float  # Probability of finishing in the qualifying places
+
+
+@dataclass
+class GroupOdds:
+    group_name: str
+    simulations: int
+    qualifying: int
+    fixtures_left: int
+    teams: list = field(default_factory=list)  # In the current table's order
+
+    def as_dict(self):
+        return asdict(self)
+
+    def with_qualifying(self, qualifying):
+        """A copy with the chances of finishing in the first qualifying places"""
+        return replace(self, qualifying=qualifying, teams=[
+            replace(team, qualify=round(sum(team.positions[:qualifying]), 4)) for team in self.teams
+        ])
+
+
+def _goal_tables(rates):
+    """Inverse CDF of the Poisson distribution of each rate, as a table per rate
+
+    Drawing a goal count is then one lookup of a uniform 16-bit integer, much
+    cheaper than sampling the distribution. Tails rarer than 1 / GOAL_QUANTILES
+    are cut off.
+    """
+    most = int(rates.max(initial=0) + 12 * np.sqrt(rates.max(initial=0)) + 12)
+    pmf = np.empty((len(rates), most + 1))
+    pmf[:, 0] = np.exp(-rates)
+    for goals in range(1, most + 1):
+        pmf[:, goals] = pmf[:, goals - 1] * rates / goals
+    # Quantile u draws the first count whose CDF is above (u + 0.5) / GOAL_QUANTILES
+    below = np.clip(np.ceil(np.cumsum(pmf, axis=1) * GOAL_QUANTILES - 0.5), 0, GOAL_QUANTILES).astype(np.int64)
+    below[:, -1] = GOAL_QUANTILES
+    widths = np.diff(below, axis=1, prepend=0)
+    return np.stack([np.repeat(np.arange(most + 1, dtype=np.float32), width) for width in widths])
+
+
+def _play(season, tables, size, rng):
+    """Play the remaining fixtures size times: final (points, goal difference, goals for)
+
+    Results are fixtures x simulations arrays; team totals are their
+    products with the fixtures' home and away incidence matrices.
+    """
+    fixtures = len(season.fixtures)
+    home_tables, away_tables = tables
+    draws = rng.integers(0, GOAL_QUANTILES, (2, fixtures, size), dtype=np.uint16)
+    home_goals = np.empty((fixtures, size), dtype=np.float32)
+    away_goals = np.empty((fixtures, size), dtype=np.float32)
+    for i, (_, _, home_score, away_score, _) in enumerate(season.fixtures):
+        np.add(home_tables[i].take(draws[0, i]), home_score, out=home_goals[i])
+        np.add(away_tables[i].take(draws[1, i]), away_score, out=away_goals[i])
+
+    home = np.zeros((len(season.team_ids), fixtures), dtype=np.float32)
+    away = np.zeros_like(home)
+    for i, (home_index, away_index, *_) in enumerate(season.fixtures):
+        home[home_index, i] = 1
+        away[away_index, i] = 1
+
+    difference = home_goals - away_goals
+    drawn = difference == 0
+    home_points = np.where(difference > 0, np.float32(3), drawn.astype(np.float32))
+    away_points = np.where(difference < 0, np.float32(3), drawn.astype(np.float32))
+    # Exact: float32 holds every integer these sums can reach
+    points = home @ home_points + away @ away_points
+    goal_difference = (home - away) @ difference
+    goals_for = home @ home_goals + away @ away_goals
+
+    def final(base, change):
+        return np.asarray(base, dtype=np.int64)[:, None] + change.astype(np.int64)
+
+    return (final(season.points, points), final(season.goal_difference, goal_difference),
+            final(season.goals_for, goals_for))
+
+
+def _finishing_positions(points, goal_difference, goals_for):
+    """0-based position of each team in each simulated table (teams x simulations)
+
+    Counts the teams ahead: those with a higher key, and those with the same
+    key but a lower id, as the standings query orders them.
+    """
+    key = (points << _POINTS_SHIFT) + ((goal_difference + _DIFFERENCE_OFFSET) << _DIFFERENCE_SHIFT) + goals_for
+    positions = np.zeros(key.shape, dtype=np.int64)
+    for team in range(len(key)):
+        ahead = key[team] > key
+        ahead[team + 1:] |= key[team] == key[team + 1:]
+        positions += ahead
+    return positions
+
+
+def simulate_group(season, model=ScoreModel(), simulations=DEFAULT_SIMULATIONS,
+                   qualifying=DEFAULT_QUALIFYING, seed=None):
+    """Get the GroupOdds of season after simulating its remaining fixtures"""
+    teams = len(season.team_ids)
+    rng = np.random.default_rng(seed)
+    counts = np.zeros((teams, teams), dtype=np.int64)
+    total_points = np.zeros(teams, dtype=np.int64)
+    # Nothing left to play: every simulation would end the same
+    runs = simulations if season.fixtures else 1
+    tables = tuple(map(_goal_tables, model.rates(season))) if season.fixtures else ((), ())
+
+    done = 0
+    while done < runs:
+        size = min(BATCH_SIZE, runs - done)
+        points, goal_difference, goals_for = _play(season, tables, size, rng)
+        positions = _finishing_positions(points, goal_difference, goals_for)
+        cells = (np.arange(teams)[:, None] * teams + positions).ravel()
+        counts += np.bincount(cells, minlength=teams * teams).reshape(teams, teams)
+        total_points += points.sum(axis=1)
+        done += size
+
+    probabilities = counts / runs
+    odds = GroupOdds(season.group_name, simulations, qualifying, len(season.fixtures))
+    for team in sorted(range(teams), key=lambda index: season.positions[index]):
+        odds.teams.append(TeamOdds(
+            team_id=season.team_ids[team],
+            name=season.team_names[team],
+            position=season.positions[team],
+            points=season.points[team],
+            expected_points=round(float(total_points[team]) / runs, 2),
+            positions=[round(float(p), 4) for p in probabilities[team]],
+            qualify=round(float(probabilities[team, :qualifying].sum()), 4)
+        ))
+    return odds
+
+
+def _simulate_job(job):
+    return simulate_group(*job)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def start_simulation_pool(workers):
+    """Start the worker processes that simulate groups; called once per web worker
+
+    Workers are spawned, not forked: a gevent web worker holds patched
+    threads, the live listener and open database connections, none of which
+    a child may inherit. Spawned children only import this module's
+    dependencies and run NumPy code on what they are sent. One job is run
+    at once so the children are up before the first request needs them.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None and workers > 0:
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _executor.submit(len, ()).result()
+    return _executor
+
+
+def stop_simulation_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def simulation_workers(config):
+    """Processes of the pool of each web worker: SIMULATION_WORKERS, or one per CPU; 0 disables it"""
+    configured = config.get('SIMULATION_WORKERS')
+    if configured in (None, ''):
+        return os.cpu_count() or 1
+    return max(0, int(configured))
+
+
+def simulate_groups(seasons, model=ScoreModel(), simulations=DEFAULT_SIMULATIONS,
+                    qualifying=DEFAULT_QUALIFYING, seed=None, in_process=False):
+    """Simulate each group, in parallel in the pool if one was started; returns their GroupOdds
+
+    With a pool, even a single group is sent to it: under gevent, simulating
+    in the web worker would stall every other request it serves meanwhile.
+    Without one (development server, scripts), groups run in this process.
+    """
+    if not 1 <= simulations <= MAX_SIMULATIONS:
+        raise InvalidSimulation(f'simulations must be between 1 and {MAX_SIMULATIONS}')
+    if qualifying < 0:
+        raise InvalidSimulation('qualify must not be negative')
+    if isinstance(seed, int) and seed < 0:
+        raise InvalidSimulation('seed must not be negative')
+    streams = np.random.SeedSequence(seed).spawn(len(seasons))
+    jobs = [(season, model, simulations, qualifying, stream) for season, stream in zip(seasons, streams)]
+    executor = None if in_process else _executor
+    if executor is not None and any(season.fixtures for season in seasons):
+        try:
+            return list(executor.map(_simulate_job, jobs))
+        except BrokenProcessPool:
+            # A child died (killed, out of memory): run in process until the worker restarts
+            stop_simulation_pool()
+    return [_simulate_job(job) for job in jobs]
+
+
+def load_group_seasons(tournament_id):
+    """Get the GroupSeason of every group of a tournament with teams
+
+    Starts from the persisted standings, as the group tables do, and adds
+    the scheduled and in-progress matches played between teams of the same
+    group.
+    """
+    from .live import MATCH_MINUTES, match_minute
+    from .match import Match
+    from .standings import get_tournament_standings
+
+    standings = get_tournament_standings(tournament_id)
+    seasons = {}
+    index = {}
+    for group_name, rows in standings.by_group.items():
+        if not rows:
+            continue
+        positions = {row.id: position for position, row in enumerate(rows, 1)}
+        ordered = sorted(rows, key=lambda row: row.id)
+        seasons[group_name] = GroupSeason(
+            group_name=group_name,
+            team_ids=[row.id for row in ordered],
+            team_names=[row.name for row in ordered],
+            positions=[positions[row.id] for row in ordered],
+            matches_played=[row.matches_played for row in ordered],
+            points=[row.points for row in ordered],
+            goal_difference=[row.goal_difference for row in ordered],
+            goals_for=[row.goals_for for row in ordered],
+            goals_against=[row.goals_against for row in ordered]
+        )
+        for team_index, row in enumerate(ordered):
+            index[row.id] = (group_name, team_index)
+
+    matches = db.session.execute(
+        select(Match.home_team_id, Match.away_team_id, Match.home_score, Match.away_score,
+               Match.status, Match.date)
+        .where(Match.tournament_id == tournament_id, Match.status.in_(REMAINING_STATUSES))
+        .order_by(Match.id)
+    ).all()
+    for match in matches:
+        home, away = index.get(match.home_team_id), index.get(match.away_team_id)
+        if home is None or away is None or home[0] != away[0]:
+            continue
+        if match.status == 'in_progress':
+            left = (MATCH_MINUTES - (match_minute(match) or 0)) / MATCH_MINUTES
+            scores = (match.home_score or 0, match.away_score or 0)
+        else:
+            left, scores = 1.0, (0, 0)
+        seasons[home[0]].fixtures.append((home[1], away[1], *scores, left))
+    return list(seasons.values())
+
+
+# Odds of recent (tournament, data version, parameters), shared by the requests of a worker
+ODDS_CACHE_SIZE = 64
+_odds_cache = OrderedDict()
+_odds_cache_lock = threading.Lock()
+
+
+def get_qualification_odds(tournament_id, model=ScoreModel(), simulations=DEFAULT_SIMULATIONS,
+                           qualifying=DEFAULT_QUALIFYING, seed=None):
+    """Get {group name: GroupOdds} of a tournament
+
+    Without a seed, the tournament's data version seeds the simulations, so
+    the same data always gives the same odds, and they are simulated once
+    per worker until the data changes; qualifying is applied afterwards.
+    """
+    from .data_version import get_request_data_version
+
+    if qualifying < 0:
+        raise InvalidSimulation('qualify must not be negative')
+    version = get_request_data_version(tournament_id)[0]
+    key = (tournament_id, version, model, simulations, seed)
+    with _odds_cache_lock:
+        odds = _odds_cache.get(key)
+        if odds is not None:
+            _odds_cache.move_to_end(key)
+    if odds is None:
+        seasons = load_group_seasons(tournament_id)
+        odds = simulate_groups(seasons, model, simulations, DEFAULT_QUALIFYING,
+                               [tournament_id, version] if seed is None else seed)
+        with _odds_cache_lock:
+            _odds_cache[key] = odds
+            while len(_odds_cache) > ODDS_CACHE_SIZE:
+                _odds_cache.popitem(last=False)
+    return {group.group_name: group.with_qualifying(qualifying) for group in odds}
@@ -0,0 +1,198 @@
+"""
+Single-flight coalescing of expensive computations
+
+When many requests need the same result at once (spectators refreshing
+after a goal), one of them computes it and the others wait and share it:
+threads of a worker wait on the call in flight, other workers wait on a
+lock file in the configured directory and read the result the first one
+left there. A caller that waits longer than the timeout computes on its own.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # No lock files on Windows: coalesce within the process only
+    fcntl = None
+
+DEFAULT_TIMEOUT_SECONDS = 10.0
+LOCK_POLL_SECONDS = 0.02
+# Result files only serve workers waiting on the same computation
+RESULT_TTL_SECONDS = 300
+PRUNE_EVERY_WRITES = 100
+
+# Set by configure_single_flight(); without a directory only threads of a worker coalesce
+_directory = None
+_timeout = DEFAULT_TIMEOUT_SECONDS
+_flights = {}
+
+
+def configure_single_flight(directory=None, timeout=DEFAULT_TIMEOUT_SECONDS):
+    """Set the lock/result directory shared by the workers and the wait timeout"""
+    global _directory, _timeout
+    _directory = directory or None
+    _timeout = float(timeout)
+    if _directory:
+        os.makedirs(_directory, exist_ok=True)
+
+
+class _Call:
+    """A computation in flight in this worker"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+class SingleFlight:
+    """Runs one computation per (key, version) at a time, shared by its concurrent callers"""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.computed = 0
+        self.coalesced = 0  # Served by a computation of another thread
+        self.shared = 0  # Served by the result file of another worker
+        self.timeouts = 0
+
+    def run(self, key, compute, version=None):
+        """Get compute()'s result for key at version, computed once for concurrent callers
+
+        Only bytes results (with a version) are passed to other workers;
+        callers computing anything else check for themselves inside
+        compute() whether the work is still needed.
+        """
+        call_key = (key, version)
+        with self._lock:
+            call = self._calls.get(call_key)
+            leader = call is None
+            if leader:
+                call = self._calls[call_key] = _Call()
+
+        if not leader:
+            if call.done.wait(_timeout):
+                if not call.failed:
+                    self._count('coalesced')
+                    return call.result
+            else:
+                self._count('timeouts')
+            return compute()
+
+        try:
+            call.result = self._run_locked(key, version, compute)
+            return call.result
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(call_key, None)
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'computed': self.computed,
+                'coalesced': self.coalesced,
+                'shared': self.shared,
+                'timeouts': self.timeouts,
+                'in_flight': len(self._calls)
+            }
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _path(self, *parts, suffix):
+        digest = hashlib.sha1(repr((self.name, *parts)).encode()).hexdigest()[:24]
+        return os.path.join(_directory, f'{self.name}-{digest}{suffix}')
+
+    def _run_locked(self, key, version, compute):
+        """Compute while holding the key's lock file, unless another worker left the result"""
+        if _directory is None or fcntl is None:
+            self._count('computed')
+            return compute()
+
+        # One lock file per key (not per version), so their number stays bounded
+        result_path = self._path(key, version, suffix='.out') if version is not None else None
+        with open(self._path(key, suffix='.lock'), 'a') as lock_file:
+            locked = self._acquire(lock_file)
+            try:
+                if result_path is not None:
+                    result = self._read(result_path)
+                    if result is not None:
+                        self._count('shared')
+                        return result
+                self._count('computed')
+                result = compute()
+                if result_path is not None and isinstance(result, bytes):
+                    self._write(result_path, result)
+                return result
+            finally:
+                if locked:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _acquire(self, lock_file):
+        """Wait for the lock file without blocking the event loop; False after the timeout"""
+        deadline = time.monotonic() + _timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    self._count('timeouts')
+                    return False
+                time.sleep(LOCK_POLL_SECONDS)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, 'rb') as result_file:
+                return result_file.read()
+        except OSError:
+            return None
+
+    def _write(self, path, result):
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=_directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as temp:
+                temp.write(result)
+            os.replace(temp_path, path)
+        except OSError:
+            return
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY_WRITES == 0
+        if prune:
+            self._prune_results()
+
+    def _prune_results(self):
+        expired = time.time() - RESULT_TTL_SECONDS
+        try:
+            for entry in os.scandir(_directory):
+                if entry.name.startswith(self.name + '-') and entry.name.endswith('.out') \
+                        and entry.stat().st_mtime < expired:
+                    os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def single_flight(name):
+    """Get the SingleFlight registered under name, creating it once"""
+    flight = _flights.get(name)
+    if flight is None:
+        flight = _flights.setdefault(name, SingleFlight(name))
+    return flight
+
+
+def single_flight_stats():
+    """Counters of every SingleFlight of this worker"""
+    return {name: flight.stats() for name, flight in sorted(_flights.items())}
@@ -0,0 +1,231 @@
+from dataclasses import dataclass
+from flask import g, has_request_context
+from sqlalchemy import case, event, func, select, union_all
+from sqlalchemy.orm import Session
+from . import db
+from .single_flight import single_flight
+
+standings_flight = single_flight('standings')
+
+
+@dataclass(frozen=True, slots=True)
+class StandingRow:
+    """One line of a standings table, with the attributes the templates use"""
+    team: object
+    id: int
+    name: str
+    group_name: str
+    matches_played: int
+    wins: int
+    draws: int
+    losses: int
+    goals_for: int
+    goals_against: int
+    goal_difference: int
+    points: int
+    clean_sheets: int = 0
+
+
+def empty_stats():
+    """Get a zeroed statistics dict for teams without completed matches"""
+    return {
+        'matches_played': 0,
+        'wins': 0,
+        'draws': 0,
+        'losses': 0,
+        'goals_for': 0,
+        'goals_against': 0,
+        'goal_difference': 0,
+        'points': 0,
+        'clean_sheets': 0
+    }
+
+
+def _team_results(tournament_id, team_ids=None):
+    """Completed matches seen from both the home and the away team's perspective"""
+    from .match import Match
+
+    perspectives = []
+    for team_col, for_col, against_col in (
+        (Match.home_team_id, Match.home_score, Match.away_score),
+        (Match.away_team_id, Match.away_score, Match.home_score),
+    ):
+        perspective = select(
+            team_col.label('team_id'),
+            func.coalesce(for_col, 0).label('goals_for'),
+            func.coalesce(against_col, 0).label('goals_against')
+        ).where(Match.status == 'completed')
+        if tournament_id is not None:
+            perspective = perspective.where(Match.tournament_id == tournament_id)
+        if team_ids is not None:
+            perspective = perspective.where(team_col.in_(team_ids))
+        perspectives.append(perspective)
+
+    return union_all(*perspectives).subquery('team_results')
+
+
+def aggregate_team_stats(tournament_id, team_ids=None):
+    """Get statistics for every team of a tournament with a single grouped query
+
+    Returns a dict of team_id -> stats dict. Teams that have not completed any
+    match are not present in the result; use empty_stats() for them.
+    """
+    results = _team_results(tournament_id, team_ids)
+    goals_for = results.c.goals_for
+    goals_against = results.c.goals_against
+
+    query = select(
+        results.c.team_id,
+        func.count().label('matches_played'),
+        func.sum(case((goals_for > goals_against, 1), else_=0)).label('wins'),
+        func.sum(case((goals_for == goals_against, 1), else_=0)).label('draws'),
+        func.sum(case((goals_for < goals_against, 1), else_=0)).label('losses'),
+        func.sum(goals_for).label('goals_for'),
+        func.sum(goals_against).label('goals_against'),
+        func.sum(case((goals_against == 0, 1), else_=0)).label('clean_sheets')
+    ).group_by(results.c.team_id)
+
+    stats = {}
+    for row in db.session.execute(query):
+        wins, draws = int(row.wins), int(row.draws)
+        scored, conceded = int(row.goals_for), int(row.goals_against)
+        stats[row.team_id] = {
+            'matches_played': int(row.matches_played),
+            'wins': wins,
+            'draws': draws,
+            'losses': int(row.losses),
+            'goals_for': scored,
+            'goals_against': conceded,
+            'goal_difference': scored - conceded,
+            'points': (wins * 3) + draws,
+            'clean_sheets': int(row.clean_sheets)
+        }
+    return stats
+
+
+class TournamentStandings:
+    """Overall and per-group standings of a tournament
+
+    Reads the persisted team_standings rows (joined with their teams) in one
+    ordered query, so the number of queries stays fixed regardless of teams
+    or matches. Missing or stale rows trigger a rebuild of the tournament.
+    """
+
+    def __init__(self, tournament_id):
+        from .group import Group
+
+        self.tournament_id = tournament_id
+        groups = Group.query.filter_by(tournament_id=tournament_id).order_by(Group.id).all()
+        rows = self._load_rows(tournament_id)
+        if self._stale(rows):
+            # Concurrent requests wait for one rebuild instead of racing it
+            standings_flight.run(tournament_id, lambda: self._repair(tournament_id))
+            rows = self._load_rows(tournament_id)
+
+        group_names = {group.id: group.name for group in groups}
+        self.overall = []
+        self.by_group = {group.name: [] for group in groups}
+
+        # Rows come back already sorted, so both tables keep that order
+        for team, team_standing in rows:
+            group_name = group_names.get(team_standing.group_id)
+            standing = StandingRow(
+                team=team,
+                id=team.id,
+                name=team.name,
+                group_name=group_name,
+                **team_standing.as_stats()
+            )
+            self.overall.append(standing)
+            if group_name is not None:
+                self.by_group[group_name].append(standing)
+
+    @staticmethod
+    def _stale(rows):
+        return any(standing is None or standing.group_id != team.group_id for team, standing in rows)
+
+    @classmethod
+    def _repair(cls, tournament_id):
+        """Rebuild the tournament's rows and commit without expiring loaded objects
+
+        Rows are checked again first: another worker may have rebuilt them
+        while this one waited for the lock.
+        """
+        from .team_standing import rebuild_standings
+
+        if not cls._stale(cls._load_rows(tournament_id)):
+            return
+        session = db.session()
+        expire_on_commit = session.expire_on_commit
+        session.expire_on_commit = False
+        try:
+            rebuild_standings(tournament_id)
+            session.commit()
+        finally:
+            session.expire_on_commit = expire_on_commit
+
+    @staticmethod
+    def _load_rows(tournament_id):
+        """Get (team, standing) pairs ordered by points, goal difference, goals scored"""
+        from .team import Team
+        from .team_standing import TeamStanding
+
+        return db.session.query(Team, TeamStanding).outerjoin(
+            TeamStanding,
+            (TeamStanding.team_id == Team.id) & (TeamStanding.tournament_id == Team.tournament_id)
+        ).filter(
+            Team.tournament_id == tournament_id
+        ).order_by(
+            TeamStanding.points.desc(),
+            TeamStanding.goal_difference.desc(),
+            TeamStanding.goals_for.desc(),
+            Team.id
+        ).all()
+
+    def for_group(self, group_name):
+        """Get standings for a specific group"""
+        return self.by_group.get(group_name, [])
+
+
+def _request_cache():
+    """Get the per-request standings cache, or None outside of a request"""
+    if not has_request_context():
+        return None
+    if '_standings_cache' not in g:
+        g._standings_cache = {}
+    return g._standings_cache
+
+
+def get_tournament_standings(tournament_id):
+    """Get the standings of a tournament, computed at most once per request"""
+    cache = _request_cache()
+    if cache is None:
+        return TournamentStandings(tournament_id)
+    standings = cache.get(tournament_id)
+    if standings is None:
+        standings = cache[tournament_id] = TournamentStandings(tournament_id)
+    return standings
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_flushed_standings(session, flush_context):
+    """Drop cached standings of tournaments whose matches, teams or groups were written"""
+    cache = _request_cache()
+    if not cache:
+        return
+    from .match import Match
+    from .team import Team
+    from .group import Group
+    from .team_standing import TeamStanding
+
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Match, Team, Group, TeamStanding)):
+            cache.pop(obj.tournament_id, None)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _invalidate_rolled_back_standings(session, previous_transaction):
+    """Standings computed inside a rolled back transaction may be wrong"""
+    cache = _request_cache()
+    if cache:
+        cache.clear()
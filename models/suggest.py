@@ -0,0 +1,336 @@
+"""
+In-process autocomplete of tournament, team and player names
+
+Each worker keeps a compact index of the names in search_documents: a
+sorted list of distinct words for prefix lookups (bisect) and word ->
+entries postings, each kept in rank order (tournaments, then teams, then
+players; shorter names first) so a query stops after the first k hits of
+a word. Mistyped words are found by walking the sorted words for the
+variants one edit away from what was typed.
+
+The index is built on first use and then kept current incrementally: the
+'search' data version moves whenever documents change, and the index reads
+only the documents added since it last looked (a renamed row gets a new
+document id). Ids are handed out at insert, not at commit: on PostgreSQL a
+transaction may commit after one holding a higher id, so each sync reads
+again the last MAX_IN_FLIGHT_DOCUMENTS ids before the highest it holds.
+Deleted rows are dropped on the rare syncs where fewer documents exist than
+the index holds.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+
+from sqlalchemy import func, select
+from . import db
+from .data_version import get_site_version
+from .search import PLAYER, SEARCH_SCOPE, TEAM, TOURNAMENT, SearchDocument
+
+SUGGEST_KINDS = (TOURNAMENT, TEAM, PLAYER)
+DEFAULT_SUGGESTIONS = 8
+MAX_SUGGESTIONS = 20
+# The data version is checked at most this often per worker
+SYNC_INTERVAL_SECONDS = 1.0
+# Bounds on the work of one query, whatever was typed
+MAX_PREFIX_WORDS = 64
+MAX_CANDIDATES = 600
+# More new documents than this at once are loaded with a full build
+MAX_INCREMENTAL_CHANGES = 1000
+# Ids read again on each sync, for transactions that commit out of id order
+MAX_IN_FLIGHT_DOCUMENTS = 1000
+# Rebuild instead of skipping removed entries once they are this share of the index
+MAX_REMOVED_RATIO = 0.25
+
+_KIND_CODES = {kind: code for code, kind in enumerate(SUGGEST_KINDS)}
+_REMOVED = 255
+_WORD = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Lowercase words without accents: 'São Paulo' -> ['sao', 'paulo']"""
+    text = (text or '').lower()
+    if not text.isascii():
+        decomposed = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return _WORD.findall(text)
+
+
+@dataclass
+class Suggestion:
+    kind: str
+    id: int
+    name: str
+    team_id: int  # Of players: their page is the team's
+
+
+class SuggestIndex:
+    """Names by word prefix and by mistyped word, for one worker"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.version = None
+        self.checked_at = 0.0
+        self.build_seconds = None
+
+    def _reset(self):
+        self._names = []  # Display name per entry
+        self._keys = []  # ' word word ...' per entry: prefix checks of the other query words
+        self._ranks = array('L')  # Kind and name length per entry, lower is better
+        self._kinds = array('B')  # Kind code per entry, _REMOVED once gone
+        self._ids = array('L')
+        self._team_ids = array('L')
+        self._documents = array('L')  # search_documents id per entry
+        self._entries = {}  # kind code << 32 | entity id -> entry
+        self._postings = {}  # word -> array of entries in rank order
+        self._words = []  # Sorted distinct words
+        self._removed = 0
+        self.max_document_id = 0
+
+    def __len__(self):
+        return len(self._names) - self._removed
+
+    def _append(self, document_id, kind, entity_id, team_id, name):
+        """Add an entry; returns it and its distinct words"""
+        code = _KIND_CODES[kind]
+        self._remove(code, entity_id)
+        words = list(dict.fromkeys(normalize(name)))
+        entry = len(self._names)
+        self._names.append(name)
+        self._keys.append(' ' + ' '.join(words))
+        self._ranks.append(code << 16 | min(len(name), 0xFFFF))
+        self._kinds.append(code)
+        self._ids.append(entity_id)
+        self._team_ids.append(team_id or 0)
+        self._documents.append(document_id)
+        self._entries[code << 32 | entity_id] = entry
+        self.max_document_id = max(self.max_document_id, document_id)
+        return entry, words
+
+    def add(self, document_id, kind, entity_id, team_id, name):
+        """Index a document, replacing the entry of the same row if there is one"""
+        with self._lock:
+            entry, words = self._append(document_id, kind, entity_id, team_id, name)
+            for word in words:
+                postings = self._postings.get(word)
+                if postings is None:
+                    self._postings[word] = array('L', [entry])
+                    insort(self._words, word)
+                else:
+                    insort(postings, entry, key=self._ranks.__getitem__)
+
+    def remove(self, kind, entity_id):
+        with self._lock:
+            self._remove(_KIND_CODES[kind], entity_id)
+
+    def _remove(self, code, entity_id):
+        entry = self._entries.pop(code << 32 | entity_id, None)
+        if entry is not None:
+            # Left in the postings and skipped when read; rebuilds compact them
+            self._kinds[entry] = _REMOVED
+            self._removed += 1
+
+    def suggest(self, query, limit=DEFAULT_SUGGESTIONS):
+        """Top names for query: exact words first, then prefixes, then mistyped words
+
+        Every word of the query must start a word of the name; the last one
+        may be mistyped by one edit.
+        """
+        terms = list(dict.fromkeys(normalize(query)))
+        if not terms:
+            return []
+        last = terms[-1]
+        found = {}  # entry -> (tier, rank)
+        budget = [MAX_CANDIDATES]
+
+        def collect(words, tier, others):
+            keys, kinds, ranks = self._keys, self._kinds, self._ranks
+            for word in words:
+                taken = 0
+                postings = self._postings[word][:budget[0]]
+                scanned = len(postings)
+                for position, entry in enumerate(postings):
+                    if entry in found or kinds[entry] == _REMOVED:
+                        continue
+                    key = keys[entry]
+                    if others and not all(term in key for term in others):
+                        continue
+                    # Of the rarest word: exact if the last word is whole in the name
+                    found[entry] = (tier if tier is not None else (' ' + last + ' ') not in key + ' ', ranks[entry])
+                    taken += 1
+                    # Postings are in rank order: the rest of this word cannot beat these
+                    if taken >= limit:
+                        scanned = position + 1
+                        break
+                budget[0] -= scanned
+
+        with self._lock:
+            # Words followed by a space are usually complete: the rarest
+            # indexed word of the query has the fewest entries to check
+            exact = [term for term in terms if term in self._postings]
+            if len(terms) > 1 and exact:
+                driver = min(exact, key=lambda term: len(self._postings[term]))
+                collect([driver], None, [' ' + term for term in terms if term != driver])
+            others = [' ' + term for term in terms[:-1]]
+            if len(found) < limit and last in self._postings:
+                collect([last], 0, others)
+            if len(found) < limit:
+                collect(self._prefixed(last), 1, others)
+            if len(found) < limit and len(last) >= 3:
+                collect(self._mistyped(last), 2, others)
+            best = sorted(found, key=found.__getitem__)[:limit]
+            return [
+                Suggestion(SUGGEST_KINDS[self._kinds[entry]], self._ids[entry], self._names[entry],
+                           self._team_ids[entry] or None)
+                for entry in best
+            ]
+
+    def _prefixed(self, prefix, limit=MAX_PREFIX_WORDS):
+        """Words starting with prefix (other than prefix itself), shortest first"""
+        start = bisect_left(self._words, prefix)
+        words = []
+        for word in self._words[start:start + limit * 4]:
+            if not word.startswith(prefix):
+                break
+            if word != prefix:
+                words.append(word)
+        words.sort(key=len)
+        return words[:limit]
+
+    def _mistyped(self, term):
+        """Words one edit away from term, or starting one edit away from it
+
+        Walks the sorted words like a trie: an edit at position i needs
+        term[:i] to start some word, and only the letters that follow that
+        prefix in some word are tried there.
+        """
+        words, count = self._words, len(self._words)
+        variants = set()
+        for i in range(len(term) + 1):
+            prefix, rest = term[:i], term[i:]
+            start = bisect_left(words, prefix)
+            if start == count or not words[start].startswith(prefix):
+                break
+            if rest:
+                variants.add(prefix + rest[1:])
+            if len(rest) > 1:
+                variants.add(prefix + rest[1] + rest[0] + rest[2:])
+            if not prefix:
+                # First letters are rarely mistyped: only dropped or swapped ones are tried
+                continue
+            # The letters that follow prefix, one bisect per distinct letter
+            while start < count and words[start].startswith(prefix):
+                if len(words[start]) == i:
+                    start += 1
+                    continue
+                letter = words[start][i]
+                if rest:
+                    variants.add(prefix + letter + rest[1:])
+                variants.add(prefix + letter + rest)
+                start = bisect_left(words, prefix + chr(ord(letter) + 1), start)
+        variants.discard(term)
+
+        found = []
+        for variant in variants:
+            if variant in self._postings:
+                found.append(variant)
+            else:
+                start = bisect_left(words, variant)
+                if start < count and words[start].startswith(variant):
+                    found.append(words[start])
+        found.sort(key=len)
+        return found[:MAX_PREFIX_WORDS]
+
+    def build(self, version):
+        """Load every document from the database"""
+        started = time.perf_counter()
+        rows = db.session.execute(
+            select(SearchDocument.id, SearchDocument.kind, SearchDocument.entity_id,
+                   SearchDocument.team_id, SearchDocument.title)
+            .where(SearchDocument.kind.in_(SUGGEST_KINDS))
+            .order_by(SearchDocument.id)
+            .execution_options(yield_per=5000)
+        )
+        with self._lock:
+            self._reset()
+            postings = {}
+            for row in rows:
+                entry, words = self._append(*row)
+                for word in words:
+                    postings.setdefault(word, []).append(entry)
+            # Sorted once here instead of on every insert
+            rank = self._ranks.__getitem__
+            self._postings = {word: array('L', sorted(entries, key=rank)) for word, entries in postings.items()}
+            self._words = sorted(self._postings)
+            self.version = version
+        self.build_seconds = time.perf_counter() - started
+
+    def sync(self):
+        """Bring the index up to date with the documents, building it on first use"""
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_at < SYNC_INTERVAL_SECONDS:
+            return
+        with self._lock:
+            if self.version is not None and now - self.checked_at < SYNC_INTERVAL_SECONDS:
+                return
+            self.checked_at = now
+            version, _ = get_site_version(SEARCH_SCOPE)
+            if self.version is None or self._removed > MAX_REMOVED_RATIO * len(self._names):
+                self.build(version)
+            elif version != self.version:
+                self._apply_changes(version)
+
+    def _apply_changes(self, version):
+        rows = db.session.execute(
+            select(SearchDocument.id, SearchDocument.kind, SearchDocument.entity_id,
+                   SearchDocument.team_id, SearchDocument.title)
+            .where(SearchDocument.kind.in_(SUGGEST_KINDS),
+                   SearchDocument.id > self.max_document_id - MAX_IN_FLIGHT_DOCUMENTS)
+            .order_by(SearchDocument.id)
+            .limit(MAX_IN_FLIGHT_DOCUMENTS + MAX_INCREMENTAL_CHANGES + 1)
+        ).all()
+        if len(rows) > MAX_IN_FLIGHT_DOCUMENTS + MAX_INCREMENTAL_CHANGES:
+            # A rebuild of the search documents: faster to load them all at once
+            self.build(version)
+            return
+        for row in rows:
+            entry = self._entries.get(_KIND_CODES[row.kind] << 32 | row.entity_id)
+            # Already indexed, or replaced since by a newer document
+            if entry is None or self._documents[entry] < row.id:
+                self.add(*row)
+        current = db.session.execute(
+            select(func.count()).select_from(SearchDocument).where(SearchDocument.kind.in_(SUGGEST_KINDS))
+        ).scalar()
+        if current < len(self):
+            # Some rows were deleted: drop the entries whose document is gone
+            live = set(db.session.execute(
+                select(SearchDocument.id).where(SearchDocument.kind.in_(SUGGEST_KINDS))
+            ).scalars())
+            for key, entry in list(self._entries.items()):
+                if self._documents[entry] not in live:
+                    self._remove(key >> 32, key & 0xFFFFFFFF)
+        self.version = version
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self),
+                'removed': self._removed,
+                'words': len(self._words),
+                'version': self.version,
+                'build_seconds': round(self.build_seconds, 3) if self.build_seconds is not None else None
+            }
+
+
+suggest_index = SuggestIndex()
+
+
+def suggest(query, limit=DEFAULT_SUGGESTIONS):
+    """Top names matching what has been typed so far"""
+    suggest_index.sync()
+    return suggest_index.suggest(query, max(1, min(limit, MAX_SUGGESTIONS)))
@@ -3,6 +3,14 @@ from datetime import datetime
 
 class Team(db.Model):
     __tablename__ = 'teams'
+    __table_args__ = (
+        # Group fixture generation: filter_by(tournament_id, group_id)
+        db.Index('ix_teams_tournament_group', 'tournament_id', 'group_id'),
+        # Knockout pages: filter_by(tournament_id, qualified_for_knockout)
+        db.Index('ix_teams_tournament_qualified', 'tournament_id', 'qualified_for_knockout'),
+        # Loading the teams of groups: selectinload(Group.teams), WHERE group_id IN (...)
+        db.Index('ix_teams_group_id', 'group_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -38,49 +46,11 @@ class Team(db.Model):
     
     def get_stats(self):
         """Get team statistics for the tournament"""
-        matches_played = wins = draws = losses = 0
-        goals_for = goals_against = 0
-        
-        # Count home matches
-        for match in self.home_matches_rel:
-            if match.status == 'completed':
-                matches_played += 1
-                goals_for += match.home_score
-                goals_against += match.away_score
-                if match.home_score > match.away_score:
-                    wins += 1
-                elif match.home_score == match.away_score:
-                    draws += 1
-                else:
-                    losses += 1
-        
-        # Count away matches
-        for match in self.away_matches_rel:
-            if match.status == 'completed':
-                matches_played += 1
-                goals_for += match.away_score
-                goals_against += match.home_score
-                if match.away_score > match.home_score:
-                    wins += 1
-                elif match.away_score == match.home_score:
-                    draws += 1
-                else:
-                    losses += 1
-        
-        points = (wins * 3) + draws
-        goal_difference = goals_for - goals_against
-        
-        return {
-            'matches_played': matches_played,
-            'wins': wins,
-            'draws': draws,
-            'losses': losses,
-            'goals_for': goals_for,
-            'goals_against': goals_against,
-            'goal_difference': goal_difference,
-            'points': points
-        }
+        from .team_standing import get_team_stats
+        return get_team_stats(self.tournament_id, self.id)
     
     def get_top_scorers(self, limit=5):
         """Get top scoring players for the team"""
-        return Player.query.filter_by(team_id=self.id).order_by(Player.goals_scored.desc()).limit(limit).all()
+        from .player import Player
+        return Player.query.filter(Player.team_id == self.id, Player.goals_scored > 0)\
+            .order_by(Player.goals_scored.desc()).limit(limit).all()
@@ -0,0 +1,194 @@
+from . import db
+from datetime import datetime
+from sqlalchemy import delete, insert, update
+from .change_log import STANDING, log_changes
+
+STAT_COLUMNS = (
+    'matches_played', 'wins', 'draws', 'losses',
+    'goals_for', 'goals_against', 'goal_difference', 'points', 'clean_sheets'
+)
+
+class TeamStanding(db.Model):
+    """Persisted standings row, one per team per tournament
+
+    Kept up to date with deltas by every route that writes a match result, so
+    reading a table is a single ordered SELECT instead of a scan of matches.
+    """
+    __tablename__ = 'team_standings'
+    __table_args__ = (
+        db.UniqueConstraint('tournament_id', 'team_id', name='uq_team_standings_tournament_team'),
+        db.Index('ix_team_standings_table', 'tournament_id', 'points', 'goal_difference', 'goals_for'),
+        db.Index('ix_team_standings_group_table', 'group_id', 'points', 'goal_difference', 'goals_for'),
+        # Clean sheet leaderboards (see models.leaderboard)
+        db.Index('ix_team_standings_tournament_clean_sheets', 'tournament_id', 'clean_sheets'),
+        db.Index('ix_team_standings_clean_sheets', 'clean_sheets'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.id'), nullable=False)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
+    group_id = db.Column(db.Integer, db.ForeignKey('groups.id'), nullable=True)
+
+    matches_played = db.Column(db.Integer, nullable=False, default=0)
+    wins = db.Column(db.Integer, nullable=False, default=0)
+    draws = db.Column(db.Integer, nullable=False, default=0)
+    losses = db.Column(db.Integer, nullable=False, default=0)
+    goals_for = db.Column(db.Integer, nullable=False, default=0)
+    goals_against = db.Column(db.Integer, nullable=False, default=0)
+    goal_difference = db.Column(db.Integer, nullable=False, default=0)
+    points = db.Column(db.Integer, nullable=False, default=0)
+    clean_sheets = db.Column(db.Integer, nullable=False, default=0)  # Completed matches without conceding
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    team = db.relationship('Team', backref=db.backref('standing_rows', lazy=True, cascade='all, delete-orphan'))
+
+    def __repr__(self):
+        return f'<TeamStanding team={self.team_id} tournament={self.tournament_id} pts={self.points}>'
+
+    def as_stats(self):
+        """Get the row as a statistics dict, like Team.get_stats()"""
+        return {column: getattr(self, column) for column in STAT_COLUMNS}
+
+
+def match_result(match):
+    """Get what a match currently contributes to the standings, or None
+
+    Take the snapshot before changing a match and again after, then pass both
+    to apply_result_change().
+    """
+    if match is None or match.status != 'completed':
+        return None
+    if not match.home_team_id or not match.away_team_id:
+        return None
+    return (
+        match.tournament_id,
+        match.home_team_id,
+        match.away_team_id,
+        match.home_score or 0,
+        match.away_score or 0
+    )
+
+
+def _result_deltas(result, sign, deltas):
+    """Accumulate the per-team contribution of a result, multiplied by sign"""
+    tournament_id, home_team_id, away_team_id, home_score, away_score = result
+    for team_id, scored, conceded in (
+        (home_team_id, home_score, away_score),
+        (away_team_id, away_score, home_score),
+    ):
+        won, drawn, lost = scored > conceded, scored == conceded, scored < conceded
+        team_delta = deltas.setdefault((tournament_id, team_id), dict.fromkeys(STAT_COLUMNS, 0))
+        team_delta['matches_played'] += sign
+        team_delta['wins'] += sign * won
+        team_delta['draws'] += sign * drawn
+        team_delta['losses'] += sign * lost
+        team_delta['goals_for'] += sign * scored
+        team_delta['goals_against'] += sign * conceded
+        team_delta['goal_difference'] += sign * (scored - conceded)
+        team_delta['points'] += sign * (3 * won + drawn)
+        team_delta['clean_sheets'] += sign * (conceded == 0)
+
+
+def apply_result_change(before, after):
+    """Update the persisted standings with the difference between two results
+
+    Runs inside the caller's session transaction, so it is committed (or
+    rolled back) together with the match change itself.
+    """
+    if before == after:
+        return
+
+    deltas = {}
+    if before is not None:
+        _result_deltas(before, -1, deltas)
+    if after is not None:
+        _result_deltas(after, 1, deltas)
+
+    updated = []
+    for (tournament_id, team_id), team_delta in deltas.items():
+        changes = {
+            column: getattr(TeamStanding, column) + value
+            for column, value in team_delta.items() if value
+        }
+        if not changes:
+            continue
+        changes['updated_at'] = datetime.utcnow()
+        # A missing row is not an error: reads rebuild the tournament from matches
+        db.session.execute(
+            update(TeamStanding)
+            .where(TeamStanding.tournament_id == tournament_id, TeamStanding.team_id == team_id)
+            .values(**changes)
+            .execution_options(synchronize_session=False)
+        )
+        updated.append((tournament_id, team_id))
+    log_changes(STANDING, updated)
+
+
+def create_standing_row(team):
+    """Add an empty standings row for a newly created team"""
+    db.session.add(TeamStanding(
+        tournament_id=team.tournament_id,
+        team_id=team.id,
+        group_id=team.group_id,
+        **dict.fromkeys(STAT_COLUMNS, 0)
+    ))
+
+
+def set_standing_group(team_ids, group_id):
+    """Keep the group reference of the standings rows in sync with the teams"""
+    if not team_ids:
+        return
+    updated = db.session.execute(
+        update(TeamStanding)
+        .where(TeamStanding.team_id.in_(team_ids))
+        .values(group_id=group_id)
+        .returning(TeamStanding.tournament_id, TeamStanding.team_id)
+        .execution_options(synchronize_session=False)
+    )
+    log_changes(STANDING, updated.all())
+
+
+def rebuild_standings(tournament_id=None):
+    """Recompute the persisted standings from the matches table
+
+    Rebuilds one tournament, or every tournament when tournament_id is None.
+    Returns the number of rows written. The caller commits.
+    """
+    from .team import Team
+    from .standings import aggregate_team_stats, empty_stats
+
+    teams = db.session.query(Team.id, Team.tournament_id, Team.group_id)
+    clear = delete(TeamStanding)
+    if tournament_id is not None:
+        teams = teams.filter(Team.tournament_id == tournament_id)
+        clear = clear.where(TeamStanding.tournament_id == tournament_id)
+
+    stats = aggregate_team_stats(tournament_id)
+    rows = [
+        {
+            'tournament_id': team.tournament_id,
+            'team_id': team.id,
+            'group_id': team.group_id,
+            'updated_at': datetime.utcnow(),
+            **(stats.get(team.id) or empty_stats())
+        }
+        for team in teams
+    ]
+
+    db.session.execute(clear.execution_options(synchronize_session=False))
+    if rows:
+        db.session.execute(insert(TeamStanding), rows)
+        log_changes(STANDING, [(row['tournament_id'], row['team_id']) for row in rows])
+    return len(rows)
+
+
+def get_team_stats(tournament_id, team_id):
+    """Get the persisted statistics of a single team"""
+    from .standings import aggregate_team_stats, empty_stats
+
+    standing = TeamStanding.query.filter_by(tournament_id=tournament_id, team_id=team_id).first()
+    if standing is not None:
+        return standing.as_stats()
+    return aggregate_team_stats(tournament_id, team_ids=[team_id]).get(team_id) or empty_stats()
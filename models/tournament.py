@@ -3,6 +3,11 @@ from datetime import datetime
 
 class Tournament(db.Model):
     __tablename__ = 'tournaments'
+    __table_args__ = (
+        db.Index('ix_tournaments_status', 'status'),
+        # Tournament list ordered by start date; id breaks ties for keyset pages
+        db.Index('ix_tournaments_start_date_id', 'start_date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -24,73 +29,23 @@ class Tournament(db.Model):
     def __repr__(self):
         return f'<Tournament {self.name}>'
     
+    def compute_standings(self):
+        """Get overall and per-group standings, memoized for the current request"""
+        from .standings import get_tournament_standings
+        return get_tournament_standings(self.id)
+    
     def get_standings(self):
         """Get tournament standings sorted by points, goal difference, goals scored"""
-        standings = []
-        for team in self.teams:
-            stats = team.get_stats()
-            # Create a standings object that matches what the template expects
-            standing = type('Standing', (), {
-                'id': team.id,
-                'name': team.name,
-                'points': stats['points'],
-                'matches_played': stats['matches_played'],
-                'wins': stats['wins'],
-                'draws': stats['draws'],
-                'losses': stats['losses'],
-                'goals_for': stats['goals_for'],
-                'goals_against': stats['goals_against'],
-                'goal_difference': stats['goal_difference']
-            })()
-            standings.append(standing)
-        
-        # Sort by points (desc), then goal difference (desc), then goals scored (desc)
-        standings.sort(key=lambda x: (x.points, x.goal_difference, x.goals_for), reverse=True)
-        return standings
+        return self.compute_standings().overall
     
     def get_group_standings(self, group_name):
         """Get standings for a specific group"""
-        standings = []
-        # Find the group
-        group = next((g for g in self.groups if g.name == group_name), None)
-        if not group:
-            return []
-        
-        for team in group.teams:
-            stats = team.get_stats()
-            # Create a standings object that matches what the template expects
-            standing = type('Standing', (), {
-                'team': team,
-                'points': stats['points'],
-                'matches_played': stats['matches_played'],
-                'wins': stats['wins'],
-                'draws': stats['draws'],
-                'losses': stats['losses'],
-                'goals_for': stats['goals_for'],
-                'goals_against': stats['goals_against'],
-                'goal_difference': stats['goal_difference']
-            })()
-            standings.append(standing)
-        
-        # Sort by points (desc), then goal difference (desc), then goals scored (desc)
-        standings.sort(key=lambda x: (x.points, x.goal_difference, x.goals_for), reverse=True)
-        return standings
+        return self.compute_standings().for_group(group_name)
     
     def get_team_stats(self, team_id):
         """Get stats for a specific team"""
-        team = next((t for t in self.teams if t.id == team_id), None)
-        if team:
-            return team.get_stats()
-        return {
-            'points': 0,
-            'matches_played': 0,
-            'wins': 0,
-            'draws': 0,
-            'losses': 0,
-            'goals_for': 0,
-            'goals_against': 0,
-            'goal_difference': 0
-        }
+        from .team_standing import get_team_stats
+        return get_team_stats(self.id, team_id)
     
     def get_knockout_matches(self, stage):
         """Get knockout matches for a specific stage"""
@@ -98,12 +53,8 @@ class Tournament(db.Model):
     
     def get_knockout_bracket(self):
         """Get the complete knockout bracket structure"""
-        bracket = type('Bracket', (), {
-            'quarter_finals': [match for match in self.matches if match.stage == 'quarter_final'],
-            'semi_finals': [match for match in self.matches if match.stage == 'semi_final'],
-            'final': [match for match in self.matches if match.stage == 'final']
-        })()
-        return bracket
+        from .bracket import Bracket
+        return Bracket.from_matches(self.matches)
     
     def can_start_knockout(self):
         """Check if tournament can start knockout stage"""
@@ -118,9 +69,10 @@ class Tournament(db.Model):
         """Get teams manually selected for knockout stage"""
         # This will be stored in a new field or calculated from matches
         # For now, return teams that have knockout matches
+        from .bracket import KNOCKOUT_STAGES
         knockout_teams = set()
         for match in self.matches:
-            if match.stage in ['quarter_final', 'semi_final', 'final']:
+            if match.stage in KNOCKOUT_STAGES:
                 if match.home_team:
                     knockout_teams.add(match.home_team)
                 if match.away_team:
@@ -0,0 +1,265 @@
+"""
+Rendered page cache and conditional GETs for the read pages
+
+A page is stored under the 'data' version of its tournament (bumped in the
+same transaction as any write touching the tournament) and the admin flag,
+so a write makes every cached page of that tournament unreachable without
+looking for them. Checking a page costs one keyed SELECT of the version.
+
+Entries live in a bounded in-process LRU. With PAGE_CACHE_DIR set they are
+also written there, so the other gunicorn workers (and workers restarted
+after max-requests) serve them without rendering again.
+
+The same version is the ETag (and its timestamp the Last-Modified) of
+every read page, so browsers revalidating an unchanged page get a 304
+before any of its queries run.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request, session
+from werkzeug.http import is_resource_modified
+
+from models import db
+from models.data_version import ALL_TOURNAMENTS, get_request_data_version
+from models.single_flight import single_flight
+
+# Disk entries are pruned back under the limit every this many writes
+PRUNE_EVERY_WRITES = 200
+
+# Browsers (and shared caches, for public pages) keep pages but revalidate them on every use
+PUBLIC_CACHE_CONTROL = 'public, no-cache'
+ADMIN_CACHE_CONTROL = 'private, no-cache'
+
+page_flight = single_flight('page')
+
+
+class PageCache:
+    """Rendered bodies by key: in-process LRU bounded in bytes, optional shared directory"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, directory=None, max_files=5000, generation=''):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_files = max_files
+        # Part of every key: entries rendered by other code are never served
+        self.generation = generation
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Get a cached body, or None (counted as a miss)"""
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return body
+        body = self._read_file(key)
+        with self._lock:
+            if body is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._remember(key, body)
+        return body
+
+    def put(self, key, body):
+        self._remember(key, body)
+        self._write_file(key, body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': round((self.hits + self.disk_hits) / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'directory': self.directory
+            }
+
+    def _remember(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr((self.generation, key)).encode()).hexdigest()
+        return os.path.join(self.directory, digest + '.html')
+
+    def _read_file(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), 'rb') as cached:
+                return cached.read()
+        except OSError:
+            return None
+
+    def _write_file(self, key, body):
+        if not self.directory:
+            return
+        try:
+            # Write aside and rename, so other workers never read half a page
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as temp:
+                temp.write(body)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            return
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY_WRITES == 0
+        if prune:
+            self._prune_files()
+
+    def _prune_files(self):
+        """Remove the oldest files beyond max_files (stale versions age out first)"""
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.html')]
+            if len(entries) <= self.max_files:
+                return
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:len(entries) - self.max_files]:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+page_cache = PageCache()
+
+
+def _code_generation(app):
+    """Fingerprint of the templates and code that render the pages"""
+    digest = hashlib.sha1()
+    for folder in ('templates', 'routes', 'models'):
+        for root, _, files in sorted(os.walk(os.path.join(app.root_path, folder))):
+            for name in sorted(files):
+                if name.endswith(('.html', '.py')):
+                    stat = os.stat(os.path.join(root, name))
+                    digest.update(f'{root}/{name}:{stat.st_mtime_ns}:{stat.st_size};'.encode())
+    return digest.hexdigest()[:12]
+
+
+def init_page_cache(app):
+    """Size the cache and set up the optional shared tier from app config"""
+    page_cache.max_bytes = int(app.config.get('PAGE_CACHE_MAX_MB', 32)) * 1024 * 1024
+    page_cache.directory = app.config.get('PAGE_CACHE_DIR') or None
+    page_cache.generation = _code_generation(app)
+    page_cache.clear()
+    if page_cache.directory:
+        os.makedirs(page_cache.directory, exist_ok=True)
+
+
+def cached_page(view):
+    """Serve a GET view from the page cache
+
+    The view's tournament_id argument picks the data version in the key;
+    views without one (site-wide pages) use the sum of every tournament's.
+    Only 200 HTML responses are stored. Concurrent misses of a page wait
+    for one render and share it.
+    """
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        # Flashed messages are rendered into the page and belong to one visitor
+        if request.method != 'GET' or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        tournament_id = kwargs.get('tournament_id', ALL_TOURNAMENTS)
+        page = (request.full_path, bool(session.get('is_admin')))
+        version, _ = get_request_data_version(tournament_id)
+        key = (*page, version)
+        body = page_cache.get(key)
+        if body is not None:
+            response = Response(body, mimetype='text/html')
+            response.headers['X-Page-Cache'] = 'hit'
+            return response
+
+        # Hand the connection back while nothing is loaded, so callers waiting
+        # for the render below do not starve it of pooled connections
+        if not db.session.identity_map and not db.session.new:
+            db.session.close()
+
+        rendered = {}
+        def render():
+            response = rendered['response'] = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.mimetype != 'text/html':
+                return None
+            body = response.get_data()
+            page_cache.put(key, body)
+            return body
+
+        # Keyed by code generation too: result files may outlive a deploy
+        body = page_flight.run((page_cache.generation, *page), render, version)
+        response = rendered.get('response')
+        if response is not None:
+            response.headers['X-Page-Cache'] = 'miss'
+        elif body is not None:
+            response = Response(body, mimetype='text/html')
+            response.headers['X-Page-Cache'] = 'coalesced'
+        else:
+            # The render we waited for was not cacheable (an error page)
+            response = make_response(view(*args, **kwargs))
+        return response
+    return decorated_function
+
+
+def conditional_get(view):
+    """Answer If-None-Match/If-Modified-Since with a 304 before running a GET view
+
+    The validator is the data version of the view's tournament_id (or the
+    site-wide one), with the admin flag and code generation: one SELECT. Sets ETag, Last-Modified and Cache-Control on 200 responses.
+    """
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        # A pending flash message must be rendered, not revalidated away
+        if request.method != 'GET' or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        is_admin = bool(session.get('is_admin'))
+        tournament_id = kwargs.get('tournament_id', ALL_TOURNAMENTS)
+        version, updated_at = get_request_data_version(tournament_id)
+        etag = f"{page_cache.generation}-{tournament_id}-{version}-{'a' if is_admin else 'p'}"
+
+        if not is_resource_modified(request.environ, etag=etag, last_modified=updated_at):
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        # Weak: the validator names the data shown, not the exact bytes
+        response.set_etag(etag, weak=True)
+        if updated_at is not None:
+            response.last_modified = updated_at
+        response.headers['Cache-Control'] = ADMIN_CACHE_CONTROL if is_admin else PUBLIC_CACHE_CONTROL
+        return response
+    return decorated_function
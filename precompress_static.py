@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Precompress the static assets (build step)
+
+Writes .br and .gz files next to the CSS, JS and other text assets, served
+instead of the originals to browsers that accept them. Run it after every
+deploy of changed assets; stale ones are ignored until it runs again.
+
+Usage: python precompress_static.py [static_folder]
+"""
+
+import os
+import sys
+
+from compression import brotli
+from static_assets import precompress
+
+def main():
+    """Precompress the given folder, or the app's static folder"""
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+    written = precompress(folder)
+    for path in written:
+        original = path.rsplit('.', 1)[0]
+        print(f"  {os.path.relpath(path, folder)}: {os.path.getsize(original)} -> {os.path.getsize(path)} bytes")
+    if brotli is None:
+        print("⚠️  brotli is not installed: wrote gzip files only")
+    print(f"✅ Wrote {len(written)} precompressed files in {folder}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Rebuild the player_stats table and the players' totals from the match event log
+
+Usage: python rebuild_player_stats.py [tournament_id]
+"""
+
+import sys
+
+from app import app
+from models import db
+from models.player_stat import rebuild_player_stats
+
+def main():
+    """Rebuild one tournament, or all of them when no id is given"""
+    tournament_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    
+    with app.app_context():
+        rows = rebuild_player_stats(tournament_id)
+        db.session.commit()
+        
+        if tournament_id is None:
+            print(f"✅ Rebuilt player statistics for all tournaments ({rows} players)")
+        else:
+            print(f"✅ Rebuilt player statistics for tournament {tournament_id} ({rows} players)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+"""
+Rebuild the full-text search index from the tournaments, teams, players and matches tables
+
+Usage: python rebuild_search_index.py
+"""
+
+from app import app
+from models.search import rebuild_search_index
+
+def main():
+    """Rebuild every search document and the backend's index over them"""
+    with app.app_context():
+        documents = rebuild_search_index()
+        print(f"✅ Rebuilt search index ({documents} documents)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Rebuild the persisted team_standings table from the matches table
+
+Usage: python rebuild_standings.py [tournament_id]
+"""
+
+import sys
+
+from app import app
+from models import db
+from models.team_standing import rebuild_standings
+
+def main():
+    """Rebuild one tournament, or all of them when no id is given"""
+    tournament_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    
+    with app.app_context():
+        rows = rebuild_standings(tournament_id)
+        db.session.commit()
+        
+        if tournament_id is None:
+            print(f"✅ Rebuilt standings for all tournaments ({rows} teams)")
+        else:
+            print(f"✅ Rebuilt standings for tournament {tournament_id} ({rows} teams)")
+
+if __name__ == '__main__':
+    main()
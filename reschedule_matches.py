@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Reassign date and field of every pending (scheduled) match so that no team
+or field is double-booked and teams get their minimum rest
+
+Usage: python reschedule_matches.py [tournament_id] [--fields "Campo 1,Campo 2"] [--rest HOURS]
+"""
+
+import sys
+
+from app import app
+from models import db
+from models.scheduling import ScheduleConfig, reschedule_pending_matches
+
+def main():
+    """Reschedule one tournament, or all of them when no id is given"""
+    args = sys.argv[1:]
+    options = {}
+    for flag, key in (('--fields', 'fields'), ('--rest', 'min_rest_hours')):
+        if flag in args:
+            position = args.index(flag)
+            options[key] = args[position + 1]
+            del args[position:position + 2]
+    tournament_id = int(args[0]) if args else None
+    
+    with app.app_context():
+        result = reschedule_pending_matches(tournament_id, ScheduleConfig.from_request_data(options))
+        db.session.commit()
+        
+        print(f"✅ Rescheduled {len(result.assignments)} matches ({result.relocations} moved by local search)")
+        if result.last_kickoff:
+            print(f"  Last kick-off: {result.last_kickoff:%Y-%m-%d %H:%M}")
+        if result.unscheduled:
+            print(f"  ⚠️ {len(result.unscheduled)} matches did not fit and kept their previous date")
+
+if __name__ == '__main__':
+    main()
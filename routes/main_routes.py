@@ -1,10 +1,16 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, abort, url_for
 from models import Tournament, Team, Match, Player, db
-from sqlalchemy import or_
+from sqlalchemy.orm import selectinload
+from models.search import DEFAULT_RESULTS_PER_PAGE, TEAM, TOURNAMENT, VENUE, search as search_index
+from models.suggest import DEFAULT_SUGGESTIONS, suggest
+from models.leaderboard import DEFAULT_LEADERBOARD_SIZE, get_leaderboards, leaderboards_payload
+from models.pagination import InvalidListingArgs, ListingArgs, keyset_page, tournament_summary
+from page_cache import cached_page, conditional_get
 
 main_bp = Blueprint('main', __name__)
 
 @main_bp.route('/')
+@conditional_get
 def index():
     """Home page showing active tournaments and quick stats"""
     try:
@@ -22,24 +28,57 @@ def index():
                          matches=upcoming_matches)
 
 @main_bp.route('/tournaments')
+@conditional_get
 def tournaments():
-    """List all tournaments"""
-    tournaments = Tournament.query.order_by(Tournament.start_date.desc()).all()
-    return render_template('tournaments/list.html', tournaments=tournaments)
+    """List tournaments, newest first, one page at a time"""
+    try:
+        listing, page = _tournaments_page()
+    except InvalidListingArgs as e:
+        abort(400, str(e))
+    return render_template('tournaments/list.html', tournaments=page.items, page=page, listing=listing)
+
+@main_bp.route('/tournaments.json')
+@conditional_get
+def tournaments_json():
+    """Page of the tournament list as JSON; pass next_cursor back as ?cursor="""
+    try:
+        listing, page = _tournaments_page()
+    except InvalidListingArgs as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'tournaments': [tournament_summary(tournament) for tournament in page.items],
+        'next_cursor': page.next_cursor
+    })
+
+def _tournaments_page():
+    """Page of tournaments by (start_date, id) descending, with the request's filters"""
+    listing = ListingArgs.from_request_args(request.args)
+    query = listing.filter(Tournament.query, Tournament.start_date, Tournament.status)
+    page = keyset_page(query, Tournament.start_date, Tournament.id, listing.cursor, listing.limit,
+                       descending=True)
+    return listing, page
 
 @main_bp.route('/knockout')
+@conditional_get
 def knockout():
     """Knockout stage management"""
     # Get active tournaments with qualified teams
     tournaments = Tournament.query.filter_by(status='active').all()
     
-    # For each tournament, get qualified teams
+    # Get qualified teams of all those tournaments at once
+    qualified_by_tournament = {}
+    if tournaments:
+        qualified = Team.query.options(selectinload(Team.group)).filter(
+            Team.tournament_id.in_([t.id for t in tournaments]),
+            Team.qualified_for_knockout == True
+        ).order_by(Team.id).all()
+        for team in qualified:
+            qualified_by_tournament.setdefault(team.tournament_id, []).append(team)
+    
     tournament_data = []
     for tournament in tournaments:
-        qualified_teams = Team.query.filter_by(
-            tournament_id=tournament.id,
-            qualified_for_knockout=True
-        ).all()
+        qualified_teams = qualified_by_tournament.get(tournament.id, [])
         
         if qualified_teams:
             tournament_data.append({
@@ -52,43 +91,113 @@ def knockout():
 
 
 @main_bp.route('/statistics')
+@conditional_get
+@cached_page
 def statistics():
     """Show overall statistics"""
     total_tournaments = Tournament.query.count()
     total_players = Player.query.count()
     
-    # Top scorers
-    top_scorers = Player.query.order_by(Player.goals_scored.desc()).limit(10).all()
+    # Top scorers first, then the other boards: one index scan each
+    boards = get_leaderboards()
     
     # Recent matches
-    recent_matches = Match.query.filter_by(status='completed').order_by(Match.date.desc()).limit(10).all()
+    recent_matches = Match.query.options(
+        selectinload(Match.home_team),
+        selectinload(Match.away_team),
+        selectinload(Match.tournament)
+    ).filter_by(status='completed').order_by(Match.date.desc()).limit(10).all()
     
     return render_template('statistics.html',
                            total_tournaments=total_tournaments,
                            total_players=total_players,
-                           top_scorers=top_scorers,
+                           boards=boards,
                            recent_matches=recent_matches)
 
+@main_bp.route('/leaderboards')
+@conditional_get
+@cached_page
+def leaderboards():
+    """Site-wide leaderboards: goals, assists, clean sheets and cards"""
+    boards = get_leaderboards(limit=request.args.get('limit', DEFAULT_LEADERBOARD_SIZE, type=int))
+    return render_template('leaderboards/index.html', boards=boards, tournament=None)
+
+@main_bp.route('/leaderboards.json')
+@conditional_get
+def leaderboards_json():
+    """Site-wide leaderboards as JSON; ?metric= for a single one"""
+    payload, status = leaderboards_payload(request.args)
+    return jsonify(payload), status
+
 @main_bp.route('/search')
+@conditional_get
 def search():
-    """Search functionality"""
-    query = request.args.get('q', '')
+    """Ranked full-text search of tournaments, teams, players and venues"""
+    query = request.args.get('q', '').strip()
     if not query:
-        return render_template('search.html', results=None, query='')
+        return render_template('search.html', results=None, query='', kind=None)
     
-    # Search in tournaments
-    tournaments = Tournament.query.filter(
-        or_(Tournament.name.contains(query), Tournament.description.contains(query))
-    ).all()
-    
-    # Search in players
-    players = Player.query.filter(
-        or_(Player.first_name.contains(query), Player.last_name.contains(query), Player.nationality.contains(query))
-    ).all()
-    
-    results = {
-        'tournaments': tournaments,
-        'players': players
-    }
-    
-    return render_template('search.html', results=results, query=query)
+    results = search_index(query, kind=request.args.get('kind'), page=request.args.get('page', 1, type=int))
+    return render_template('search.html', results=results, query=query, kind=results.kind,
+                           result_url=_result_url)
+
+@main_bp.route('/search.json')
+@conditional_get
+def search_json():
+    """One page of search results as JSON: just what a results list needs"""
+    query = request.args.get('q', '').strip()
+    results = search_index(query, kind=request.args.get('kind'), page=request.args.get('page', 1, type=int),
+                           per_page=request.args.get('limit', DEFAULT_RESULTS_PER_PAGE, type=int))
+    return jsonify({
+        'success': True,
+        'query': query,
+        'page': results.page,
+        'has_more': results.has_more,
+        'results': [
+            {
+                'kind': result.kind,
+                'id': result.id,
+                'title': result.title,
+                'subtitle': result.subtitle,
+                'tournament': result.tournament_name,
+                'team': result.team_name,
+                'url': _result_url(result)
+            }
+            for result in results.results
+        ]
+    })
+
+@main_bp.route('/search/suggest')
+def search_suggest():
+    """Autocomplete: the top names starting with (or close to) what has been typed"""
+    query = request.args.get('q', '').strip()
+    suggestions = suggest(query, request.args.get('limit', DEFAULT_SUGGESTIONS, type=int)) if query else []
+    response = jsonify({
+        'success': True,
+        'query': query,
+        'suggestions': [
+            {
+                'kind': suggestion.kind,
+                'id': suggestion.id,
+                'name': suggestion.name,
+                'url': _suggestion_url(suggestion)
+            }
+            for suggestion in suggestions
+        ]
+    })
+    # Names change rarely; a keystroke repeated within a minute is answered by the browser
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+def _suggestion_url(suggestion):
+    if suggestion.kind == TOURNAMENT:
+        return url_for('tournament.view_tournament', tournament_id=suggestion.id)
+    if suggestion.kind == TEAM:
+        return url_for('team.view_team', team_id=suggestion.id)
+    return url_for('team.view_team', team_id=suggestion.team_id)
+
+def _result_url(result):
+    """Page a search result links to"""
+    if result.kind == TOURNAMENT or result.kind == VENUE:
+        return url_for('tournament.view_tournament', tournament_id=result.tournament_id)
+    return url_for('team.view_team', team_id=result.team_id)
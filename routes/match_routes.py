@@ -1,8 +1,18 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, Response, current_app, abort
 from functools import wraps
-from models import Match, Team, Tournament, Group, db
-from datetime import datetime, timedelta
-import itertools
+from models import Match, Team, Tournament, Group, Player, db
+from models.team_standing import match_result, apply_result_change
+from models.fixtures import generate_group_fixtures
+from models.scheduling import ScheduleConfig, reschedule_pending_matches
+from models.live import record_live_event, open_live_stream
+from models.match_event import (
+    ASSIST, GOAL, LINEUP, SUB_OFF, SUB_ON, InvalidMatchEvent, MatchEvent,
+    clear_match_events, get_match_events, record_match_events, remove_match_events
+)
+from models.pagination import InvalidListingArgs, ListingArgs, keyset_page, match_summary
+from datetime import datetime
+from sqlalchemy.orm import joinedload, selectinload
+from page_cache import conditional_get
 
 match_bp = Blueprint('match', __name__)
 
@@ -79,15 +89,24 @@ def new_match():
     return render_template('matches/new.html', tournaments=tournaments, teams=teams, selected_tournament_id=tournament_id)
 
 @match_bp.route('/match/<int:match_id>')
+@conditional_get
 def view_match(match_id):
     """View match details"""
-    match = Match.query.get_or_404(match_id)
+    match = Match.query.options(
+        joinedload(Match.home_team),
+        joinedload(Match.away_team),
+        joinedload(Match.tournament)
+    ).filter_by(id=match_id).first_or_404()
     return render_template('matches/view.html', match=match)
 
 @match_bp.route('/match/<int:match_id>/edit', methods=['GET', 'POST'])
 def edit_match(match_id):
     """Edit match"""
-    match = Match.query.get_or_404(match_id)
+    match = Match.query.options(
+        joinedload(Match.home_team),
+        joinedload(Match.away_team),
+        joinedload(Match.tournament)
+    ).filter_by(id=match_id).first_or_404()
     
     if request.method == 'POST':
         match.date = datetime.strptime(request.form['date'], '%Y-%m-%dT%H:%M')
@@ -107,6 +126,8 @@ def edit_match(match_id):
 def delete_match(match_id):
     """Delete match"""
     match = Match.query.get_or_404(match_id)
+    apply_result_change(match_result(match), None)
+    clear_match_events([match.id])
     db.session.delete(match)
     db.session.commit()
     
@@ -124,6 +145,8 @@ def delete_match(match_id):
 def update_score(match_id):
     """Update match score"""
     match = Match.query.get_or_404(match_id)
+    previous_result = match_result(match)
+    previous_state = (match.home_score, match.away_score, match.status)
     
     # Handle both form data and JSON requests
     if request.is_json:
@@ -162,6 +185,9 @@ def update_score(match_id):
     if field_number:
         match.field = field_number
     
+    apply_result_change(previous_result, match_result(match))
+    if (match.home_score, match.away_score, match.status) != previous_state:
+        record_live_event(match, 'score')
     db.session.commit()
     
     if request.is_json:
@@ -170,11 +196,115 @@ def update_score(match_id):
     flash('Match score updated successfully!', 'success')
     return redirect(url_for('match.view_match', match_id=match.id))
 
+@match_bp.route('/match/<int:match_id>/events')
+@conditional_get
+def match_events(match_id):
+    """Timeline of a match: line-ups, goals, assists, cards and substitutions"""
+    match = Match.query.get_or_404(match_id)
+    return jsonify({
+        'success': True,
+        'match_id': match.id,
+        'home_score': match.home_score,
+        'away_score': match.away_score,
+        'events': [match_event.as_dict() for match_event in get_match_events(match.id)]
+    })
+
+@match_bp.route('/match/<int:match_id>/events', methods=['POST'])
+@admin_required
+def add_match_events(match_id):
+    """Record events of a match and update the player statistics
+
+    kind is lineup (with player_ids), goal (optionally with
+    assist_player_id), assist, yellow_card, red_card or substitution (with
+    player_id coming on and player_out_id going off).
+    """
+    match = Match.query.get_or_404(match_id)
+    data = request.get_json() if request.is_json else request.form
+    
+    try:
+        entries = _event_entries(data)
+    except (InvalidMatchEvent, KeyError, ValueError, TypeError) as e:
+        message = str(e) if isinstance(e, InvalidMatchEvent) else 'Invalid event data!'
+        if request.is_json:
+            return jsonify({'success': False, 'message': message}), 400
+        flash(message, 'error')
+        return redirect(url_for('match.view_match', match_id=match.id))
+    
+    players = {player.id: player for player in Player.query.filter(Player.id.in_({entry[1] for entry in entries}))}
+    previous_result = match_result(match)
+    previous_score = (match.home_score, match.away_score)
+    try:
+        events = record_match_events(match, [(kind, players.get(player_id), minute) for kind, player_id, minute in entries])
+    except InvalidMatchEvent as e:
+        if request.is_json:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        flash(str(e), 'error')
+        return redirect(url_for('match.view_match', match_id=match.id))
+    
+    apply_result_change(previous_result, match_result(match))
+    if (match.home_score, match.away_score) != previous_score:
+        record_live_event(match, 'score')
+    db.session.commit()
+    
+    if request.is_json:
+        return jsonify({
+            'success': True,
+            'message': f'Recorded {len(events)} events!',
+            'events': [match_event.as_dict() for match_event in events],
+            'home_score': match.home_score,
+            'away_score': match.away_score
+        })
+    
+    flash(f'Recorded {len(events)} events!', 'success')
+    return redirect(url_for('match.view_match', match_id=match.id))
+
+def _event_entries(data):
+    """(kind, player_id, minute) entries of an event form or JSON body"""
+    kind = data.get('kind')
+    minute = int(data.get('minute') or 0)
+    if kind == LINEUP:
+        player_ids = data.getlist('player_ids') if hasattr(data, 'getlist') else data.get('player_ids') or []
+        if not player_ids:
+            raise InvalidMatchEvent('A line-up needs player_ids')
+        return [(LINEUP, int(player_id), 0) for player_id in player_ids]
+    player_id = int(data['player_id'])
+    if kind == 'substitution':
+        return [(SUB_ON, player_id, minute), (SUB_OFF, int(data['player_out_id']), minute)]
+    entries = [(kind, player_id, minute)]
+    if kind == GOAL and data.get('assist_player_id'):
+        entries.append((ASSIST, int(data['assist_player_id']), minute))
+    return entries
+
+@match_bp.route('/match/<int:match_id>/events/<int:event_id>/delete', methods=['POST'])
+@admin_required
+def delete_match_event(match_id, event_id):
+    """Remove a mistaken event, taking back its statistics (and goal)"""
+    match = Match.query.get_or_404(match_id)
+    match_event = MatchEvent.query.filter_by(id=event_id, match_id=match.id).first_or_404()
+    previous_result = match_result(match)
+    previous_score = (match.home_score, match.away_score)
+    
+    remove_match_events(match, [match_event])
+    apply_result_change(previous_result, match_result(match))
+    if (match.home_score, match.away_score) != previous_score:
+        record_live_event(match, 'score')
+    db.session.commit()
+    
+    if request.is_json:
+        return jsonify({'success': True, 'message': 'Event removed!', 'home_score': match.home_score,
+                        'away_score': match.away_score})
+    
+    flash('Event removed!', 'success')
+    return redirect(url_for('match.view_match', match_id=match.id))
+
 @match_bp.route('/match/<int:match_id>/start', methods=['POST'])
 def start_match(match_id):
     """Start a match"""
     match = Match.query.get_or_404(match_id)
+    previous_result = match_result(match)
     match.status = 'in_progress'
+    apply_result_change(previous_result, match_result(match))
+    record_live_event(match, 'started')
     db.session.commit()
     flash('Match started!', 'success')
     return redirect(url_for('match.view_match', match_id=match.id))
@@ -183,23 +313,77 @@ def start_match(match_id):
 def end_match(match_id):
     """End a match"""
     match = Match.query.get_or_404(match_id)
+    previous_result = match_result(match)
     match.status = 'completed'
+    apply_result_change(previous_result, match_result(match))
+    record_live_event(match, 'ended')
     db.session.commit()
     flash('Match ended!', 'success')
     return redirect(url_for('match.view_match', match_id=match.id))
 
 @match_bp.route('/schedule')
+@conditional_get
 def schedule():
-    """View match schedule"""
-    matches = Match.query.order_by(Match.date).all()
-    return render_template('matches/schedule.html', matches=matches)
+    """View match schedule, one page at a time"""
+    try:
+        listing, page = _schedule_page()
+    except InvalidListingArgs as e:
+        abort(400, str(e))
+    tournament = Tournament.query.get(listing.tournament_id) if listing.tournament_id else None
+    return render_template('matches/schedule.html', matches=page.items, page=page, listing=listing,
+                           tournament=tournament)
+
+@match_bp.route('/schedule.json')
+@conditional_get
+def schedule_json():
+    """Page of the match schedule as JSON; pass next_cursor back as ?cursor="""
+    try:
+        listing, page = _schedule_page()
+    except InvalidListingArgs as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'matches': [match_summary(match) for match in page.items],
+        'next_cursor': page.next_cursor
+    })
+
+def _schedule_page():
+    """Page of matches of every tournament by (date, id), with the request's filters"""
+    listing = ListingArgs.from_request_args(request.args)
+    query = Match.query.options(
+        selectinload(Match.home_team),
+        selectinload(Match.away_team),
+        selectinload(Match.tournament)
+    )
+    query = listing.filter(query, Match.date, Match.status, Match.tournament_id)
+    return listing, keyset_page(query, Match.date, Match.id, listing.cursor, listing.limit)
 
 @match_bp.route('/live')
+@conditional_get
 def live_matches():
     """View live matches"""
-    live_matches = Match.query.filter_by(status='in_progress').all()
+    live_matches = Match.query.options(
+        selectinload(Match.home_team),
+        selectinload(Match.away_team),
+        selectinload(Match.tournament)
+    ).filter_by(status='in_progress').all()
     return render_template('matches/live.html', matches=live_matches)
 
+@match_bp.route('/live/stream')
+def live_stream():
+    """Server-Sent Events stream of score, status and minute changes"""
+    tournament_id = request.args.get('tournament_id', type=int)
+    # EventSource resends the id of the last event it got when it reconnects
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get('last_event_id', type=int)
+    
+    stream = open_live_stream(current_app._get_current_object(), tournament_id, last_event_id)
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Don't let nginx-style proxies buffer the stream
+    })
+
 @match_bp.route('/tournament/<int:tournament_id>/generate-group-matches', methods=['POST'])
 @admin_required
 def generate_group_matches(tournament_id):
@@ -209,63 +393,46 @@ def generate_group_matches(tournament_id):
     # Get group_id from request
     if request.is_json:
         data = request.get_json()
-        group_id = int(data['group_id'])
     else:
-        group_id = int(request.form['group_id'])
+        data = request.form
+    group_id = int(data['group_id'])
+    # 1 = single round-robin, 2 = home and away
+    legs = 2 if str(data.get('legs', 1)) == '2' else 1
     
     group = Group.query.get_or_404(group_id)
     
-    # Get all teams in this group
-    teams = Team.query.filter_by(tournament_id=tournament_id, group_id=group_id).all()
+    try:
+        schedule_config = ScheduleConfig.from_request_data(data)
+    except ValueError:
+        if request.is_json:
+            return jsonify({'success': False, 'message': 'Invalid scheduling options!'})
+        flash('Invalid scheduling options!', 'error')
+        return redirect(url_for('tournament.view_tournament', tournament_id=tournament_id))
+    
+    # Every team plays every other team once per leg; fields and times come from the scheduler
+    result = generate_group_fixtures(tournament_id, group_ids=[group_id], legs=legs, schedule_config=schedule_config)
     
-    if len(teams) < 2:
+    if group.name in result.groups_too_small:
         if request.is_json:
             return jsonify({'success': False, 'message': 'Group must have at least 2 teams to generate matches!'})
         flash('Group must have at least 2 teams to generate matches!', 'error')
         return redirect(url_for('tournament.view_tournament', tournament_id=tournament_id))
     
-    # Check if matches already exist for this group
-    existing_matches = Match.query.filter_by(
-        tournament_id=tournament_id, 
-        group_name=group.name,
-        stage='group_stage'
-    ).count()
-    
-    if existing_matches > 0:
+    if group.name in result.groups_with_matches:
         if request.is_json:
             return jsonify({'success': False, 'message': f'Matches already exist for Group {group.name}! Delete existing matches first.'})
         flash(f'Matches already exist for Group {group.name}! Delete existing matches first.', 'error')
         return redirect(url_for('tournament.view_tournament', tournament_id=tournament_id))
     
-    # Generate all possible match combinations (each team plays every other team once)
-    matches_created = 0
-    base_date = datetime.now() + timedelta(days=1)  # Start matches tomorrow
-    base_time = 14  # Start at 2 PM
-    
-    for i, (home_team, away_team) in enumerate(itertools.combinations(teams, 2)):
-        # Calculate match date and time
-        match_date = base_date + timedelta(days=i // 2)  # 2 matches per day
-        match_time = base_time + (i % 2) * 2  # 2 PM and 4 PM
-        
-        match_datetime = match_date.replace(hour=match_time, minute=0, second=0, microsecond=0)
-        
-        # Create match
-        match = Match(
-            home_team_id=home_team.id,
-            away_team_id=away_team.id,
-            tournament_id=tournament_id,
-            date=match_datetime,
-            field=f"Campo {(i % 3) + 1}",  # Rotate between Campo 1, 2, 3
-            venue="Estádio Principal",
-            stage='group_stage',
-            group_name=group.name,
-            status='scheduled'
-        )
-        
-        db.session.add(match)
-        matches_created += 1
+    if result.unscheduled:
+        message = f'No free field or time slot for {result.unscheduled} matches. Add fields or slot times and try again.'
+        if request.is_json:
+            return jsonify({'success': False, 'message': message})
+        flash(message, 'error')
+        return redirect(url_for('tournament.view_tournament', tournament_id=tournament_id))
     
     db.session.commit()
+    matches_created = result.matches_created
     
     if request.is_json:
         return jsonify({
@@ -282,61 +449,33 @@ def generate_group_matches(tournament_id):
 def generate_all_group_matches(tournament_id):
     """Generate all matches for all groups in the tournament"""
     tournament = Tournament.query.get_or_404(tournament_id)
-    groups = Group.query.filter_by(tournament_id=tournament_id).all()
     
-    total_matches = 0
-    groups_processed = []
+    data = request.get_json(silent=True) or request.form
+    legs = 2 if str(data.get('legs', 1)) == '2' else 1
     
-    for group in groups:
-        # Get all teams in this group
-        teams = Team.query.filter_by(tournament_id=tournament_id, group_id=group.id).all()
-        
-        if len(teams) < 2:
-            continue  # Skip groups with less than 2 teams
-        
-        # Check if matches already exist for this group
-        existing_matches = Match.query.filter_by(
-            tournament_id=tournament_id, 
-            group_name=group.name,
-            stage='group_stage'
-        ).count()
-        
-        if existing_matches > 0:
-            continue  # Skip groups that already have matches
-        
-        # Generate matches for this group
-        group_matches = 0
-        base_date = datetime.now() + timedelta(days=1)
-        base_time = 14
-        
-        for i, (home_team, away_team) in enumerate(itertools.combinations(teams, 2)):
-            # Calculate match date and time
-            match_date = base_date + timedelta(days=(total_matches + i) // 4)  # 4 matches per day
-            match_time = base_time + ((total_matches + i) % 4) * 2  # 2 PM, 4 PM, 6 PM, 8 PM
-            
-            match_datetime = match_date.replace(hour=match_time, minute=0, second=0, microsecond=0)
-            
-            # Create match
-            match = Match(
-                home_team_id=home_team.id,
-                away_team_id=away_team.id,
-                tournament_id=tournament_id,
-                date=match_datetime,
-                field=f"Campo {((total_matches + i) % 3) + 1}",
-                venue="Estádio Principal",
-                stage='group_stage',
-                group_name=group.name,
-                status='scheduled'
-            )
-            
-            db.session.add(match)
-            group_matches += 1
-        
-        total_matches += group_matches
-        groups_processed.append(f"Group {group.name} ({group_matches} matches)")
+    try:
+        schedule_config = ScheduleConfig.from_request_data(data)
+    except ValueError:
+        if request.is_json:
+            return jsonify({'success': False, 'message': 'Invalid scheduling options!'})
+        flash('Invalid scheduling options!', 'error')
+        return redirect(url_for('tournament.view_tournament', tournament_id=tournament_id))
+    
+    # Groups with less than 2 teams or with existing matches are skipped
+    result = generate_group_fixtures(tournament_id, legs=legs, schedule_config=schedule_config)
+    
+    if result.unscheduled:
+        message = f'No free field or time slot for {result.unscheduled} matches. Add fields or slot times and try again.'
+        if request.is_json:
+            return jsonify({'success': False, 'message': message})
+        flash(message, 'error')
+        return redirect(url_for('tournament.view_tournament', tournament_id=tournament_id))
     
     db.session.commit()
     
+    total_matches = result.matches_created
+    groups_processed = [f"Group {name} ({count} matches)" for name, count in result.groups_processed]
+    
     if request.is_json:
         return jsonify({
             'success': True, 
@@ -348,7 +487,44 @@ def generate_all_group_matches(tournament_id):
     flash(f'Successfully generated {total_matches} matches for {len(groups_processed)} groups!', 'success')
     return redirect(url_for('tournament.view_tournament', tournament_id=tournament_id))
 
+@match_bp.route('/tournament/<int:tournament_id>/reschedule-matches', methods=['POST'])
+@admin_required
+def reschedule_matches(tournament_id):
+    """Reassign date and field of every pending match of the tournament"""
+    tournament = Tournament.query.get_or_404(tournament_id)
+    
+    data = request.get_json(silent=True) or request.form
+    try:
+        schedule_config = ScheduleConfig.from_request_data(data)
+    except ValueError:
+        if request.is_json:
+            return jsonify({'success': False, 'message': 'Invalid scheduling options!'})
+        flash('Invalid scheduling options!', 'error')
+        return redirect(url_for('tournament.view_tournament', tournament_id=tournament_id))
+    
+    # Started and completed matches, and other tournaments' matches, stay where they are
+    result = reschedule_pending_matches(tournament_id, schedule_config)
+    db.session.commit()
+    
+    rescheduled = len(result.assignments)
+    message = f'Rescheduled {rescheduled} pending matches!'
+    if result.unscheduled:
+        message += f' {len(result.unscheduled)} matches did not fit and kept their previous date.'
+    
+    if request.is_json:
+        return jsonify({
+            'success': True,
+            'message': message,
+            'matches_rescheduled': rescheduled,
+            'unscheduled': result.unscheduled,
+            'last_kickoff': result.last_kickoff.isoformat() if result.last_kickoff else None
+        })
+    
+    flash(message, 'warning' if result.unscheduled else 'success')
+    return redirect(url_for('tournament.view_tournament', tournament_id=tournament_id))
+
 @match_bp.route('/match/<int:match_id>/data')
+@conditional_get
 def get_match_data(match_id):
     """Get match data for editing"""
     match = Match.query.get_or_404(match_id)
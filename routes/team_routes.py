@@ -1,10 +1,18 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, abort
 from functools import wraps
 from models import Team, Player, Match, Tournament, Group, db
+from models.team_standing import create_standing_row, set_standing_group
+from models.leaderboard import ASSISTS, GOALS, get_leaderboards
+from models.pagination import InvalidListingArgs, ListingArgs, keyset_page, match_summary
 from datetime import datetime
+from sqlalchemy.orm import joinedload, selectinload
+from page_cache import conditional_get
 
 team_bp = Blueprint('team', __name__)
 
+# Players shown per board in the team leaders card
+TEAM_LEADERBOARD_SIZE = 5
+
 # Admin required decorator
 def admin_required(f):
     @wraps(f)
@@ -39,6 +47,8 @@ def new_team():
         )
         
         db.session.add(team)
+        db.session.flush()
+        create_standing_row(team)
         db.session.commit()
         
         flash('Team created successfully!', 'success')
@@ -53,12 +63,14 @@ def new_team():
     return render_template('teams/new.html', tournaments=tournaments, selected_tournament_id=tournament_id)
 
 @team_bp.route('/team/<int:team_id>')
+@conditional_get
 def view_team(team_id):
     """View team details"""
-    team = Team.query.get_or_404(team_id)
+    team = Team.query.options(joinedload(Team.tournament)).filter_by(id=team_id).first_or_404()
     players = Player.query.filter_by(team_id=team_id).order_by(Player.jersey_number).all()
     stats = team.get_stats()
-    return render_template('teams/view.html', team=team, players=players, stats=stats)
+    leaders = get_leaderboards(team_id=team.id, limit=TEAM_LEADERBOARD_SIZE, metrics=[GOALS, ASSISTS])
+    return render_template('teams/view.html', team=team, players=players, stats=stats, leaders=leaders)
 
 @team_bp.route('/team/<int:team_id>/edit', methods=['GET', 'POST'])
 def edit_team(team_id):
@@ -79,10 +91,16 @@ def edit_team(team_id):
 @admin_required
 def delete_team(team_id):
     """Delete team"""
-    team = Team.query.get_or_404(team_id)
+    team = Team.query.options(
+        selectinload(Team.players),
+        selectinload(Team.standing_rows)
+    ).filter_by(id=team_id).first_or_404()
     
     # Check if team has played matches
-    if team.home_matches or team.away_matches:
+    has_matches = Match.query.filter(
+        (Match.home_team_id == team_id) | (Match.away_team_id == team_id)
+    ).first() is not None
+    if has_matches:
         flash('Cannot delete team that has played matches!', 'error')
         return redirect(url_for('team.view_team', team_id=team.id))
     
@@ -95,6 +113,7 @@ def delete_team(team_id):
     return redirect(url_for('main.tournaments'))
 
 @team_bp.route('/team/<int:team_id>/players')
+@conditional_get
 def team_players(team_id):
     """View team players"""
     team = Team.query.get_or_404(team_id)
@@ -136,13 +155,44 @@ def add_player(team_id):
     return render_template('teams/add_player.html', team=team)
 
 @team_bp.route('/team/<int:team_id>/matches')
+@conditional_get
 def team_matches(team_id):
-    """View team matches"""
+    """View team matches, most recent first, one page at a time"""
     team = Team.query.get_or_404(team_id)
-    matches = Match.query.filter(
+    try:
+        listing, page = _team_matches_page(team_id)
+    except InvalidListingArgs as e:
+        abort(400, str(e))
+    return render_template('teams/matches.html', team=team, matches=page.items, page=page, listing=listing)
+
+@team_bp.route('/team/<int:team_id>/matches.json')
+@conditional_get
+def team_matches_json(team_id):
+    """Page of a team's matches as JSON; pass next_cursor back as ?cursor="""
+    Team.query.get_or_404(team_id)
+    try:
+        listing, page = _team_matches_page(team_id)
+    except InvalidListingArgs as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'matches': [match_summary(match) for match in page.items],
+        'next_cursor': page.next_cursor
+    })
+
+def _team_matches_page(team_id):
+    """Page of a team's matches by (date, id) descending, with the request's filters"""
+    listing = ListingArgs.from_request_args(request.args)
+    query = Match.query.options(
+        selectinload(Match.home_team),
+        selectinload(Match.away_team),
+        selectinload(Match.tournament)
+    ).filter(
         (Match.home_team_id == team_id) | (Match.away_team_id == team_id)
-    ).order_by(Match.date.desc()).all()
-    return render_template('teams/matches.html', team=team, matches=matches)
+    )
+    query = listing.filter(query, Match.date, Match.status)
+    page = keyset_page(query, Match.date, Match.id, listing.cursor, listing.limit, descending=True)
+    return listing, page
 
 @team_bp.route('/team/<int:team_id>/assign-group', methods=['POST'])
 @admin_required
@@ -155,6 +205,7 @@ def assign_team_to_group(team_id):
         if data['group_name'] is None:
             # Remove team from group
             team.group_id = None
+            set_standing_group([team.id], None)
             db.session.commit()
             return jsonify({'success': True, 'message': f'Team {team.name} removed from group'})
         else:
@@ -169,6 +220,7 @@ def assign_team_to_group(team_id):
             
             # Assign team to group
             team.group_id = group.id
+            set_standing_group([team.id], group.id)
             db.session.commit()
             return jsonify({'success': True, 'message': f'Team {team.name} assigned to Group {data["group_name"]}'})
     
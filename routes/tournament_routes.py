@@ -1,7 +1,22 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, abort, Response
 from functools import wraps
 from models import Tournament, Team, Match, Group, db
+from models.bracket import (
+    KNOCKOUT_STAGES, advance_knockout_result, assign_free_slot, generate_bracket, get_bracket_json, has_bracket
+)
+from models.change_log import DEFAULT_FEED_LIMIT, current_version, get_changes
+from models.fixtures import generate_league_fixtures
+from models.leaderboard import DEFAULT_LEADERBOARD_SIZE, get_leaderboards, leaderboards_payload
+from models.match_event import clear_match_events
+from models.player_stat import clear_tournament_stats
+from models.simulation import (
+    DEFAULT_QUALIFYING, DEFAULT_SIMULATIONS, InvalidSimulation, ScoreModel, get_qualification_odds
+)
+from models.standings import get_tournament_standings
+from models.team_standing import match_result, apply_result_change, set_standing_group
+from page_cache import cached_page, conditional_get
 from datetime import datetime
+from sqlalchemy.orm import selectinload
 
 tournament_bp = Blueprint('tournament', __name__)
 
@@ -57,18 +72,25 @@ def new_tournament():
     return render_template('tournaments/new.html')
 
 @tournament_bp.route('/tournament/<int:tournament_id>')
+@conditional_get
+@cached_page
 def view_tournament(tournament_id):
     """View tournament details"""
-    from models import Match
-    from sqlalchemy import func
-    tournament = Tournament.query.get_or_404(tournament_id)
-    
-    # Get matches ordered by date+time (datetime field contains both)
-    # Using COALESCE to put NULL dates at the end
-    ordered_matches = Match.query.filter_by(tournament_id=tournament_id)\
-        .order_by(func.coalesce(Match.date, datetime.max).asc())\
-        .all()
+    tournament = Tournament.query.options(
+        selectinload(Tournament.groups).selectinload(Group.teams),
+        selectinload(Tournament.teams).selectinload(Team.group),
+        selectinload(Tournament.matches).selectinload(Match.home_team),
+        selectinload(Tournament.matches).selectinload(Match.away_team)
+    ).filter_by(id=tournament_id).first_or_404()
+    
+    # Get matches ordered by date+time (datetime field contains both),
+    # with NULL dates at the end
+    ordered_matches = sorted(
+        tournament.matches,
+        key=lambda m: (m.date is None, m.date or datetime.max, m.id)
+    )
     
+    # Standings are memoized per request, so the template can ask the tournament again
     standings = tournament.get_standings()
     return render_template('tournaments/view.html', 
                          tournament=tournament, 
@@ -100,20 +122,48 @@ def edit_tournament(tournament_id):
 @admin_required
 def delete_tournament(tournament_id):
     """Delete tournament"""
-    tournament = Tournament.query.get_or_404(tournament_id)
+    # Load everything the delete cascades to up front
+    tournament = Tournament.query.options(
+        selectinload(Tournament.teams).selectinload(Team.players),
+        selectinload(Tournament.teams).selectinload(Team.standing_rows),
+        selectinload(Tournament.groups).selectinload(Group.teams),
+        selectinload(Tournament.matches)
+    ).filter_by(id=tournament_id).first_or_404()
+    # Event log and player statistics rows: bulk deletes, not cascades row by row
+    clear_tournament_stats(tournament.id)
     db.session.delete(tournament)
     db.session.commit()
     flash('Tournament deleted successfully!', 'success')
     return redirect(url_for('main.tournaments'))
 
 @tournament_bp.route('/tournament/<int:tournament_id>/standings')
+@conditional_get
+@cached_page
 def tournament_standings(tournament_id):
     """Show tournament standings"""
     tournament = Tournament.query.get_or_404(tournament_id)
     standings = tournament.get_standings()
     return render_template('tournaments/standings.html', tournament=tournament, standings=standings)
 
+@tournament_bp.route('/tournament/<int:tournament_id>/leaderboards')
+@conditional_get
+@cached_page
+def tournament_leaderboards(tournament_id):
+    """Leaderboards of the tournament: goals, assists, clean sheets and cards"""
+    tournament = Tournament.query.get_or_404(tournament_id)
+    boards = get_leaderboards(tournament_id, limit=request.args.get('limit', DEFAULT_LEADERBOARD_SIZE, type=int))
+    return render_template('leaderboards/index.html', boards=boards, tournament=tournament)
+
+@tournament_bp.route('/tournament/<int:tournament_id>/leaderboards.json')
+@conditional_get
+def tournament_leaderboards_json(tournament_id):
+    """Leaderboards of the tournament as JSON; ?metric= for a single one"""
+    Tournament.query.get_or_404(tournament_id)
+    payload, status = leaderboards_payload(request.args, tournament_id)
+    return jsonify(payload), status
+
 @tournament_bp.route('/tournament/<int:tournament_id>/knockout', methods=['GET'])
+@conditional_get
 def knockout_management(tournament_id):
     """Manage knockout stage"""
     tournament = Tournament.query.get_or_404(tournament_id)
@@ -124,17 +174,10 @@ def knockout_management(tournament_id):
         qualified_for_knockout=True
     ).all()
     
-    # Create a bracket object for the template
-    bracket = type('Bracket', (), {
-        'quarter_finals': [match for match in tournament.matches if match.stage == 'quarter_final'],
-        'semi_finals': [match for match in tournament.matches if match.stage == 'semi_final'],
-        'final': [match for match in tournament.matches if match.stage == 'final']
-    })()
-    
+    # The bracket itself is filled in by the page from bracket.json
     return render_template('tournaments/knockout.html',
                          tournament=tournament,
-                         qualified_teams=qualified_teams,
-                         bracket=bracket)
+                         qualified_teams=qualified_teams)
 
 @tournament_bp.route('/tournament/<int:tournament_id>/create-knockout-match', methods=['POST'])
 @admin_required
@@ -153,6 +196,7 @@ def create_knockout_match(tournament_id):
             stage=data['stage'],
             status='scheduled'
         )
+        assign_free_slot(match)
         
         db.session.add(match)
         db.session.commit()
@@ -165,7 +209,10 @@ def create_knockout_match(tournament_id):
 @admin_required
 def advance_knockout_stage(tournament_id):
     """Advance teams to next knockout stage"""
-    tournament = Tournament.query.get_or_404(tournament_id)
+    tournament = Tournament.query.options(
+        selectinload(Tournament.matches).selectinload(Match.home_team),
+        selectinload(Tournament.matches).selectinload(Match.away_team)
+    ).filter_by(id=tournament_id).first_or_404()
     data = request.get_json()
     stage = data['stage']
     
@@ -200,18 +247,112 @@ def advance_knockout_stage(tournament_id):
         return jsonify({'success': False, 'message': str(e)})
 
 @tournament_bp.route('/tournament/<int:tournament_id>/bracket', methods=['GET'])
+@conditional_get
+@cached_page
 def tournament_bracket(tournament_id):
     """View tournament bracket"""
     tournament = Tournament.query.get_or_404(tournament_id)
+    # Rounds are rendered client-side from bracket.json
     return render_template('tournaments/bracket.html', tournament=tournament)
 
+@tournament_bp.route('/tournament/<int:tournament_id>/bracket.json', methods=['GET'])
+def tournament_bracket_json(tournament_id):
+    """Precomputed bracket document, revalidated with its ETag"""
+    cached = get_bracket_json(tournament_id)
+    if cached is None:
+        abort(404)
+    body, etag = cached
+    
+    # Weak comparison: compressed responses carry the tag as W/"..."
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Clients keep the document but check it on every use; unchanged brackets cost a 304
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@tournament_bp.route('/tournament/<int:tournament_id>/changes', methods=['GET'])
+@conditional_get
+def tournament_changes(tournament_id):
+    """Changed matches, teams, groups and standings rows since a version"""
+    Tournament.query.get_or_404(tournament_id)
+    since = request.args.get('since', type=int)
+    limit = request.args.get('limit', DEFAULT_FEED_LIMIT, type=int)
+    
+    if since is None:
+        # First sync: the client renders the current state, then follows the feed from this version
+        response = jsonify({'tournament_id': tournament_id, 'version': current_version(tournament_id), 'has_more': False})
+    else:
+        response = jsonify(get_changes(tournament_id, since, limit))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# HTML fragments of the tournament page, swapped in after admin actions instead of reloading it
+
+def _fragment_group(tournament_id, group_id):
+    return Group.query.options(selectinload(Group.teams))\
+        .filter_by(id=group_id, tournament_id=tournament_id).first_or_404()
+
+@tournament_bp.route('/tournament/<int:tournament_id>/fragments/groups/<int:group_id>/table', methods=['GET'])
+@conditional_get
+@cached_page
+def group_table_fragment(tournament_id, group_id):
+    """Standings table of one group"""
+    group = _fragment_group(tournament_id, group_id)
+    return render_template('tournaments/fragments/group_table.html',
+                         group=group,
+                         group_teams=group.teams,
+                         group_standings=get_tournament_standings(tournament_id).for_group(group.name))
+
+@tournament_bp.route('/tournament/<int:tournament_id>/fragments/groups/<int:group_id>/matches', methods=['GET'])
+@conditional_get
+@cached_page
+def match_list_fragment(tournament_id, group_id):
+    """Match cards of one group, in kick-off order"""
+    group = _fragment_group(tournament_id, group_id)
+    group_matches = Match.query.options(
+        selectinload(Match.home_team),
+        selectinload(Match.away_team)
+    ).filter_by(tournament_id=tournament_id, group_name=group.name)\
+        .order_by(Match.date.is_(None), Match.date, Match.id).all()
+    return render_template('tournaments/fragments/match_list.html',
+                         group=group,
+                         group_teams=group.teams,
+                         group_matches=group_matches)
+
+@tournament_bp.route('/tournament/<int:tournament_id>/fragments/matches/<int:match_id>', methods=['GET'])
+@conditional_get
+@cached_page
+def match_row_fragment(tournament_id, match_id):
+    """Card of one match"""
+    match = Match.query.options(
+        selectinload(Match.home_team),
+        selectinload(Match.away_team)
+    ).filter_by(id=match_id, tournament_id=tournament_id).first_or_404()
+    return render_template('tournaments/fragments/match_row.html', match=match)
+
+@tournament_bp.route('/tournament/<int:tournament_id>/fragments/standings', methods=['GET'])
+@conditional_get
+@cached_page
+def standings_fragment(tournament_id):
+    """Overall standings table"""
+    Tournament.query.get_or_404(tournament_id)
+    return render_template('tournaments/fragments/standings_table.html',
+                         standings=get_tournament_standings(tournament_id).overall)
+
 @tournament_bp.route('/tournament/<int:tournament_id>/groups', methods=['GET'])
+@conditional_get
 def manage_groups(tournament_id):
     """Manage tournament groups"""
-    tournament = Tournament.query.get_or_404(tournament_id)
+    tournament = Tournament.query.options(
+        selectinload(Tournament.teams).selectinload(Team.group)
+    ).filter_by(id=tournament_id).first_or_404()
     
     # Get all groups for this tournament
-    existing_groups = Group.query.filter_by(tournament_id=tournament_id).all()
+    existing_groups = Group.query.options(selectinload(Group.teams))\
+        .filter_by(tournament_id=tournament_id).all()
     
     # Get teams by group
     teams_by_group = {}
@@ -265,7 +406,7 @@ def delete_group(tournament_id, group_name):
     tournament = Tournament.query.get_or_404(tournament_id)
     
     # Find the group
-    group = Group.query.filter_by(
+    group = Group.query.options(selectinload(Group.teams)).filter_by(
         tournament_id=tournament_id,
         name=group_name
     ).first()
@@ -274,6 +415,7 @@ def delete_group(tournament_id, group_name):
         return jsonify({'success': False, 'message': f'Group {group_name} not found'})
     
     # Remove all teams from this group
+    set_standing_group([team.id for team in group.teams], None)
     for team in group.teams:
         team.group_id = None
     
@@ -322,25 +464,13 @@ def rename_group(tournament_id, group_name):
 def generate_matches(tournament_id):
     """Generate group stage matches"""
     tournament = Tournament.query.get_or_404(tournament_id)
-    teams = Team.query.filter_by(tournament_id=tournament_id).all()
     
-    if len(teams) < 2:
+    # Round-robin between all teams, one round per day; legs=2 plays home and away
+    legs = 2 if request.form.get('legs') == '2' else 1
+    if generate_league_fixtures(tournament.id, legs=legs) == 0:
         flash('Need at least 2 teams to generate matches', 'error')
         return redirect(url_for('tournament.view_tournament', tournament_id=tournament.id))
     
-    # Simple round-robin for now
-    for i in range(len(teams)):
-        for j in range(i + 1, len(teams)):
-            match = Match(
-                home_team_id=teams[i].id,
-                away_team_id=teams[j].id,
-                tournament_id=tournament.id,
-                date=datetime.now(),
-                stage='group_stage',
-                status='scheduled'
-            )
-            db.session.add(match)
-    
     db.session.commit()
     flash('Matches generated successfully!', 'success')
     return redirect(url_for('tournament.view_tournament', tournament_id=tournament.id))
@@ -349,20 +479,22 @@ def generate_matches(tournament_id):
 @admin_required
 def manage_qualification(tournament_id):
     """Manage team qualification for knockout stage"""
-    tournament = Tournament.query.get_or_404(tournament_id)
+    tournament = Tournament.query.options(selectinload(Tournament.groups))\
+        .filter_by(id=tournament_id).first_or_404()
     
     if request.method == 'POST':
         # Get qualification settings from form
         qualification_data = request.get_json() if request.is_json else request.form
         
         # Process qualification for each group
+        computed = tournament.compute_standings()
         for group in tournament.groups:
             group_name = group.name
             teams_to_qualify = int(qualification_data.get(f'group_{group_name}', 0))
             
             if teams_to_qualify > 0:
                 # Get group standings and select top teams
-                group_standings = tournament.get_group_standings(group_name)
+                group_standings = computed.for_group(group_name)
                 qualified_count = min(teams_to_qualify, len(group_standings))
                 
                 # Mark top teams as qualified
@@ -384,13 +516,53 @@ def manage_qualification(tournament_id):
         return redirect(url_for('tournament.knockout_management', tournament_id=tournament_id))
     
     # Get current group standings for display
-    group_standings = {}
-    for group in tournament.groups:
-        group_standings[group.name] = tournament.get_group_standings(group.name)
+    group_standings = tournament.compute_standings().by_group
+    odds = get_qualification_odds(tournament_id)
     
     return render_template('tournaments/qualification.html', 
                          tournament=tournament, 
-                         group_standings=group_standings)
+                         group_standings=group_standings,
+                         odds=odds,
+                         default_qualifying=DEFAULT_QUALIFYING)
+
+# Parameters that make the odds endpoint run a new simulation
+SIMULATION_ADMIN_ARGS = ('simulations', 'seed', 'mean_goals', 'home_advantage', 'prior_matches')
+
+@tournament_bp.route('/tournament/<int:tournament_id>/qualification/odds.json')
+@conditional_get
+def qualification_odds_json(tournament_id):
+    """Simulated finishing positions and qualification chances of each group's teams
+
+    Query: qualify (places that go through); for admins also simulations,
+    seed, and the score model's mean_goals, home_advantage and prior_matches.
+    Everyone else gets the default simulation, cached until the data changes.
+    """
+    Tournament.query.get_or_404(tournament_id)
+    args = request.args
+    if not session.get('is_admin') and any(name in args for name in SIMULATION_ADMIN_ARGS):
+        return jsonify({'success': False, 'message': 'Acesso negado. Apenas administradores podem alterar a simulação.'}), 403
+    defaults = ScoreModel()
+    try:
+        model = ScoreModel(
+            mean_goals=args.get('mean_goals', defaults.mean_goals, type=float),
+            home_advantage=args.get('home_advantage', defaults.home_advantage, type=float),
+            prior_matches=args.get('prior_matches', defaults.prior_matches, type=float)
+        )
+        odds = get_qualification_odds(
+            tournament_id, model,
+            simulations=args.get('simulations', DEFAULT_SIMULATIONS, type=int),
+            qualifying=args.get('qualify', DEFAULT_QUALIFYING, type=int),
+            seed=args.get('seed', type=int)
+        )
+    except InvalidSimulation as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'tournament_id': tournament_id,
+        'model': model.as_dict(),
+        'groups': [group.as_dict() for group in odds.values()]
+    })
 
 @tournament_bp.route('/tournament/<int:tournament_id>/knockout/save-match', methods=['POST'])
 @admin_required
@@ -425,6 +597,7 @@ def save_knockout_match(tournament_id):
         venue='A definir',
         status='scheduled'
     )
+    assign_free_slot(match)
     
     db.session.add(match)
     db.session.commit()
@@ -435,60 +608,43 @@ def save_knockout_match(tournament_id):
         'match_id': match.id
     })
 
-def advance_winner_to_next_round(tournament_id, winner_team_id, current_stage, current_match_number):
-    """Advance winner to next round automatically"""
-    from datetime import datetime, timedelta
+@tournament_bp.route('/tournament/<int:tournament_id>/knockout/generate-bracket', methods=['POST'])
+@admin_required
+def generate_knockout_bracket(tournament_id):
+    """Create the whole knockout bracket from the qualified teams"""
+    tournament = Tournament.query.get_or_404(tournament_id)
     
-    next_stage = None
-    next_match_number = None
-    
-    # Define next round logic
-    if current_stage == 'quarter_final':
-        next_stage = 'semi_final'
-        # Quarters 1,2 go to Semi 1; Quarters 3,4 go to Semi 2
-        if current_match_number <= 2:
-            next_match_number = 1
-        else:
-            next_match_number = 2
-    elif current_stage == 'semi_final':
-        next_stage = 'final'
-        next_match_number = 1
-    
-    if not next_stage:
-        return None
-    
-    # Check if next match already exists
-    existing_match = Match.query.filter_by(
-        tournament_id=tournament_id,
-        stage=next_stage,
-        status='scheduled'
-    ).first()
+    data = request.get_json(silent=True) or request.form
+    third_place = str(data.get('third_place', 'true')).lower() not in ('false', '0', 'no')
     
-    if existing_match:
-        # Update existing match with winner
-        if not existing_match.home_team_id:
-            existing_match.home_team_id = winner_team_id
-        elif not existing_match.away_team_id:
-            existing_match.away_team_id = winner_team_id
-        
-        db.session.commit()
-        return existing_match
+    if has_bracket(tournament_id):
+        return jsonify({'success': False, 'message': 'Bracket already exists! Clear all knockout matches first.'})
+    
+    # Seeds: explicit team_ids, or qualified teams in standings order
+    if data.get('team_ids'):
+        team_ids = data['team_ids']
+        if isinstance(team_ids, str):
+            team_ids = team_ids.split(',')
+        team_ids = [int(team_id) for team_id in team_ids]
     else:
-        # Create new match for next round
-        default_date = datetime.now() + timedelta(days=7)
-        
-        next_match = Match(
+        qualified = {team.id for team in Team.query.filter_by(
             tournament_id=tournament_id,
-            home_team_id=winner_team_id,
-            stage=next_stage,
-            date=default_date,
-            venue='A definir',
-            status='scheduled'
-        )
-        
-        db.session.add(next_match)
-        db.session.commit()
-        return next_match
+            qualified_for_knockout=True
+        )}
+        team_ids = [row.id for row in tournament.get_standings() if row.id in qualified]
+    
+    try:
+        matches = generate_bracket(tournament_id, team_ids, third_place=third_place)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    
+    db.session.commit()
+    
+    return jsonify({
+        'success': True,
+        'message': f'Bracket created for {len(team_ids)} teams ({len(matches)} matches)!',
+        'matches_created': len(matches)
+    })
 
 @tournament_bp.route('/tournament/<int:tournament_id>/knockout/update-score', methods=['POST'])
 @admin_required
@@ -505,11 +661,15 @@ def update_knockout_score(tournament_id):
     match = Match.query.get(match_id)
     if not match:
         return jsonify({'success': False, 'message': 'Match not found'})
+    if not match.home_team_id or not match.away_team_id:
+        return jsonify({'success': False, 'message': 'Both teams must be known before recording a score'})
     
     # Update scores
+    previous_result = match_result(match)
     match.home_score = home_score
     match.away_score = away_score
     match.status = 'completed'
+    apply_result_change(previous_result, match_result(match))
     
     # Determine winner
     winner_team_id = None
@@ -518,34 +678,15 @@ def update_knockout_score(tournament_id):
     elif away_score > home_score:
         winner_team_id = match.away_team_id
     
-    # Advance winner to next round if there's a winner
-    if winner_team_id:
-        # Get match number based on match position
-        all_matches = Match.query.filter_by(
-            tournament_id=tournament_id,
-            stage=match.stage
-        ).order_by(Match.id).all()
-        
-        match_number = 1
-        for i, m in enumerate(all_matches):
-            if m.id == match.id:
-                match_number = i + 1
-                break
-        
-        # Advance winner
-        next_match = advance_winner_to_next_round(
-            tournament_id, 
-            winner_team_id, 
-            match.stage, 
-            match_number
-        )
-    
+    # Move the winner (and a semi-final loser) into their bracket slots with keyed updates
+    filled_slots = advance_knockout_result(match)
     db.session.commit()
     
     return jsonify({
         'success': True,
-        'message': 'Score updated and winner advanced!',
-        'winner_team_id': winner_team_id
+        'message': 'Score updated and winner advanced!' if filled_slots else 'Score updated!',
+        'winner_team_id': winner_team_id,
+        'next_slots': filled_slots
     })
 
 @tournament_bp.route('/tournament/<int:tournament_id>/knockout/delete-match', methods=['POST'])
@@ -563,6 +704,8 @@ def delete_knockout_match(tournament_id):
         return jsonify({'success': False, 'message': 'Match not found'})
     
     # Delete match
+    apply_result_change(match_result(match), None)
+    clear_match_events([match.id])
     db.session.delete(match)
     db.session.commit()
     
@@ -581,10 +724,12 @@ def clear_all_knockout_matches(tournament_id):
     knockout_matches = Match.query.filter_by(
         tournament_id=tournament_id
     ).filter(
-        Match.stage.in_(['quarter_final', 'semi_final', 'final'])
+        Match.stage.in_(KNOCKOUT_STAGES)
     ).all()
     
+    clear_match_events([match.id for match in knockout_matches])
     for match in knockout_matches:
+        apply_result_change(match_result(match), None)
         db.session.delete(match)
     
     db.session.commit()
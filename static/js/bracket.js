@@ -0,0 +1,55 @@
+// Knockout bracket pages: hydrate from the precomputed /tournament/<id>/bracket.json
+
+const BracketData = (function() {
+    const STATUS_BADGES = {
+        completed: 'success',
+        scheduled: 'warning'
+    };
+
+    // bracket.json is sent with an ETag and Cache-Control: no-cache, so the
+    // browser revalidates it and an unchanged bracket costs a 304
+    function load(url) {
+        return fetch(url, { headers: { 'Accept': 'application/json' } })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Bracket request failed (${response.status})`);
+                }
+                return response.json();
+            });
+    }
+
+    function escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text == null ? '' : String(text);
+        return div.innerHTML;
+    }
+
+    function formatDate(isoDate, options) {
+        if (!isoDate) {
+            return 'TBD';
+        }
+        return new Date(isoDate).toLocaleDateString(undefined, options || { year: 'numeric', month: 'long', day: 'numeric' });
+    }
+
+    function statusBadge(status) {
+        return STATUS_BADGES[status] || 'secondary';
+    }
+
+    // slot -> match, third place included
+    function matchesBySlot(bracket) {
+        const bySlot = {};
+        bracket.rounds.forEach(round => {
+            round.matches.forEach(match => {
+                if (match.slot !== null) {
+                    bySlot[match.slot] = match;
+                }
+            });
+        });
+        if (bracket.third_place && bracket.third_place.slot !== null) {
+            bySlot[bracket.third_place.slot] = bracket.third_place;
+        }
+        return bySlot;
+    }
+
+    return { load, escapeHtml, formatDate, statusBadge, matchesBySlot };
+})();
@@ -0,0 +1,39 @@
+// Swap server-rendered HTML fragments into the page instead of reloading it
+
+const Fragments = (function() {
+    // Fetch url and replace the element matching selector with the returned HTML.
+    // Collapsed sections that were open stay open.
+    function replace(selector, url) {
+        return fetch(url, { headers: { 'Accept': 'text/html' } })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Fragment request failed (${response.status})`);
+                }
+                return response.text();
+            })
+            .then(html => {
+                const current = document.querySelector(selector);
+                if (!current) {
+                    return null;
+                }
+                const openIds = Array.from(current.querySelectorAll('.collapse.show')).map(element => element.id);
+
+                const template = document.createElement('template');
+                template.innerHTML = html.trim();
+                const fresh = template.content.firstElementChild;
+                openIds.forEach(id => {
+                    const section = fresh.querySelector(`#${CSS.escape(id)}`);
+                    if (section) section.classList.add('show');
+                });
+                current.replaceWith(fresh);
+                return fresh;
+            });
+    }
+
+    // Replace several fragments at once: [[selector, url], ...]
+    function replaceAll(pairs) {
+        return Promise.all(pairs.map(([selector, url]) => replace(selector, url)));
+    }
+
+    return { replace, replaceAll };
+})();
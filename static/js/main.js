@@ -36,51 +36,97 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 // Live Match Updates
+// One Server-Sent Events stream per page, opened only when the page shows
+// matches; the server pushes score/status changes, nothing is polled
+const LIVE_STATUS_BADGES = {
+    completed: 'success',
+    in_progress: 'warning'
+};
+
 function initializeLiveMatchUpdates() {
-    const liveMatchElements = document.querySelectorAll('.live-match');
-    
+    const liveMatchElements = document.querySelectorAll('.live-match[data-match-id]');
+    if (!liveMatchElements.length || !window.EventSource) {
+        return;
+    }
+
+    const elementsByMatch = {};
     liveMatchElements.forEach(function(element) {
         const matchId = element.dataset.matchId;
-        if (matchId) {
-            // Update match every 30 seconds
-            setInterval(function() {
-                updateLiveMatch(matchId, element);
-            }, 30000);
-        }
+        (elementsByMatch[matchId] = elementsByMatch[matchId] || []).push(element);
     });
-}
 
-function updateLiveMatch(matchId, element) {
-    fetch(`/match/${matchId}/live-update`, {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/x-www-form-urlencoded',
-        },
-        body: new URLSearchParams({
-            'minute': element.querySelector('.live-minute').textContent,
-            'home_score': element.querySelector('.home-score').textContent,
-            'away_score': element.querySelector('.away-score').textContent
-        })
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.success) {
-            updateMatchDisplay(element, data);
+    // Pages of one tournament only listen to that tournament
+    const tournamentElement = document.querySelector('[data-live-tournament-id]');
+    const url = tournamentElement
+        ? `/live/stream?tournament_id=${encodeURIComponent(tournamentElement.dataset.liveTournamentId)}`
+        : '/live/stream';
+
+    // EventSource reconnects by itself and sends Last-Event-ID, so the
+    // server replays whatever was missed while disconnected
+    const source = new EventSource(url);
+    const lastEventIds = {};
+
+    source.addEventListener('match', function(event) {
+        const data = JSON.parse(event.data);
+        const eventId = parseInt(event.lastEventId, 10);
+        // Around a reconnect an event can arrive twice or late; keep the newest
+        if (lastEventIds[data.match_id] >= eventId) {
+            return;
         }
-    })
-    .catch(error => {
-        console.error('Error updating live match:', error);
+        lastEventIds[data.match_id] = eventId;
+        (elementsByMatch[data.match_id] || []).forEach(function(element) {
+            updateMatchDisplay(element, data);
+        });
+    });
+
+    // Too many events were missed to replay them: start over from the page
+    source.addEventListener('reset', function() {
+        window.location.reload();
     });
+
+    // Minutes run on between events
+    setInterval(function() {
+        liveMatchElements.forEach(advanceLiveMinute);
+    }, 60000);
+}
+
+function formatLiveScore(data) {
+    if (data.status === 'completed') {
+        return `${data.home_score} - ${data.away_score}`;
+    }
+    if (data.status === 'in_progress') {
+        return `${data.home_score} - ${data.away_score} (Live)`;
+    }
+    return 'vs';
 }
 
 function updateMatchDisplay(element, data) {
     const minuteElement = element.querySelector('.live-minute');
     const homeScoreElement = element.querySelector('.home-score');
     const awayScoreElement = element.querySelector('.away-score');
-    
-    if (minuteElement) minuteElement.textContent = data.minute;
+    const scoreElement = element.querySelector('.score-display');
+    const statusElement = element.querySelector('.match-status');
+
+    element.dataset.status = data.status;
+    if (minuteElement) minuteElement.textContent = data.minute ? `${data.minute}'` : '';
     if (homeScoreElement) homeScoreElement.textContent = data.home_score;
     if (awayScoreElement) awayScoreElement.textContent = data.away_score;
+    if (scoreElement) scoreElement.textContent = formatLiveScore(data);
+    if (statusElement) {
+        statusElement.className = `badge match-status bg-${LIVE_STATUS_BADGES[data.status] || 'secondary'}`;
+        statusElement.textContent = data.status.replace('_', ' ').replace(/\b\w/g, letter => letter.toUpperCase());
+    }
+}
+
+function advanceLiveMinute(element) {
+    const minuteElement = element.querySelector('.live-minute');
+    if (element.dataset.status !== 'in_progress' || !minuteElement) {
+        return;
+    }
+    const minute = parseInt(minuteElement.textContent, 10);
+    if (minute && minute < 90) {
+        minuteElement.textContent = `${minute + 1}'`;
+    }
 }
 
 // Tournament Bracket Interactions
@@ -100,11 +146,16 @@ function initializeBracketInteractions() {
     });
 }
 
-// Search Functionality
+// Search Functionality: name suggestions under the search box as the user types
 function initializeSearch() {
     const searchInput = document.querySelector('input[name="q"]');
     if (searchInput) {
         let searchTimeout;
+        let pending = null;
+        const menu = document.createElement('ul');
+        menu.className = 'dropdown-menu search-suggestions';
+        searchInput.parentNode.style.position = 'relative';
+        searchInput.insertAdjacentElement('afterend', menu);
         
         searchInput.addEventListener('input', function() {
             clearTimeout(searchTimeout);
@@ -112,25 +163,44 @@ function initializeSearch() {
             
             if (query.length >= 2) {
                 searchTimeout = setTimeout(function() {
-                    performSearch(query);
-                }, 300);
+                    if (pending) pending.abort();
+                    pending = new AbortController();
+                    performSearch(query, menu, pending.signal);
+                }, 150);
+            } else {
+                menu.classList.remove('show');
             }
         });
+        searchInput.addEventListener('blur', function() {
+            // Let a click on a suggestion land first
+            setTimeout(() => menu.classList.remove('show'), 200);
+        });
     }
 }
 
-function performSearch(query) {
-    fetch(`/search?q=${encodeURIComponent(query)}`)
-        .then(response => response.text())
-        .then(html => {
-            // Update search results if on search page
-            const searchResults = document.querySelector('.search-results');
-            if (searchResults) {
-                searchResults.innerHTML = html;
-            }
+function performSearch(query, menu, signal) {
+    fetch(`/search/suggest?q=${encodeURIComponent(query)}`, { signal })
+        .then(response => response.json())
+        .then(data => {
+            menu.replaceChildren(...data.suggestions.map(suggestion => {
+                const item = document.createElement('li');
+                const link = document.createElement('a');
+                link.className = 'dropdown-item d-flex justify-content-between';
+                link.href = suggestion.url;
+                link.textContent = suggestion.name;
+                const kind = document.createElement('small');
+                kind.className = 'text-muted ms-3';
+                kind.textContent = suggestion.kind;
+                link.appendChild(kind);
+                item.appendChild(link);
+                return item;
+            }));
+            menu.classList.toggle('show', data.suggestions.length > 0);
         })
         .catch(error => {
-            console.error('Search error:', error);
+            if (error.name !== 'AbortError') {
+                console.error('Search error:', error);
+            }
         });
 }
 
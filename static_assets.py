@@ -0,0 +1,151 @@
+"""
+Fingerprinted, precompressed static assets
+
+url_for('static', filename=...) adds the content hash of the file as
+?v=<hash>, so a changed asset gets a new URL. Requests carrying the
+current hash are served with a one-year immutable Cache-Control; anything
+else (old hashes, hand-written URLs) is revalidated as before.
+
+precompress_static.py writes .br/.gz siblings of the text assets at build
+time; they are served instead of the file to clients that accept them, as
+long as they were built from the file's current version.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import current_app, request, send_from_directory
+from werkzeug.security import safe_join
+
+from compression import DEFAULT_MIMETYPES, brotli, negotiate_encoding
+
+ONE_YEAR_SECONDS = 365 * 24 * 3600
+# Suffixes of the precompressed siblings, best encoding first
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+PRECOMPRESS_MIN_SIZE = 256
+
+_assets = {}
+_lock = threading.Lock()
+
+
+class _Asset:
+    """Content hash and precompressed encodings of one version of a static file"""
+
+    def __init__(self, path, mtime_ns):
+        self.mtime_ns = mtime_ns
+        with open(path, 'rb') as asset_file:
+            self.digest = hashlib.sha1(asset_file.read()).hexdigest()[:12]
+        self.encodings = tuple(
+            encoding for encoding, suffix in PRECOMPRESSED
+            if _built_from(path + suffix, mtime_ns)
+        )
+
+
+def _built_from(sibling_path, mtime_ns):
+    """True if a precompressed sibling carries the original's modification time"""
+    try:
+        return os.stat(sibling_path).st_mtime_ns == mtime_ns
+    except OSError:
+        return False
+
+
+def get_asset(filename):
+    """Get the _Asset of a file in the static folder (None if there is no such file)
+
+    Memoized per file and recomputed when its modification time changes.
+    """
+    path = safe_join(current_app.static_folder, filename)
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    asset = _assets.get(filename)
+    if asset is None or asset.mtime_ns != stat.st_mtime_ns:
+        asset = _Asset(path, stat.st_mtime_ns)
+        with _lock:
+            _assets[filename] = asset
+    return asset
+
+
+def _fingerprint_static_urls(endpoint, values):
+    if endpoint != 'static' or 'filename' not in values or 'v' in values:
+        return
+    asset = get_asset(values['filename'])
+    if asset is not None:
+        values['v'] = asset.digest
+
+
+def _serve_static(filename):
+    """The static view: precompressed sibling when accepted, long-lived when fingerprinted"""
+    app = current_app
+    asset = get_asset(filename)
+    encoding = negotiate_encoding(asset.encodings) if asset is not None else None
+    if encoding is not None:
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(
+            app.static_folder, filename + dict(PRECOMPRESSED)[encoding],
+            mimetype=mimetype, max_age=app.get_send_file_max_age(filename)
+        )
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = app.send_static_file(filename)
+
+    if asset is not None and asset.encodings:
+        response.vary.add('Accept-Encoding')
+    if asset is not None and request.args.get('v') == asset.digest:
+        response.cache_control.public = True
+        response.cache_control.max_age = ONE_YEAR_SECONDS
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    return response
+
+
+def init_static_assets(app):
+    """Fingerprint static URLs and serve them through the precompression-aware view"""
+    _assets.clear()
+    app.url_defaults(_fingerprint_static_urls)
+    if app.has_static_folder:
+        app.view_functions['static'] = _serve_static
+
+
+def precompress(folder, min_size=PRECOMPRESS_MIN_SIZE, allowed=DEFAULT_MIMETYPES):
+    """Write .br (with brotli installed) and .gz siblings of the text files in folder
+
+    Siblings already built from the current file are kept; a sibling that
+    would not be smaller than the file is not written. Returns the paths
+    written.
+    """
+    suffixes = tuple(suffix for _, suffix in PRECOMPRESSED)
+    written = []
+    for root, _, files in sorted(os.walk(folder)):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if name.endswith(suffixes) or mimetypes.guess_type(name)[0] not in allowed:
+                continue
+            stat = os.stat(path)
+            if stat.st_size < min_size:
+                continue
+            with open(path, 'rb') as asset_file:
+                body = asset_file.read()
+            for encoding, suffix in PRECOMPRESSED:
+                if encoding == 'br' and brotli is None:
+                    continue
+                if _built_from(path + suffix, stat.st_mtime_ns):
+                    continue
+                if encoding == 'br':
+                    compressed = brotli.compress(body, quality=11)
+                else:
+                    compressed = gzip.compress(body, compresslevel=9, mtime=0)
+                if len(compressed) >= len(body):
+                    continue
+                with open(path + suffix, 'wb') as sibling:
+                    sibling.write(compressed)
+                # The sibling is valid only while the file keeps this modification time
+                os.utime(path + suffix, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+                written.append(path + suffix)
+    return written